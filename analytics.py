@@ -0,0 +1,344 @@
+import os
+import sys
+import json
+import time
+import glob
+import argparse
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta, timezone
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # exportul/rapoartele cer pyarrow; restul botului rulează fără
+    pa = pq = None
+
+# =====================================================
+# ⚙️ Constante
+# =====================================================
+ANALYTICS_DIR = os.getenv("ANALYTICS_DIR", os.path.join("data", "analytics"))
+PAGE_SIZE = 1000  # rânduri citite per request din Supabase
+# exportul citește și puțin înapoi: scrierile write-behind ajung cu întârziere în tabel
+EXPORT_OVERLAP = int(os.getenv("ANALYTICS_EXPORT_OVERLAP", "600"))
+COMPACT_PARTS = int(os.getenv("ANALYTICS_COMPACT_PARTS", "32"))  # peste atâtea fișiere → compactare
+STRATEGIES = ["STB", "SELL_BUY"]
+CATEGORY_COLUMNS = ("symbol", "side", "status", "strategy")  # puține valori distincte → citite ca dicționar
+
+# coloanele păstrate per tabel: schema fixă, ca fișierele exportate în momente diferite să fie compatibile
+TABLES = {
+    "orders": {
+        "key": "order_id",
+        "strategy_filter": True,
+        "columns": {
+            "order_id": "string", "cycle_id": "string", "symbol": "string", "side": "string",
+            "status": "string", "strategy": "string", "price": "float64", "filled_size": "float64",
+            "created_at": "timestamp", "last_updated": "timestamp",
+        },
+    },
+    "profit_per_cycle": {
+        "key": "cycle_id",
+        "strategy_filter": False,
+        "columns": {
+            "cycle_id": "string", "symbol": "string", "strategy": "string", "sell_price": "float64",
+            "buy_price": "float64", "profit_percent": "float64", "profit_usdt": "float64",
+            "profit_coin": "float64", "execution_seconds": "float64", "last_updated": "timestamp",
+        },
+    },
+}
+
+# =====================================================
+# 📥 Export incremental Supabase → Parquet
+# =====================================================
+def _require_pyarrow():
+    if pa is None:
+        raise SystemExit("❌ pyarrow lipsește (pip install -r requirements.txt).")
+
+
+def _table_dir(table):
+    return os.path.join(ANALYTICS_DIR, table)
+
+
+def _watermark_path(table):
+    return os.path.join(_table_dir(table), "_watermark.json")  # '_' → ignorat de cititorul Parquet
+
+
+def read_watermark(table):
+    try:
+        with open(_watermark_path(table)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_watermark(table, state):
+    path = _watermark_path(table)
+    with open(path + ".tmp", "w") as f:
+        json.dump(state, f)
+    os.replace(path + ".tmp", path)
+
+
+def fetch_rows_since(table, since=None):
+    """Rândurile tabelului cu last_updated ≥ since (tot istoricul fără watermark), paginat."""
+    from supabase_client import supabase
+
+    rows = []
+    start = 0
+    while True:
+        query = supabase.table(table).select("*")
+        if TABLES[table]["strategy_filter"]:
+            query = query.in_("strategy", STRATEGIES)
+        if since:
+            query = query.gte("last_updated", since)
+        page = query.order("last_updated").range(start, start + PAGE_SIZE - 1).execute().data or []
+        rows.extend(page)
+        if len(page) < PAGE_SIZE:
+            return rows
+        start += PAGE_SIZE
+
+
+def to_frame(table, rows):
+    """Rândurile Supabase → DataFrame cu schema fixă a tabelului."""
+    df = pd.DataFrame(rows)
+    if table == "profit_per_cycle" and "execution_time" in df:
+        # execution_time e str(timedelta) ("1 day, 2:03:04.5") → secunde, ușor de agregat
+        df["execution_seconds"] = pd.to_timedelta(df["execution_time"], errors="coerce").dt.total_seconds()
+    out = pd.DataFrame(index=df.index)
+    for column, kind in TABLES[table]["columns"].items():
+        values = df[column] if column in df else pd.Series(None, index=df.index, dtype=object)
+        if kind == "timestamp":
+            out[column] = pd.to_datetime(values, utc=True, format="ISO8601", errors="coerce")
+        elif kind == "float64":
+            out[column] = pd.to_numeric(values, errors="coerce").astype("float64")
+        else:
+            out[column] = values.astype(object).where(values.notna(), None)
+    if "side" in out:
+        out["side"] = out["side"].str.upper()  # rapoartele compară direct cu 'SELL' / 'BUY'
+    return out
+
+
+def _schema(table):
+    types = {"string": pa.string(), "float64": pa.float64(), "timestamp": pa.timestamp("us", tz="UTC")}
+    return pa.schema([(column, types[kind]) for column, kind in TABLES[table]["columns"].items()])
+
+
+def export_table(table):
+    """
+    Adaugă un fișier Parquet cu rândurile scrise de la ultimul watermark
+    (minus EXPORT_OVERLAP). Un rând modificat ulterior (ex. BUY open → executed)
+    apare în mai multe fișiere; la citire rămâne versiunea cu last_updated maxim.
+    """
+    _require_pyarrow()
+    os.makedirs(_table_dir(table), exist_ok=True)
+    state = read_watermark(table)
+    since = None
+    if state.get("last_updated"):
+        since = (datetime.fromisoformat(state["last_updated"]) - timedelta(seconds=EXPORT_OVERLAP)).isoformat()
+
+    started = time.time()
+    rows = fetch_rows_since(table, since)
+    if rows:
+        df = to_frame(table, rows)
+        name = f"part-{datetime.now(timezone.utc):%Y%m%dT%H%M%S%f}.parquet"
+        tmp = os.path.join(_table_dir(table), "_" + name)
+        pq.write_table(pa.Table.from_pandas(df, schema=_schema(table), preserve_index=False), tmp, compression="zstd")
+        os.replace(tmp, os.path.join(_table_dir(table), name))
+        latest = df["last_updated"].max()
+        if pd.notna(latest):
+            state["last_updated"] = max(state.get("last_updated") or "", latest.isoformat())
+        state["rows"] = state.get("rows", 0) + len(df)
+    state["exported_at"] = datetime.now(timezone.utc).isoformat()
+    _write_watermark(table, state)
+    print(f"📦 [STB] {table}: {len(rows)} rând(uri) exportate în {time.time() - started:.1f}s (de la {since or 'început'})")
+    if len(_parts(table)) > COMPACT_PARTS:
+        compact_table(table)
+    return len(rows)
+
+
+def _parts(table):
+    return sorted(glob.glob(os.path.join(_table_dir(table), "part-*.parquet")))
+
+
+def compact_table(table):
+    """Rescrie toate fișierele într-unul singur, deduplicat după cheie."""
+    parts = _parts(table)
+    if len(parts) < 2:
+        return
+    df = load_table(table)
+    name = f"part-{datetime.now(timezone.utc):%Y%m%dT%H%M%S%f}.parquet"
+    tmp = os.path.join(_table_dir(table), "_" + name)
+    pq.write_table(pa.Table.from_pandas(df, schema=_schema(table), preserve_index=False), tmp, compression="zstd")
+    os.replace(tmp, os.path.join(_table_dir(table), name))
+    for path in parts:
+        os.remove(path)
+    print(f"🗜️ [STB] {table}: {len(parts)} fișiere compactate → {len(df)} rânduri")
+
+# =====================================================
+# 📖 Citire coloanară (memory-mapped)
+# =====================================================
+def load_table(table, columns=None):
+    """
+    Tot istoricul exportat al tabelului, doar cu coloanele cerute, citit
+    memory-mapped. Rândurile exportate de mai multe ori sunt deduplicate
+    după cheie: fișierele sunt în ordinea exportului, deci ultima apariție
+    e cea mai nouă versiune.
+    """
+    _require_pyarrow()
+    parts = _parts(table)
+    key = TABLES[table]["key"]
+    wanted = None if columns is None else list(dict.fromkeys([key, "last_updated", *columns]))
+    if not parts:
+        return pd.DataFrame(columns=wanted or list(TABLES[table]["columns"]))
+    categories = [c for c in CATEGORY_COLUMNS if c in (wanted or TABLES[table]["columns"])]
+    frames = [pq.read_table(path, columns=wanted, memory_map=True, read_dictionary=categories) for path in parts]
+    data = pa.concat_tables(frames)
+    if len(parts) > 1:
+        # deduplicare în Arrow (hash în C++), înainte de conversia cheilor în obiecte Python
+        rows = pa.table({key: data[key], "row": pa.array(np.arange(len(data)))})
+        last = rows.group_by(key).aggregate([("row", "max")])["row_max"].to_numpy()
+        data = data.take(np.sort(last))
+    if columns is not None and key not in columns:
+        data = data.drop_columns([key])
+    return data.to_pandas(ignore_metadata=True)
+
+# =====================================================
+# 🧮 Rapoarte
+# =====================================================
+def pnl_report(profits, window_days=7, symbol=None):
+    """Profit USDT per simbol per zi, cu suma pe ultimele `window_days` zile (rolling)."""
+    if symbol:
+        profits = profits[profits["symbol"] == symbol]
+    if profits.empty:
+        return pd.DataFrame(columns=["symbol", "day", "cycles", "profit_usdt", "avg_profit_pct", "rolling_usdt"])
+    df = profits.assign(day=profits["last_updated"].dt.floor("D"))
+    daily = df.groupby(["symbol", "day"], observed=True).agg(
+        cycles=("profit_usdt", "size"), profit_usdt=("profit_usdt", "sum"), avg_profit_pct=("profit_percent", "mean"))
+
+    out = []
+    for sym, group in daily.groupby(level="symbol", observed=True):
+        group = group.droplevel("symbol")
+        # zilele fără cicluri contează ca 0 în fereastra rulantă
+        group = group.reindex(pd.date_range(group.index.min(), group.index.max(), freq="D", tz="UTC"))
+        group[["cycles", "profit_usdt"]] = group[["cycles", "profit_usdt"]].fillna(0)
+        group["rolling_usdt"] = group["profit_usdt"].rolling(window_days, min_periods=1).sum()
+        out.append(group.rename_axis("day").reset_index().assign(symbol=sym))
+    result = pd.concat(out, ignore_index=True)
+    result["cycles"] = result["cycles"].astype(int)
+    return result[["symbol", "day", "cycles", "profit_usdt", "avg_profit_pct", "rolling_usdt"]]
+
+
+def _cycle_sell_prices(orders):
+    sells = orders[(orders["side"] == "SELL") & (orders["price"] > 0)]
+    return sells.sort_values("created_at", kind="stable").drop_duplicates("cycle_id").set_index("cycle_id")["price"]
+
+
+def fill_report(orders, bucket_pct=0.25, symbol=None):
+    """
+    Rata de fill a BUY-urilor pe discount-ul realizat față de SELL-ul ciclului
+    (găleți de `bucket_pct` %), cu timpul până la fill pentru cele executate.
+    """
+    if symbol:
+        orders = orders[orders["symbol"] == symbol]
+    buys = orders[orders["side"] == "BUY"]
+    sell_price = buys["cycle_id"].map(_cycle_sell_prices(orders))
+    buys = buys.assign(discount_pct=(1 - buys["price"] / sell_price) * 100).dropna(subset=["discount_pct"])
+    if buys.empty:
+        return pd.DataFrame(columns=["discount_pct", "buys", "executed", "canceled", "open", "fill_rate",
+                                     "fill_p50_h", "fill_p95_h"])
+    buys["discount_pct"] = (np.floor(buys["discount_pct"] / bucket_pct) * bucket_pct).round(4)
+    buys["fill_h"] = np.where(buys["status"] == "executed",
+                              (buys["last_updated"] - buys["created_at"]).dt.total_seconds() / 3600, np.nan)
+    status = buys["status"].astype(object)
+    buys = buys.assign(executed=status == "executed", canceled=status == "canceled",
+                       open=status.isin(["open", "pending"]))
+    grouped = buys.groupby("discount_pct")
+    result = grouped[["executed", "canceled", "open"]].sum().assign(
+        buys=grouped.size(), fill_p50_h=grouped["fill_h"].median(), fill_p95_h=grouped["fill_h"].quantile(0.95))
+    closed = result["executed"] + result["canceled"]
+    result["fill_rate"] = (result["executed"] / closed.where(closed > 0)).round(3)  # doar ordinele închise
+    return result.reset_index()[["discount_pct", "buys", "executed", "canceled", "open", "fill_rate",
+                                 "fill_p50_h", "fill_p95_h"]]
+
+
+def timing_report(orders, profits, symbol=None):
+    """Per simbol: timpul până la fill (SELL / BUY) și durata medie a ciclului (execution_time)."""
+    if symbol:
+        orders = orders[orders["symbol"] == symbol]
+        profits = profits[profits["symbol"] == symbol]
+    done = orders[orders["status"] == "executed"]
+    done = done.assign(fill_s=(done["last_updated"] - done["created_at"]).dt.total_seconds())
+    grouped = done.groupby(["symbol", "side"], observed=True)["fill_s"]
+    fills = pd.concat({"avg": grouped.mean(), "p95": grouped.quantile(0.95)}, axis=1).unstack("side")
+    fills.columns = [f"{str(side).lower()}_fill_{agg}_s" for agg, side in fills.columns]
+    fills = fills[sorted(fills.columns)]
+    cycles = profits.groupby("symbol", observed=True).agg(cycles=("profit_usdt", "size"), avg_execution_h=("execution_seconds", "mean"))
+    cycles["avg_execution_h"] = cycles["avg_execution_h"] / 3600
+    return fills.join(cycles, how="outer").rename_axis("symbol").reset_index()
+
+# =====================================================
+# 🚀 CLI
+# =====================================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export Parquet incremental + rapoarte STB din datele locale.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    export = sub.add_parser("export", help="adaugă rândurile noi din 'orders' și 'profit_per_cycle'")
+    export.add_argument("--every", type=int, default=0, help="repetă exportul la fiecare N secunde")
+    export.add_argument("--compact", action="store_true", help="compactează fișierele după export")
+
+    pnl = sub.add_parser("pnl", help="profit USDT per simbol per zi, cu sumă rulantă")
+    pnl.add_argument("--window", type=int, default=7, help="fereastra rulantă (zile)")
+    fills = sub.add_parser("fills", help="rata de fill a BUY-urilor după discount")
+    fills.add_argument("--bucket", type=float, default=0.25, help="lățimea găleții de discount (%%)")
+    timing = sub.add_parser("timing", help="timp până la fill și durata ciclurilor")
+    for report in (pnl, fills, timing):
+        report.add_argument("--symbol", help="doar un simbol (ex. HONEY-USDT)")
+        report.add_argument("--days", type=int, default=None, help="doar ultimele N zile")
+        report.add_argument("--out", help="salvează raportul (CSV)")
+    args = parser.parse_args(argv)
+    _require_pyarrow()
+
+    if args.command == "export":
+        while True:
+            try:
+                for table in TABLES:
+                    export_table(table)
+                    if args.compact:
+                        compact_table(table)
+            except Exception as e:
+                if not args.every:
+                    raise
+                print(f"❌ [STB] Export eșuat (reîncerc peste {args.every}s): {e}")
+            if not args.every:
+                return 0
+            time.sleep(args.every)
+
+    started = time.time()
+    cutoff = pd.Timestamp.now(tz="UTC") - pd.Timedelta(days=args.days) if args.days else None
+    orders = profits = None
+    if args.command in ("fills", "timing"):
+        orders = load_table("orders", ["cycle_id", "symbol", "side", "status", "price", "created_at"])
+        if cutoff is not None:
+            orders = orders[orders["created_at"] >= cutoff]
+    if args.command in ("pnl", "timing"):
+        profits = load_table("profit_per_cycle", ["symbol", "profit_usdt", "profit_percent", "execution_seconds"])
+        if cutoff is not None:
+            profits = profits[profits["last_updated"] >= cutoff]
+
+    if args.command == "pnl":
+        result = pnl_report(profits, args.window, args.symbol)
+    elif args.command == "fills":
+        result = fill_report(orders, args.bucket, args.symbol)
+    else:
+        result = timing_report(orders, profits, args.symbol)
+
+    print(result.to_string(index=False) if not result.empty else "(fără date — rulează întâi `analytics.py export`)")
+    rows = len(orders if orders is not None else profits)
+    print(f"\n⏱️ {rows} rânduri analizate în {time.time() - started:.2f}s")
+    if args.out:
+        result.to_csv(args.out, index=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+import os
+import asyncio
+import logging
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+# =====================================================
+# ⚙️ Constante
+# =====================================================
+ASYNC_IO_WORKERS = int(os.getenv("ASYNC_IO_WORKERS", "32"))  # apeluri KuCoin/Supabase simultane
+
+# =====================================================
+# ⚡ Engine asyncio: un task per bot, un pool mic pentru I/O
+# =====================================================
+class AsyncBotEngine:
+    """
+    Rulează fiecare bot ca task asyncio pe un singur event loop.
+    Pașii ciclului (apeluri KuCoin și Supabase, blocante) rulează într-un
+    pool limitat de thread-uri, iar pauzele (check_delay, cycle_delay)
+    sunt simple asyncio.sleep — niciun thread nu e ținut ocupat cât botul doarme.
+    """
+
+    def __init__(self, cycle_factory, max_workers=ASYNC_IO_WORKERS):
+        self.cycle_factory = cycle_factory
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="stb-io")
+        self.tasks = set()
+        self.loop = None
+
+    async def call(self, func, *args, **kwargs):
+        """Varianta async a unui apel blocant (exchange / supabase_client)."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    async def run_bot(self, control, start_delay=0):
+        symbol = control.settings.get("symbol")
+        if start_delay:
+            await asyncio.sleep(start_delay)
+
+        while not control.stopped:
+            cycles = self.cycle_factory(control)
+            try:
+                while True:
+                    pause = await self.call(next, cycles, None)
+                    if pause is None:
+                        return
+                    await sleep_pause(pause)
+            except asyncio.CancelledError:
+                cycles.close()
+                raise
+            except Exception as e:
+                logging.error(f"[{symbol}] ❌ Task bot căzut, repornesc în 30s: {e}")
+                await asyncio.sleep(30)
+
+    def start_bot(self, control, start_delay=0):
+        task = asyncio.create_task(self.run_bot(control, start_delay))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    def launch(self, control, start_delay=0):
+        """Pornește un bot din orice thread (ex. watcher-ul de setări)."""
+        self.loop.call_soon_threadsafe(self.start_bot, control, start_delay)
+
+    async def run_forever(self, on_ready=None):
+        self.loop = asyncio.get_running_loop()
+        logging.info(f"⚡ Async engine pornit: {self.max_workers} I/O workers")
+        if on_ready:
+            await self.call(on_ready)
+        await asyncio.Event().wait()
+
+
+async def sleep_pause(pause):
+    """Așteaptă o Pause fără să blocheze loop-ul; se trezește imediat când Signal-ul e setat."""
+    if pause.event is None:
+        await asyncio.sleep(pause.seconds)
+        return
+
+    loop = asyncio.get_running_loop()
+    woken = loop.create_future()
+
+    def wake():
+        loop.call_soon_threadsafe(_resolve, woken)
+
+    pause.event.add_callback(wake)
+    try:
+        await asyncio.wait([woken], timeout=pause.seconds)
+    finally:
+        pause.event.remove_callback(wake)
+        if not woken.done():
+            woken.cancel()
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
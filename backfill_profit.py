@@ -0,0 +1,120 @@
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+from supabase_client import supabase, ORDER_STRATEGIES
+
+# =====================================================
+# ⚙️ Constante
+# =====================================================
+PAGE_SIZE = 1000  # rânduri citite per request din 'orders'
+UPSERT_BATCH = 500  # rânduri scrise per upsert în 'profit_per_cycle'
+ORDER_COLUMNS = "cycle_id, side, price, created_at, last_updated, symbol, filled_size"
+
+# =====================================================
+# 📥 Citire ordine executate (paginat)
+# =====================================================
+def fetch_executed_orders(symbol=None):
+    rows = []
+    start = 0
+    while True:
+        query = (
+            supabase.table("orders")
+            .select(ORDER_COLUMNS)
+            .in_("strategy", list(ORDER_STRATEGIES))
+            .eq("status", "executed")
+            .order("created_at")
+            .range(start, start + PAGE_SIZE - 1)
+        )
+        if symbol:
+            query = query.eq("symbol", symbol)
+        page = query.execute().data or []
+        rows.extend(page)
+        if len(page) < PAGE_SIZE:
+            return rows
+        start += PAGE_SIZE
+
+# =====================================================
+# 🧮 Profit pentru toate ciclurile dintr-o singură trecere
+# =====================================================
+def compute_profits(orders):
+    """
+    Varianta vectorizată a compute_cycle_profit: primul SELL (după created_at)
+    vs toate picioarele BUY ale fiecărui cycle_id, aceleași reguli pentru cantitate.
+    """
+    df = pd.DataFrame(orders)
+    if df.empty:
+        return df
+
+    df = df.dropna(subset=["cycle_id"])
+    df["side"] = df["side"].astype(str).str.upper()
+    df["price"] = pd.to_numeric(df["price"], errors="coerce").fillna(0.0)
+    df["filled_size"] = pd.to_numeric(df["filled_size"], errors="coerce").fillna(0.0)
+    df["ts"] = pd.to_datetime(df["last_updated"].fillna(df["created_at"]), utc=True, format="ISO8601")
+    df["created_at"] = pd.to_datetime(df["created_at"], utc=True, format="ISO8601")
+    df = df[df["price"] > 0].sort_values("created_at", kind="stable")
+
+    cols = ["cycle_id", "symbol", "price", "filled_size", "ts"]
+    first_sell = df[df["side"] == "SELL"].drop_duplicates("cycle_id", keep="first")[cols]
+
+    # toate picioarele BUY ale ciclului (scară): preț mediu ponderat cu filled_size,
+    # media simplă când cantitățile lipsesc; cantitate totală, ultimul timestamp
+    buys = df[df["side"] == "BUY"].assign(notional=lambda d: d["price"] * d["filled_size"])
+    buy_legs = buys.groupby("cycle_id", sort=False).agg(
+        price=("price", "mean"), notional=("notional", "sum"), filled_size=("filled_size", "sum"), ts=("ts", "max"))
+    sized = buy_legs["filled_size"] > 0
+    buy_legs["price"] = np.where(sized, buy_legs["notional"] / buy_legs["filled_size"].where(sized, 1), buy_legs["price"])
+    all_buys = buy_legs.reset_index()[["cycle_id", "price", "filled_size", "ts"]]
+    cycles = first_sell.merge(all_buys, on="cycle_id", suffixes=("_sell", "_buy")).rename(columns={"symbol": "symbol_sell"})
+
+    sell_qty = cycles["filled_size_sell"]
+    buy_qty = cycles["filled_size_buy"]
+    both = (sell_qty > 0) & (buy_qty > 0)
+    cycles["qty"] = np.where(both, np.minimum(sell_qty, buy_qty), np.maximum(sell_qty, buy_qty))
+    cycles = cycles[cycles["qty"] > 0]
+
+    sell_price = cycles["price_sell"]
+    buy_price = cycles["price_buy"]
+    out = pd.DataFrame({
+        "cycle_id": cycles["cycle_id"],
+        "symbol": cycles["symbol_sell"],
+        "strategy": "SELL_BUY",
+        "sell_price": sell_price,
+        "buy_price": buy_price,
+        "profit_percent": ((sell_price - buy_price) / sell_price * 100).round(2),
+        "profit_usdt": ((sell_price - buy_price) * cycles["qty"]).round(6),
+        "profit_coin": 0.0,
+        # același format ca str(datetime.timedelta) folosit la calculul live
+        "execution_time": [str(td.to_pytimedelta()) for td in (cycles["ts_buy"] - cycles["ts_sell"]).abs()],
+        "last_updated": pd.Timestamp.now(tz="UTC").isoformat(),
+    })
+    return out
+
+# =====================================================
+# 💾 Upsert în loturi
+# =====================================================
+def upsert_profits(df, dry_run=False):
+    records = df.to_dict("records")
+    for i in range(0, len(records), UPSERT_BATCH):
+        batch = records[i:i + UPSERT_BATCH]
+        if not dry_run:
+            supabase.table("profit_per_cycle").upsert(batch).execute()
+        print(f"💾 [STB] profit_per_cycle {i + len(batch)}/{len(records)}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recalculează profit_per_cycle pentru tot istoricul STB.")
+    parser.add_argument("--symbol", help="doar un simbol (ex. HONEY-USDT)")
+    parser.add_argument("--dry-run", action="store_true", help="calculează fără să scrie în Supabase")
+    args = parser.parse_args(argv)
+
+    orders = fetch_executed_orders(args.symbol)
+    print(f"📥 [STB] {len(orders)} ordine executate citite")
+    profits = compute_profits(orders)
+    print(f"🧮 [STB] {len(profits)} cicluri complete")
+    upsert_profits(profits, args.dry_run)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+import os
+import sys
+import time
+import argparse
+import itertools
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+# =====================================================
+# ⚙️ Constante
+# =====================================================
+TICK_SIZE = 0.00001  # priceIncrement HONEY-USDT (live, botul îl ia din symbols.py)
+PRICE_DECIMALS = 5
+TIME_COLUMNS = ("timestamp", "time", "ts", "date", "datetime", "open_time")
+
+# =====================================================
+# 📥 Încărcare date istorice (candles sau trades)
+# =====================================================
+def load_market_data(path):
+    """
+    Citește un CSV/Parquet cu lumânări (open/high/low/close) sau trades (price/size)
+    și întoarce lumânări de 1 minut indexate după timp (UTC).
+    """
+    if path.endswith(".parquet"):
+        df = pd.read_parquet(path)
+    else:
+        df = pd.read_csv(path)
+    df.columns = [str(c).lower() for c in df.columns]
+
+    time_col = next((c for c in TIME_COLUMNS if c in df.columns), None)
+    if time_col is None:
+        raise ValueError(f"Nu găsesc coloana de timp ({', '.join(TIME_COLUMNS)}) în {path}")
+
+    ts = df[time_col]
+    if pd.api.types.is_numeric_dtype(ts):
+        unit = "ms" if ts.max() > 1e11 else "s"
+        df.index = pd.to_datetime(ts, unit=unit, utc=True)
+    else:
+        df.index = pd.to_datetime(ts, utc=True)
+    df = df.sort_index()
+
+    if {"open", "low"}.issubset(df.columns):
+        candles = df[["open", "high", "low", "close"]].astype(float)
+    elif "price" in df.columns:
+        candles = df["price"].astype(float).resample("1min").ohlc().dropna()
+    else:
+        raise ValueError("Fișierul trebuie să aibă coloane open/high/low/close sau price")
+    return candles
+
+# =====================================================
+# 🧮 Date pregătite o singură dată (tabel sparse de minime)
+# =====================================================
+class MarketArrays:
+    """
+    Prețurile ca array-uri NumPy plus un tabel sparse de minime pe intervale
+    2^k, ca prima atingere a prețului BUY să fie găsită pentru toate ciclurile
+    deodată în O(log n) pași vectorizați.
+    """
+
+    def __init__(self, candles):
+        self.times = candles.index.values.astype("datetime64[s]").astype(np.int64)  # secunde epoch
+        self.open = candles["open"].to_numpy(np.float64)
+        self.low = candles["low"].to_numpy(np.float64)
+        self.close = candles["close"].to_numpy(np.float64)
+        self.n = len(self.low)
+
+        levels = [self.low]
+        span = 1
+        while span * 2 <= self.n:
+            prev = levels[-1]
+            levels.append(np.minimum(prev[:-span], prev[span:]))
+            span *= 2
+        self.min_levels = levels
+
+    def first_touch(self, start_idx, prices):
+        """Primul index >= start_idx cu low <= price (sau n dacă nu e atins)."""
+        pos = start_idx.copy()
+        for k in range(len(self.min_levels) - 1, -1, -1):
+            level = self.min_levels[k]
+            valid = pos < len(level)
+            idx = np.where(valid, pos, 0)
+            jump = valid & (level[idx] > prices)
+            pos = np.where(jump, pos + (1 << k), pos)
+        hit = (pos < self.n)
+        hit[hit] = self.low[pos[hit]] <= prices[hit]
+        return np.where(hit, pos, self.n)
+
+
+def adjust_price_to_tick(prices, tick_size=TICK_SIZE):
+    """Varianta vectorizată a symbols.round_price (cel mai apropiat tick)."""
+    return np.round(np.round(prices / tick_size) * tick_size, PRICE_DECIMALS)
+
+# =====================================================
+# 🔁 Simularea strategiei STB
+# =====================================================
+def simulate(market, buy_discount, cycle_delay, amount=1.0, slippage_bps=0.0, fee_rate=0.0, tick_size=TICK_SIZE):
+    """
+    SELL market la începutul fiecărui ciclu (open-ul lumânării), BUY limit la
+    adjust_price_to_tick(avg * (1 - buy_discount)), executat când low <= preț
+    într-o lumânare ulterioară. Întoarce un DataFrame cu un rând per ciclu.
+    """
+    if buy_discount > 1:
+        buy_discount = buy_discount / 100.0
+
+    starts = np.arange(market.times[0], market.times[-1], cycle_delay)
+    sell_idx = np.searchsorted(market.times, starts)
+    sell_idx = np.unique(sell_idx[sell_idx < market.n - 1])
+
+    sell_price = market.open[sell_idx] * (1 - slippage_bps / 10_000)
+    buy_price = adjust_price_to_tick(sell_price * (1 - buy_discount), tick_size)
+    fill_idx = market.first_touch(sell_idx + 1, buy_price)
+    filled = fill_idx < market.n
+
+    gross = (sell_price - buy_price) * amount
+    fees = (sell_price + buy_price) * amount * fee_rate
+    fill_times = np.where(filled, market.times[np.minimum(fill_idx, market.n - 1)], 0)
+
+    return pd.DataFrame({
+        "sell_time": market.times[sell_idx],
+        "sell_price": sell_price,
+        "buy_price": buy_price,
+        "filled": filled,
+        "profit_percent": np.where(filled, np.round((sell_price - buy_price) / sell_price * 100, 2), np.nan),
+        "profit_usdt": np.where(filled, np.round(gross - fees, 6), np.nan),
+        "execution_time": np.where(filled, fill_times - market.times[sell_idx], np.nan),
+        "fill_idx": fill_idx,
+        "sell_idx": sell_idx,
+    })
+
+
+def summarize(market, cycles, amount=1.0):
+    """Metricile agregate ale unei rulări (aceleași ca în profit_per_cycle + inventar)."""
+    filled = cycles["filled"].to_numpy()
+    unfilled = ~filled
+
+    # câte BUY-uri sunt deschise simultan (vârful de inventar blocat)
+    delta = np.zeros(market.n + 1, dtype=np.int64)
+    np.add.at(delta, cycles["sell_idx"].to_numpy(), 1)
+    np.add.at(delta, cycles["fill_idx"].to_numpy(), -1)
+    open_buys = np.cumsum(delta)[:-1]
+
+    last_close = market.close[-1]
+    return {
+        "cycles": len(cycles),
+        "filled": int(filled.sum()),
+        "fill_rate": float(filled.mean()) if len(cycles) else 0.0,
+        "profit_percent_avg": float(np.nanmean(cycles["profit_percent"])) if filled.any() else 0.0,
+        "profit_usdt": float(np.nansum(cycles["profit_usdt"])),
+        "execution_time_avg_s": float(np.nanmean(cycles["execution_time"])) if filled.any() else np.nan,
+        "execution_time_p50_s": float(np.nanmedian(cycles["execution_time"])) if filled.any() else np.nan,
+        "unfilled_buys": int(unfilled.sum()),
+        "unfilled_coin": float(unfilled.sum() * amount),
+        "unrealized_usdt": float(((cycles["sell_price"][unfilled] - last_close) * amount).sum()),
+        "max_open_buys": int(open_buys.max()) if len(open_buys) else 0,
+    }
+
+# =====================================================
+# 🧪 Sweep de parametri pe un pool de procese
+# =====================================================
+_worker_market = None
+
+
+def _init_worker(path):
+    global _worker_market
+    _worker_market = MarketArrays(load_market_data(path))
+
+
+def _run_combo(args):
+    buy_discount, cycle_delay, amount, slippage_bps, fee_rate = args
+    cycles = simulate(_worker_market, buy_discount, cycle_delay, amount, slippage_bps, fee_rate)
+    row = {"buy_discount": buy_discount, "cycle_delay": cycle_delay}
+    row.update(summarize(_worker_market, cycles, amount))
+    return row
+
+
+def sweep(path, discounts, cycle_delays, amount=1.0, slippage_bps=0.0, fee_rate=0.0, workers=None):
+    combos = [(d, c, amount, slippage_bps, fee_rate) for d, c in itertools.product(discounts, cycle_delays)]
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(combos) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(path,)) as pool:
+        rows = list(pool.map(_run_combo, combos, chunksize=chunksize))
+    return pd.DataFrame(rows).sort_values("profit_usdt", ascending=False)
+
+
+def parse_range(spec, cast=float):
+    """'0.5:5:0.25' → 0.5, 0.75 ... 5 ; '1,2,4' → listă."""
+    if ":" in spec:
+        start, stop, step = (float(x) for x in spec.split(":"))
+        return [cast(round(v, 10)) for v in np.arange(start, stop + step / 2, step)]
+    return [cast(v) for v in spec.split(",")]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backtest + sweep pentru strategia Sell-Then-Buy.")
+    parser.add_argument("data", help="CSV/Parquet cu lumânări sau trades HONEY-USDT")
+    parser.add_argument("--discounts", default="1", help="buy_discount în %%: '0.5:5:0.25' sau '1,2,3'")
+    parser.add_argument("--cycle-hours", default="20", help="cycle_delay în ore: '1:24:1' sau '4,8,20'")
+    parser.add_argument("--amount", type=float, default=1.0, help="cantitatea vândută per ciclu")
+    parser.add_argument("--slippage-bps", type=float, default=0.0)
+    parser.add_argument("--fee", type=float, default=0.0, help="comision per latură (ex. 0.001)")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--cycles-out", help="salvează ciclurile (doar pentru o singură combinație)")
+    parser.add_argument("--out", help="salvează rezultatele sweep-ului (CSV)")
+    args = parser.parse_args(argv)
+
+    discounts = [d / 100.0 for d in parse_range(args.discounts)]
+    cycle_delays = [int(h * 3600) for h in parse_range(args.cycle_hours)]
+
+    started = time.time()
+    if len(discounts) * len(cycle_delays) == 1:
+        market = MarketArrays(load_market_data(args.data))
+        cycles = simulate(market, discounts[0], cycle_delays[0], args.amount, args.slippage_bps, args.fee)
+        if args.cycles_out:
+            cycles.drop(columns=["fill_idx", "sell_idx"]).to_csv(args.cycles_out, index=False)
+        results = pd.DataFrame([{"buy_discount": discounts[0], "cycle_delay": cycle_delays[0],
+                                 **summarize(market, cycles, args.amount)}])
+    else:
+        results = sweep(args.data, discounts, cycle_delays, args.amount, args.slippage_bps, args.fee, args.workers)
+
+    print(results.head(20).to_string(index=False))
+    print(f"\n⏱️ {len(results)} combinație(i) în {time.time() - started:.1f}s")
+    if args.out:
+        results.to_csv(args.out, index=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,255 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+import argparse
+import tempfile
+import threading
+import tracemalloc
+
+# =====================================================
+# ⚙️ Mediu izolat: nimic nu pleacă spre KuCoin sau Supabase
+# =====================================================
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "bench.bench.bench")
+os.environ.setdefault("LOG_DIR", "")  # fără logs/ din benchmark
+_BENCH_DIR = tempfile.mkdtemp(prefix="stb-bench-")
+os.environ.setdefault("JOURNAL_PATH", os.path.join(_BENCH_DIR, "journal.db"))
+os.environ.setdefault("CYCLE_STATE_PATH", os.path.join(_BENCH_DIR, "cycle_state.db"))
+os.environ.setdefault("TRACE_PATH", os.path.join(_BENCH_DIR, "traces.db"))
+
+from fakes import FakeExchange, FakeSupabase  # noqa: E402
+
+# =====================================================
+# 📊 Utilitare
+# =====================================================
+def say(*items):
+    """Raportul benchmark-ului merge pe stdout-ul real; print-urile botilor sunt ignorate."""
+    print(*items, file=sys.__stdout__, flush=True)
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def rss_mb():
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 1e6
+    except ImportError:
+        return float("nan")
+
+
+def print_counts(title, counts):
+    say(f"\n{title}")
+    for name, n in sorted(counts.items(), key=lambda kv: -kv[1]):
+        say(f"   {n:>8}  {name}")
+
+
+def drain(journal, timeout=60):
+    """Așteaptă ca flusher-ul write-behind să trimită tot jurnalul."""
+    deadline = time.time() + timeout
+    while journal is not None and journal.pending() and time.time() < deadline:
+        time.sleep(0.05)
+
+
+def make_settings(n_bots, n_accounts, args):
+    return [
+        {
+            "id": i + 1,
+            "symbol": f"B{i:04d}-USDT",
+            "amount": 10,
+            "buy_discount": args.buy_discount,
+            "buy_ladder": args.ladder,
+            "check_delay": args.check_delay,
+            "cycle_delay": args.cycle_delay,
+            "api_key": f"acct{i % n_accounts}",
+            "api_secret": "secret",
+            "api_passphrase": "pass",
+            "strategy": "sell_buy",
+            "active": True,
+            "updated_at": "2026-01-01T00:00:00+00:00",
+        }
+        for i in range(n_bots)
+    ]
+
+# =====================================================
+# 🤖 Benchmark boti: cicluri/s, SELL fill → BUY plasat, memorie
+# =====================================================
+def bench_bots(main, exchange, db, args):
+    from bot_runtime import BotSupervisor, StartupScheduler
+    from order_stream import OrderStream, register_stream
+    from metrics import KUCOIN_RECOVERED, KUCOIN_CIRCUIT_OPENED, KUCOIN_SHORT_CIRCUITS
+
+    bots = make_settings(args.bots, args.accounts, args)
+    db.seed("settings", bots)
+    exchange.list_symbols(b["symbol"] for b in bots)
+
+    if args.stream:
+        for i in range(args.accounts):
+            stream = OrderStream(f"acct{i}", "secret", "pass")
+            stream.start_local()
+            register_stream(f"acct{i}", stream)
+            exchange.attach_stream(f"acct{i}", stream)
+
+    tracemalloc.start()
+    rss_before = rss_mb()
+    threads_before = threading.active_count()
+    mem_before = tracemalloc.get_traced_memory()[0]
+
+    if args.runtime == "asyncio":
+        from async_engine import AsyncBotEngine
+
+        engine = AsyncBotEngine(main.stb_cycles)
+        supervisor = BotSupervisor(engine.launch, StartupScheduler())
+        ready = threading.Event()
+
+        threading.Thread(target=lambda: asyncio.run(engine.run_forever(on_ready=ready.set)), daemon=True).start()
+        ready.wait(10)
+    else:
+        supervisor = BotSupervisor(main.launch_thread_bot, StartupScheduler())
+
+    started = time.time()
+    if args.outage:
+        at, seconds = (float(x) for x in args.outage.split(":"))
+        threading.Timer(at, exchange.outage, (seconds,)).start()
+    supervisor.apply(main.load_stb_bots())
+    time.sleep(min(2.0, args.duration / 4))
+    mem_bots = tracemalloc.get_traced_memory()[0] - mem_before
+    rss_bots = rss_mb() - rss_before
+    threads_bots = threading.active_count() - threads_before
+
+    time.sleep(max(0.0, args.duration - (time.time() - started)))
+    elapsed = time.time() - started
+    sells = exchange.counts["POST /api/v1/orders"]
+    buys = len(exchange.sell_to_buy)
+    supervisor.apply([])
+    tracemalloc.stop()
+
+    lat_ms = [x * 1000 for x in exchange.sell_to_buy]
+    first_sell = {}
+    for order in list(exchange.orders.values()):
+        first_sell[order["symbol"]] = min(first_sell.get(order["symbol"], order["createdAt"]), order["createdAt"])
+    ready_after = (max(first_sell.values()) / 1000 - started) if len(first_sell) == args.bots else float("nan")
+    say(f"\n🤖 {args.bots} boti / {args.accounts} conturi / runtime={args.runtime} / stream={'da' if args.stream else 'nu'} / {elapsed:.1f}s")
+    say(f"   toți botii activi (primul SELL plasat) după {ready_after:.1f}s")
+    say(f"   cicluri complete (BUY plasat): {buys} → {buys / elapsed:.1f}/s   (ordine plasate: {sells})")
+    say(f"   SELL fill → BUY plasat: p50={percentile(lat_ms, 50):.0f}ms  p95={percentile(lat_ms, 95):.0f}ms  p99={percentile(lat_ms, 99):.0f}ms")
+    say(f"   memorie per bot: {mem_bots / args.bots / 1024:.1f} KiB (tracemalloc), "
+        f"{rss_bots / args.bots * 1000:.0f} KB (RSS), thread-uri noi: {threads_bots}")
+    say(f"   ordine recuperate după clientOid: {sum(KUCOIN_RECOVERED._values.values())}, "
+        f"circuite deschise: {sum(KUCOIN_CIRCUIT_OPENED._values.values())}, "
+        f"apeluri refuzate local: {sum(KUCOIN_SHORT_CIRCUITS._values.values())}")
+    print_counts("📡 Request-uri KuCoin (fake):", exchange.counts)
+    if exchange.errors:
+        print_counts("💥 Erori injectate:", exchange.errors)
+    print_counts("🗄️ Operații Supabase (fake):", db.counts)
+
+# =====================================================
+# 🔍 Benchmark checker: legacy (per ordin) vs reconciliere în bloc
+# =====================================================
+def seed_open_orders(exchange, db, n_orders, n_symbols, fill_ratio):
+    client = exchange.client("checker", "secret", "pass")
+    symbols = [f"C{i:03d}-USDT" for i in range(n_symbols)]
+    rows = []
+    for i in range(n_orders):
+        symbol = symbols[i % n_symbols]
+        price = 0.0001 if i < n_orders * (1 - fill_ratio) else 10.0  # BUY peste piață → executat imediat
+        order_id = exchange.place("checker", symbol, "buy", "limit", 10, price)
+        rows.append({"order_id": order_id, "symbol": symbol, "side": "BUY", "price": price, "status": "open",
+                     "strategy": "STB", "cycle_id": f"cycle-{i}", "last_updated": f"2026-01-01T00:{i % 60:02d}:00"})
+    db.seed("orders", rows)
+    time.sleep(exchange.tick * 5)  # lăsăm ticker-ul să execute ordinele „umplute”
+    return client, symbols
+
+
+def bench_checker(main, exchange, db, args):
+    from reconciler import reconcile_account
+    from open_orders import get_order_index
+
+    for mode in ("legacy", "reconcile"):
+        db.tables["orders"] = []
+        exchange.counts.clear()
+        db.counts.clear()
+        client, symbols = seed_open_orders(exchange, db, args.open_orders, args.symbols, args.fill_ratio)
+        get_order_index().seed()  # indexul citește o singură dată tabelul, ca la pornirea worker-ului
+        db.counts.clear()
+
+        started = time.time()
+        if mode == "legacy":
+            for symbol in symbols:
+                main.check_old_orders(client, symbol)
+        else:
+            reconcile_account(client, set(symbols))
+        drain(main.get_journal())
+        elapsed = time.time() - started
+
+        executed = sum(1 for r in db.tables["orders"] if r.get("status") == "executed")
+        say(f"\n🔍 Checker {mode}: {args.open_orders} ordine deschise / {args.symbols} simboluri → {elapsed:.2f}s, "
+            f"{sum(exchange.counts.values())} request-uri KuCoin, {sum(db.counts.values())} operații Supabase, "
+            f"{executed} marcate executate")
+
+# =====================================================
+# 🚀 CLI
+# =====================================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark local STB (exchange + Supabase simulate).")
+    parser.add_argument("--bots", type=int, default=50)
+    parser.add_argument("--accounts", type=int, default=5)
+    parser.add_argument("--duration", type=float, default=20, help="secunde de rulare pentru boti")
+    parser.add_argument("--runtime", choices=["threads", "asyncio"], default="threads")
+    parser.add_argument("--stream", action="store_true", help="fill-uri prin order stream (altfel polling REST)")
+    parser.add_argument("--cycle-delay", type=int, default=1, help="cycle_delay al botilor (secunde)")
+    parser.add_argument("--check-delay", type=int, default=0, help="check_delay al botilor (0 = 100ms)")
+    parser.add_argument("--buy-discount", type=float, default=0.05, help="în %%")
+    parser.add_argument("--ladder", default=None, help="buy_ladder al botilor, ex. '0.05:40,0.1:30,0.2:30'")
+    parser.add_argument("--latency-ms", type=float, default=20, help="latența medie a unui request KuCoin")
+    parser.add_argument("--db-latency-ms", type=float, default=10, help="latența unei operații Supabase")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fracțiunea de request-uri KuCoin eșuate")
+    parser.add_argument("--lost-reply-rate", type=float, default=0.0, help="fracțiunea de plasări acceptate cu răspuns pierdut")
+    parser.add_argument("--outage", default=None, help="cădere simulată a exchange-ului, 'START:SECUNDE' de la pornire")
+    parser.add_argument("--partial-rate", type=float, default=0.1, help="fracțiunea de ordine executate în 2 bucăți")
+    parser.add_argument("--open-orders", type=int, default=500, help="ordine deschise pentru benchmark-ul checker-ului")
+    parser.add_argument("--symbols", type=int, default=20)
+    parser.add_argument("--fill-ratio", type=float, default=0.3)
+    parser.add_argument("--skip-bots", action="store_true")
+    parser.add_argument("--skip-checker", action="store_true")
+    args = parser.parse_args(argv)
+
+    if not args.stream:
+        os.environ["ORDER_STREAM_ENABLED"] = "0"
+
+    import exchange as kucoin
+    import supabase_client
+    import symbols
+    import market_data
+
+    fake_exchange = FakeExchange(latency_ms=args.latency_ms, error_rate=args.error_rate,
+                                 partial_fill_rate=args.partial_rate, lost_reply_rate=args.lost_reply_rate, seed=1)
+    fake_db = FakeSupabase(latency_ms=args.db_latency_ms, seed=1)
+    supabase_client.use_client(fake_db)
+    kucoin.use_client_factory(fake_exchange.client)
+    symbols.use_loader(fake_exchange.symbol_list)
+    market = market_data.MarketData(local=True)
+    market_data.use_market_data(market)
+    fake_exchange.attach_market(market)
+
+    import main as stb
+    logging.getLogger().setLevel(logging.WARNING)
+    sys.stdout = open(os.devnull, "w")  # print-urile din exchange / supabase_client / reconciler
+    if not args.skip_bots:
+        bench_bots(stb, fake_exchange, fake_db, args)
+    if not args.skip_checker:
+        bench_checker(stb, fake_exchange, fake_db, args)
+    logging.disable(logging.CRITICAL)  # botii daemon încă rulează până la ieșirea procesului
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,223 @@
+import os
+import time
+import random
+import logging
+import threading
+from collections import defaultdict
+from rate_limit import get_budget, RESERVE, NORMAL
+
+# =====================================================
+# ⚙️ Constante
+# =====================================================
+STARTUP_JITTER_SECONDS = float(os.getenv("STARTUP_JITTER_SECONDS", "5"))  # fereastra minimă de împrăștiere
+STARTUP_CYCLE_WEIGHT = 12  # greutatea aproximativă a unui început de ciclu: SELL + verificări + BUY
+
+# =====================================================
+# 🔔 Semnal care trezește thread-uri și task-uri asyncio
+# =====================================================
+class Signal:
+    """
+    Ca threading.Event, dar poate trezi și un task asyncio: callback-urile
+    înregistrate sunt apelate (o singură dată) la set().
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def set(self):
+        with self._lock:
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def clear(self):
+        self._event.clear()
+
+    def is_set(self):
+        return self._event.is_set()
+
+    def wait(self, timeout=None):
+        return self._event.wait(timeout)
+
+    def add_callback(self, callback):
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def remove_callback(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+def any_signal(signals):
+    """Signal setat de primul dintre `signals` → (signal, detach); detach() desface legăturile."""
+    combined = Signal()
+    for signal in signals:
+        signal.add_callback(combined.set)
+
+    def detach():
+        for signal in signals:
+            signal.remove_callback(combined.set)
+    return combined, detach
+
+# =====================================================
+# ⏸️ Pauze cedate de ciclul STB
+# =====================================================
+class Pause:
+    """
+    Pauză cerută de un ciclu STB: durata în secunde și, opțional, un
+    Signal care o scurtează (ex. fill-ul primit pe order stream).
+    """
+
+    __slots__ = ("seconds", "event")
+
+    def __init__(self, seconds, event=None):
+        self.seconds = max(0.0, float(seconds))
+        self.event = event
+
+    def __repr__(self):
+        return f"Pause({self.seconds}s, event={'yes' if self.event else 'no'})"
+
+# =====================================================
+# 🎛️ Control per bot (setări curente, stop, reconfigurare)
+# =====================================================
+class BotControl:
+    """
+    Legătura dintre supervisor și un bot care rulează: setările curente
+    (citite de bot la fiecare ciclu), cererea de oprire și semnalul care
+    scurtează așteptarea dintre cicluri când ceva se schimbă.
+    """
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.wake = Signal()
+        self._stopped = False
+
+    @property
+    def stopped(self):
+        return self._stopped
+
+    def stop(self):
+        """Oprire la granița de ciclu (nu întrerupe un SELL în curs)."""
+        self._stopped = True
+        self.wake.set()
+
+    def reconfigure(self, settings):
+        """Noile setări se aplică de la următorul ciclu; cycle_delay se recalculează imediat."""
+        self.settings = settings
+        self.wake.set()
+
+
+def bot_key(settings):
+    """Identitatea unui bot: rândul din settings + contul + simbolul."""
+    return (settings.get("id"), settings["api_key"], settings["symbol"])
+
+
+BOT_PARAMS = ("amount", "buy_discount", "buy_ladder", "check_delay", "cycle_delay", "schedule_mode",
+              "min_cycle_spacing", "max_open_cycles", "max_open_buys", "api_secret", "api_passphrase")
+
+
+def bot_params(settings):
+    return tuple(str(settings.get(k)) for k in BOT_PARAMS)
+
+# =====================================================
+# 🚦 Pornire în paralel, cu primul SELL împrăștiat în bugetul contului
+# =====================================================
+class StartupScheduler:
+    """
+    Calculează întârzierea de pornire pentru un lot de boti noi. Toți pornesc
+    imediat, dar primul SELL al botilor de pe același cont e împrăștiat cu
+    jitter într-o fereastră cât să încapă în bugetul de rate limit: ce nu
+    încape în găleata curentă se întinde pe rata ei de reumplere. Botii pentru
+    care `immediate(settings)` e adevărat (ex. un ciclu de reluat) pornesc fără întârziere.
+    """
+
+    def __init__(self, jitter=STARTUP_JITTER_SECONDS, cycle_weight=STARTUP_CYCLE_WEIGHT, rng=None, immediate=None):
+        self.jitter = jitter
+        self.cycle_weight = cycle_weight
+        self.rng = rng or random.Random()
+        self.immediate = immediate
+
+    def plan(self, bots):
+        by_account = defaultdict(list)
+        for i, settings in enumerate(bots):
+            if self.immediate and self.immediate(settings):
+                continue
+            by_account[settings["api_key"]].append(i)
+
+        delays = [0.0] * len(bots)
+        for api_key, indexes in by_account.items():
+            budget = get_budget(api_key)
+            usable = max(0.0, budget.available() - budget.capacity * RESERVE[NORMAL])
+            overflow = max(0.0, len(indexes) * self.cycle_weight - usable)
+            window = self.jitter + overflow / budget.rate
+            slot = window / len(indexes)
+            self.rng.shuffle(indexes)
+            for n, i in enumerate(indexes):
+                delays[i] = n * slot + self.rng.uniform(0, slot)
+        return delays
+
+# =====================================================
+# 🧭 Supervisor: aplică diff-ul între setări și botii care rulează
+# =====================================================
+class BotSupervisor:
+    """
+    Ține evidența botilor porniți și, la fiecare set nou de setări, pornește
+    doar botii noi, îi oprește pe cei dispăruți/dezactivați și reconfigurează
+    în loc botii ai căror parametri s-au schimbat.
+    """
+
+    def __init__(self, launcher, scheduler=None):
+        self.launcher = launcher  # launcher(control, start_delay)
+        self.scheduler = scheduler
+        self.controls = {}
+        self._lock = threading.Lock()
+
+    def apply(self, bots):
+        desired = {bot_key(b): b for b in bots}
+        started, stopped, reconfigured = 0, 0, 0
+        with self._lock:
+            for key in list(self.controls):
+                if key not in desired:
+                    self.controls.pop(key).stop()
+                    stopped += 1
+                    logging.info(f"[{key[2]}] 🛑 Bot oprit (dezactivat/șters din settings)")
+
+            new_bots = []
+            for key, settings in desired.items():
+                control = self.controls.get(key)
+                if control is None:
+                    new_bots.append(settings)
+                elif bot_params(control.settings) != bot_params(settings):
+                    control.reconfigure(settings)
+                    reconfigured += 1
+                    logging.info(f"[{key[2]}] 🔧 Bot reconfigurat fără restart")
+
+            delays = self.scheduler.plan(new_bots) if self.scheduler else [0.0] * len(new_bots)
+            for settings, delay in zip(new_bots, delays):
+                control = BotControl(settings)
+                self.controls[bot_key(settings)] = control
+                self.launcher(control, delay)
+                started += 1
+            if new_bots and self.scheduler:
+                logging.info(f"🚦 {started} bot(i) porniți; primul SELL împrăștiat în {max(delays, default=0):.1f}s")
+
+        if started or stopped or reconfigured:
+            logging.info(f"♻️ Settings diff: +{started} / -{stopped} / ~{reconfigured} bot(i)")
+        return {"started": started, "stopped": stopped, "reconfigured": reconfigured}
+
+# =====================================================
+# 🧵 Rulare pe thread dedicat (modul clasic)
+# =====================================================
+def drive_blocking(cycles):
+    """Consumă generatorul de cicluri pe thread-ul curent, dormind între pași."""
+    for pause in cycles:
+        if pause.event is not None:
+            pause.event.wait(pause.seconds)
+        else:
+            time.sleep(pause.seconds)
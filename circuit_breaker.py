@@ -0,0 +1,106 @@
+import os
+import re
+import time
+import logging
+import threading
+import requests
+from metrics import KUCOIN_CIRCUIT_OPENED, KUCOIN_SHORT_CIRCUITS
+
+# =====================================================
+# ⚙️ Constante
+# =====================================================
+CIRCUIT_FAILURES = int(os.getenv("KUCOIN_CIRCUIT_FAILURES", "5"))  # erori de outage consecutive → deschis
+CIRCUIT_OPEN_SECONDS = float(os.getenv("KUCOIN_CIRCUIT_OPEN_SECONDS", "15"))
+CIRCUIT_MAX_OPEN_SECONDS = float(os.getenv("KUCOIN_CIRCUIT_MAX_OPEN_SECONDS", "300"))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+# SDK-ul KuCoin ridică Exception("<http status>-<body>"); 5xx = exchange-ul are probleme
+_SERVER_ERROR = re.compile(r"^5\d\d-")
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+# =====================================================
+# 🔌 Circuit breaker per endpoint (partajat de toate conturile)
+# =====================================================
+def is_outage(error):
+    """Eroare de exchange/rețea (5xx, timeout, conexiune), nu un ordin respins."""
+    if isinstance(error, (requests.ConnectionError, requests.Timeout, TimeoutError, ConnectionError)):
+        return True
+    return bool(_SERVER_ERROR.match(str(error)))
+
+
+class CircuitBreaker:
+    """
+    După CIRCUIT_FAILURES erori de outage la rând endpoint-ul e considerat
+    căzut: apelurile eșuează imediat, fără request și fără sleep-uri, cât
+    timp circuitul e deschis. Apoi un singur apel de probă (half-open) decide:
+    reușita închide circuitul, eșecul îl redeschide pe o perioadă dublată.
+    Erorile de business (4xx: fonduri insuficiente, ordin invalid) arată că
+    exchange-ul răspunde, deci nu deschid circuitul.
+    """
+
+    def __init__(self, endpoint, failures=CIRCUIT_FAILURES, open_seconds=CIRCUIT_OPEN_SECONDS):
+        self.endpoint = endpoint
+        self.failures = failures
+        self.open_seconds = open_seconds
+        self.state = CLOSED
+        self._consecutive = 0
+        self._cooldown = open_seconds
+        self._open_until = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """True dacă apelul poate pleca; False = circuit deschis (eșuăm repede)."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() >= self._open_until:
+                self.state = HALF_OPEN
+                self._probing = False
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True  # un singur apel de probă; restul așteaptă verdictul
+                return True
+        KUCOIN_SHORT_CIRCUITS.inc(endpoint=self.endpoint)
+        return False
+
+    def success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                logging.info(f"🔌 Circuit {self.endpoint} închis (exchange-ul răspunde din nou)",
+                             extra={"status": "circuit_closed"})
+            self.state = CLOSED
+            self._consecutive = 0
+            self._cooldown = self.open_seconds
+            self._probing = False
+
+    def failure(self, error):
+        if not is_outage(error):
+            self.success()
+            return
+        with self._lock:
+            self._consecutive += 1
+            if self.state == HALF_OPEN:
+                self._cooldown = min(self._cooldown * 2, CIRCUIT_MAX_OPEN_SECONDS)
+            elif self.state == OPEN or self._consecutive < self.failures:
+                return
+            self.state = OPEN
+            self._open_until = time.monotonic() + self._cooldown
+            self._probing = False
+            cooldown = self._cooldown
+        KUCOIN_CIRCUIT_OPENED.inc(endpoint=self.endpoint)
+        logging.error(f"🔌 Circuit {self.endpoint} deschis pentru {cooldown:.0f}s după erori repetate: {error}",
+                      extra={"status": "circuit_open"})
+
+    @property
+    def is_open(self):
+        return self.state != CLOSED
+
+
+def get_breaker(endpoint):
+    with _breakers_lock:
+        breaker = _breakers.get(endpoint)
+        if breaker is None:
+            breaker = _breakers[endpoint] = CircuitBreaker(endpoint)
+        return breaker
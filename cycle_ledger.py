@@ -0,0 +1,185 @@
+import time
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from write_behind import register_call, persist_upsert, persist_call
+from cycle_state import mark_order_filled
+from tracing import record_late
+
+# =====================================================
+# ⚙️ Constante
+# =====================================================
+MAX_CYCLES = 20000  # cicluri ținute în memorie (cele mai vechi sunt evacuate)
+
+# =====================================================
+# 🧮 Calcul profit pentru un ciclu (SELL → BUY, în USDT)
+# =====================================================
+def _parse_ts(value):
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+
+
+def _combine_buy_legs(buys):
+    """(preț mediu ponderat cu filled_size, cantitate totală); media simplă dacă lipsesc cantitățile."""
+    sizes = [float(o.get("filled_size") or 0) for o in buys]
+    prices = [float(o["price"]) for o in buys]
+    total = sum(sizes)
+    if total > 0:
+        return sum(p * q for p, q in zip(prices, sizes)) / total, total
+    return sum(prices) / len(prices), 0.0
+
+
+def compute_cycle_profit(cycle_id, orders):
+    """
+    Calculează rândul 'profit_per_cycle' din ordinele executate ale ciclului.
+    Returnează (row, None) sau (None, motiv) dacă ciclul nu e complet/valid.
+    """
+    if len(orders) < 2:
+        return None, "incomplete cycle"
+
+    # Separăm SELL / BUY și ignorăm ordinele fără preț
+    sells = [o for o in orders if str(o["side"]).upper() == "SELL" and float(o.get("price") or 0) > 0]
+    buys = [o for o in orders if str(o["side"]).upper() == "BUY" and float(o.get("price") or 0) > 0]
+    if not sells or not buys:
+        return None, "missing SELL/BUY prices"
+
+    # Entry = primul SELL; Exit = toate picioarele BUY executate (un BUY sau o scară de BUY-uri)
+    first_sell = sorted(sells, key=lambda o: o["created_at"])[0]
+    sell_price = float(first_sell["price"])
+    sell_time = _parse_ts(first_sell.get("last_updated") or first_sell["created_at"])
+    sell_qty = float(first_sell.get("filled_size") or 0)
+
+    buy_price, buy_qty = _combine_buy_legs(buys)
+    buy_time = max(_parse_ts(o.get("last_updated") or o["created_at"]) for o in buys)
+
+    if sell_qty > 0 and buy_qty > 0:
+        qty = min(sell_qty, buy_qty)
+    else:
+        qty = max(sell_qty, buy_qty)
+
+    if sell_price <= 0 or buy_price <= 0 or qty <= 0:
+        return None, "invalid prices/qty"
+
+    # Profit în USDT – raportat la prețul de SELL (intrare)
+    row = {
+        "cycle_id": cycle_id,
+        "symbol": first_sell["symbol"],
+        "strategy": "SELL_BUY",
+        "sell_price": sell_price,
+        "buy_price": buy_price,
+        "profit_percent": round(((sell_price - buy_price) / sell_price) * 100, 2),
+        "profit_usdt": round((sell_price - buy_price) * qty, 6),
+        "profit_coin": 0.0,  # pentru STB nu ne interesează COIN
+        "execution_time": str(abs(buy_time - sell_time)),
+        "last_updated": datetime.now(timezone.utc).isoformat(),
+    }
+    return row, None
+
+# =====================================================
+# 📒 Ledger în memorie al ciclurilor
+# =====================================================
+class CycleLedger:
+    """
+    Ține în memorie picioarele (SELL/BUY) fiecărui ciclu, actualizate pe măsură
+    ce ordinele sunt plasate și executate, ca profitul să fie calculat fără
+    să recitim din Supabase rândurile pe care tocmai le-am scris.
+    """
+
+    def __init__(self, max_cycles=MAX_CYCLES):
+        self.max_cycles = max_cycles
+        self._cycles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record_order(self, cycle_id, order_id, symbol, side, price, status, created_at=None, filled_size=None):
+        """Înregistrează un picior nou al ciclului, la plasare."""
+        if not cycle_id or not order_id:
+            return
+        now = datetime.now(timezone.utc).isoformat()
+        with self._lock:
+            legs = self._cycles.get(cycle_id)
+            if legs is None:
+                legs = self._cycles[cycle_id] = {}
+                while len(self._cycles) > self.max_cycles:
+                    self._cycles.popitem(last=False)
+            legs[order_id] = {
+                "symbol": symbol,
+                "side": side,
+                "price": float(price or 0),
+                "status": status,
+                "filled_size": filled_size,
+                "created_at": created_at or now,
+                "last_updated": now,
+            }
+
+    def knows(self, cycle_id):
+        with self._lock:
+            return cycle_id in self._cycles
+
+    def record_fill(self, cycle_id, order_id, avg_price=None, filled_size=None, executed_at=None):
+        """
+        Marchează un picior ca executat și returnează rândul de profit dacă ciclul
+        are acum SELL + BUY executate. Returnează None dacă ciclul e necunoscut
+        (ex. pornit înainte de restart) sau încă incomplet.
+        """
+        with self._lock:
+            legs = self._cycles.get(cycle_id)
+            if legs is None or order_id not in legs:
+                return None
+            leg = legs[order_id]
+            leg["status"] = "executed"
+            leg["last_updated"] = executed_at or datetime.now(timezone.utc).isoformat()
+            if avg_price is not None:
+                leg["price"] = float(avg_price)
+            if filled_size is not None:
+                leg["filled_size"] = float(filled_size)
+
+            executed = [dict(l) for l in legs.values() if l["status"] == "executed"]
+            all_done = all(l["status"] == "executed" for l in legs.values())
+
+        row, _ = compute_cycle_profit(cycle_id, executed)
+        if row and all_done:
+            self.forget(cycle_id)
+        return row
+
+    def forget(self, cycle_id):
+        with self._lock:
+            self._cycles.pop(cycle_id, None)
+
+
+ledger = CycleLedger()
+
+
+# =====================================================
+# 💰 Închiderea unui picior executat
+# =====================================================
+def _profit_from_db(cycle_id):
+    from supabase_client import update_execution_time_and_profit
+
+    started = time.time()
+    update_execution_time_and_profit(cycle_id)
+    record_late(cycle_id, "profit_update", started, time.time() - started)
+
+
+register_call("profit", _profit_from_db)
+
+
+def settle_order(cycle_id, order_id, avg_price=None, filled_size=None):
+    """
+    Apelat când un ordin al ciclului e executat: calculează profitul din ledger
+    și îl scrie prin write-behind. Ciclurile necunoscute ledger-ului (pornite
+    înainte de restart) cad pe recalculul din DB.
+    """
+    if not cycle_id:
+        return
+    mark_order_filled(order_id)
+    started = time.time()
+    row = ledger.record_fill(cycle_id, order_id, avg_price, filled_size)
+    if row:
+        persist_upsert("profit_per_cycle", row)
+        record_late(cycle_id, "profit_update", started, time.time() - started)
+        logging.info(f"💰 [STB][{row['symbol']}] cycle {cycle_id} → {row['profit_percent']}% | USDT={row['profit_usdt']}",
+                     extra={"symbol": row["symbol"], "cycle_id": cycle_id, "order_id": order_id})
+    elif not ledger.knows(cycle_id):
+        persist_call("profit", cycle_id)
@@ -0,0 +1,220 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+
+# =====================================================
+# ⚙️ Constante
+# =====================================================
+# mai mulți workeri pe aceeași mașină (sharding) → câte un fișier per WORKER_ID
+_WORKER_SUFFIX = f"-{os.environ['WORKER_ID']}" if os.getenv("WORKER_ID") else ""
+CYCLE_STATE_PATH = os.getenv("CYCLE_STATE_PATH", f"data/cycle_state{_WORKER_SUFFIX}.db")
+CYCLE_HISTORY_DAYS = int(os.getenv("CYCLE_HISTORY_DAYS", "30"))  # cât ținem minte ce cicluri a pornit fiecare bot
+
+# Stările unui ciclu STB, în ordine
+SELL_PLACED = "SELL_PLACED"
+SELL_FILLED = "SELL_FILLED"
+BUY_PLACED = "BUY_PLACED"
+BUY_FILLED = "BUY_FILLED"
+STATES = (SELL_PLACED, SELL_FILLED, BUY_PLACED, BUY_FILLED)
+
+_store = None
+_store_lock = threading.Lock()
+
+# =====================================================
+# 💾 Checkpoint local per bot (SQLite, un rând per bot)
+# =====================================================
+class CycleStateStore:
+    """
+    Ultima stare a ciclului curent al fiecărui bot, scrisă local la fiecare
+    tranziție (SELL_PLACED → SELL_FILLED → BUY_PLACED → BUY_FILLED). La pornire
+    întregul tabel e citit o singură dată în memorie; botii își reiau ciclul
+    din snapshot, fără nicio interogare Supabase.
+    """
+
+    def __init__(self, path=CYCLE_STATE_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS cycles (
+                bot TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                data TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )"""
+        )
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS bot_cycles (
+                cycle_id TEXT PRIMARY KEY,
+                bot TEXT NOT NULL,
+                started REAL NOT NULL
+            )"""
+        )
+        self._lock = threading.Lock()
+        self._cycles = {}
+        self._bot_cycles = {}  # bot → cycle_id-urile pornite de bot (pentru limita de cicluri deschise)
+        self._by_order = {}  # order_id → bot, pentru tranzițiile venite din checker / stream
+        self._listeners = []  # listener(bot, checkpoint sau None) la fiecare scriere
+        self.load()
+
+    def load(self):
+        """Snapshot-ul complet, citit dintr-un singur SELECT."""
+        with self._lock:
+            rows = self._db.execute("SELECT bot, data FROM cycles").fetchall()
+            self._cycles = {bot: json.loads(data) for bot, data in rows}
+            self._db.execute("DELETE FROM bot_cycles WHERE started < ?", (time.time() - CYCLE_HISTORY_DAYS * 86400,))
+            self._bot_cycles = {}
+            for cycle_id, bot in self._db.execute("SELECT cycle_id, bot FROM bot_cycles").fetchall():
+                self._bot_cycles.setdefault(bot, set()).add(cycle_id)
+            self._by_order = {}
+            for bot, cp in self._cycles.items():
+                for order_id in _order_ids(cp):
+                    if order_id:
+                        self._by_order[order_id] = bot
+        return dict(self._cycles)
+
+    def get(self, bot):
+        with self._lock:
+            cp = self._cycles.get(bot)
+            return dict(cp) if cp else None
+
+    def save(self, bot, state, **fields):
+        """Trece botul în `state`, păstrând câmpurile deja salvate ale ciclului."""
+        with self._lock:
+            cp = dict(self._cycles.get(bot) or {})
+            if fields.get("cycle_id") and fields["cycle_id"] != cp.get("cycle_id"):
+                cp = {}  # ciclu nou
+            cp.update(fields)
+            cp["state"] = state
+            cp["updated_at"] = time.time()
+            self._write(bot, cp)
+        self._notify(bot)
+        return dict(cp)
+
+    def checkpoint_of(self, order_id):
+        """Checkpoint-ul ciclului curent care conține ordinul (SELL sau un picior BUY), sau None."""
+        with self._lock:
+            cp = self._cycles.get(self._by_order.get(order_id))
+            return dict(cp) if cp else None
+
+    def cycles_of(self, bot):
+        """Ciclurile pornite de bot (ultimele CYCLE_HISTORY_DAYS zile), inclusiv cel curent."""
+        with self._lock:
+            return set(self._bot_cycles.get(bot) or ())
+
+    def mark_order_filled(self, order_id):
+        """
+        Un BUY al ciclului curent raportat executat (checker / stream). Cu scară
+        de BUY-uri ciclul trece în BUY_FILLED abia după ultimul picior.
+        """
+        with self._lock:
+            bot = self._by_order.get(order_id)
+            cp = self._cycles.get(bot) if bot else None
+            legs = (cp.get("buy_ids") or [cp.get("buy_id")]) if cp else []
+            if not cp or order_id not in legs or cp["state"] != BUY_PLACED:
+                return False
+            filled = sorted(set(cp.get("buy_filled") or []) | {order_id})
+            state = BUY_FILLED if len(filled) >= len(legs) else BUY_PLACED
+            cp = dict(cp, state=state, buy_filled=filled, updated_at=time.time())
+            self._write(bot, cp)
+        self._notify(bot)
+        return True
+
+    def add_listener(self, callback):
+        with self._lock:
+            self._listeners.append(callback)
+
+    def adopt(self, bot, cp):
+        """Checkpoint venit din afară (ex. lease preluat de la alt worker), dacă e mai nou decât cel local."""
+        with self._lock:
+            local = self._cycles.get(bot)
+            if not cp or cp.get("state") not in STATES:
+                return False
+            if local and float(local.get("updated_at") or 0) >= float(cp.get("updated_at") or 0):
+                return False
+            self._write(bot, dict(cp))
+        self._notify(bot)
+        return True
+
+    def in_flight(self):
+        """Ciclurile oprite între SELL și BUY (de reluat imediat)."""
+        with self._lock:
+            return [dict(cp) for cp in self._cycles.values() if cp["state"] in (SELL_PLACED, SELL_FILLED)]
+
+    def clear(self, bot):
+        with self._lock:
+            cp = self._cycles.pop(bot, None) or {}
+            for order_id in _order_ids(cp):
+                self._by_order.pop(order_id, None)
+            self._db.execute("DELETE FROM cycles WHERE bot = ?", (bot,))
+        self._notify(bot)
+
+    def _write(self, bot, cp):
+        previous = self._cycles.get(bot) or {}
+        for order_id in _order_ids(previous):
+            self._by_order.pop(order_id, None)
+        self._cycles[bot] = cp
+        cycle_id = cp.get("cycle_id")
+        if cycle_id and cycle_id not in self._bot_cycles.setdefault(bot, set()):
+            self._bot_cycles[bot].add(cycle_id)
+            self._db.execute("INSERT OR REPLACE INTO bot_cycles (cycle_id, bot, started) VALUES (?, ?, ?)",
+                             (cycle_id, bot, time.time()))
+        for order_id in _order_ids(cp):
+            if order_id:
+                self._by_order[order_id] = bot
+        self._db.execute(
+            "INSERT OR REPLACE INTO cycles (bot, state, data, updated_at) VALUES (?, ?, ?, ?)",
+            (bot, cp["state"], json.dumps(cp, default=str), cp["updated_at"]),
+        )
+
+    def _notify(self, bot):
+        """
+        Listenerii sunt apelați după eliberarea lock-ului store-ului (ei pot lua
+        alte lock-uri, ex. coordonatorul de sharding). Primesc starea curentă,
+        nu pe cea din momentul scrierii: la două scrieri concurente ultimul
+        apel vede oricum checkpoint-ul final.
+        """
+        with self._lock:
+            listeners = list(self._listeners)
+        cp = self.get(bot)
+        for callback in listeners:
+            try:
+                callback(bot, dict(cp) if cp else None)
+            except Exception as e:
+                logging.warning(f"⚠️ Listener cycle state eșuat ({bot}): {e}")
+
+
+def _order_ids(cp):
+    """Ordinele unui checkpoint: SELL-ul și BUY-ul / toate picioarele scării de BUY."""
+    return [cp.get("sell_id"), cp.get("buy_id"), *(cp.get("buy_ids") or [])]
+
+
+def cycle_key(settings):
+    """Identitatea botului în store: id-ul din settings + simbol + hash scurt al contului."""
+    account = hashlib.sha256(str(settings["api_key"]).encode()).hexdigest()[:12]
+    return f"{settings.get('id')}:{settings['symbol']}:{account}"
+
+
+def mark_order_filled(order_id):
+    """Pentru checker/reconciliere: no-op în procesele care nu rulează boti (store neîncărcat)."""
+    if _store is not None and order_id:
+        _store.mark_order_filled(order_id)
+
+
+def get_cycle_store():
+    """Store-ul global, încărcat (un singur snapshot) la primul apel."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = CycleStateStore()
+            in_flight = _store.in_flight()
+            if in_flight:
+                logging.info(f"♻️ Cycle state: {len(in_flight)} ciclu(ri) în curs de reluat după restart")
+        return _store
@@ -1,52 +1,271 @@
 from kucoin.client import Trade
+from urllib.parse import urljoin
+from requests.adapters import HTTPAdapter
+import requests
+import threading
+import hashlib
+import os
+import base64
+import hmac
+import json
 import time
 import random
+import logging
+import uuid
+from rate_limit import get_budget, endpoint_weight, current_priority, priority, URGENT, BACKGROUND
+from symbols import round_price, round_size, order_problem, fmt
+from metrics import KUCOIN_REQUEST_SECONDS, KUCOIN_RETRIES, KUCOIN_FAILURES, KUCOIN_RECOVERED, endpoint_label
+from circuit_breaker import get_breaker, is_outage
 
 # =====================================================
-# 🔌 Inițializare client KuCoin
+# ⚙️ Constante client
 # =====================================================
+HTTP_POOL_SIZE = 10  # conexiuni keep-alive per cont
+TIME_SYNC_INTERVAL = 1800  # resincronizare offset cu serverul KuCoin (secunde)
+REQUEST_TIMEOUT = 10
+RETRY_BASE_DELAY = float(os.getenv("KUCOIN_RETRY_BASE_DELAY", "0.5"))  # backoff: 0.5s, 1s, 2s... (cu jitter)
+RETRY_MAX_DELAY = float(os.getenv("KUCOIN_RETRY_MAX_DELAY", "8"))
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+# =====================================================
+# 🔗 Client KuCoin cu sesiune HTTP partajată + offset de timp
+# =====================================================
+class PooledTrade(Trade):
+    """
+    Trade client cu o singură sesiune requests (keep-alive, pool de conexiuni)
+    și timestamp semnat corectat cu offset-ul față de ceasul serverului KuCoin.
+    """
+
+    def __init__(self, key, secret, passphrase, pool_size=HTTP_POOL_SIZE):
+        super().__init__(key=key, secret=secret, passphrase=passphrase)
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        self.session = session
+        self.time_offset_ms = 0
+        self._last_sync = 0
+        self._sync_lock = threading.Lock()
+
+    def sync_time(self):
+        """Măsoară offset-ul ceasului local față de /api/v1/timestamp."""
+        t0 = time.time()
+        response = self.session.get(urljoin(self.url, "/api/v1/timestamp"), timeout=REQUEST_TIMEOUT)
+        t1 = time.time()
+        server_ms = int(response.json()["data"])
+        self.time_offset_ms = server_ms - int((t0 + t1) / 2 * 1000)
+        self._last_sync = t1
+        return self.time_offset_ms
+
+    def _maybe_sync_time(self):
+        if time.time() - self._last_sync < TIME_SYNC_INTERVAL:
+            return
+        with self._sync_lock:
+            if time.time() - self._last_sync < TIME_SYNC_INTERVAL:
+                return
+            try:
+                offset = self.sync_time()
+                if abs(offset) > 1000:
+                    logging.warning(f"⏱️ Offset ceas KuCoin: {offset} ms (corectat)")
+            except Exception as e:
+                self._last_sync = time.time()  # nu reîncercăm la fiecare request
+                logging.warning(f"⚠️ Nu am putut sincroniza ora cu KuCoin: {e}")
+
+    def _request(self, method, uri, timeout=REQUEST_TIMEOUT, auth=True, params=None):
+        self._maybe_sync_time()
+        budget = get_budget(self.key)
+        budget.acquire(endpoint_weight(uri), current_priority())
+
+        uri_path = uri
+        data_json = ""
+        if method in ["GET", "DELETE"]:
+            if params:
+                data_json = "&".join(f"{key}={params[key]}" for key in sorted(params))
+                uri += "?" + data_json
+                uri_path = uri
+        elif params:
+            data_json = json.dumps(params)
+            uri_path = uri + data_json
+
+        headers = {"Content-Type": "application/json"}
+        if auth:
+            now_ms = int(time.time() * 1000) + self.time_offset_ms
+            str_to_sign = str(now_ms) + method + uri_path
+            secret = self.secret.encode("utf-8")
+            headers.update({
+                "KC-API-SIGN": base64.b64encode(
+                    hmac.new(secret, str_to_sign.encode("utf-8"), hashlib.sha256).digest()),
+                "KC-API-TIMESTAMP": str(now_ms),
+                "KC-API-KEY": self.key,
+                "KC-API-PASSPHRASE": base64.b64encode(
+                    hmac.new(secret, self.passphrase.encode("utf-8"), hashlib.sha256).digest()),
+                "KC-API-KEY-VERSION": "2",
+            })
+
+        url = urljoin(self.url, uri)
+        endpoint = endpoint_label(uri)
+        started = time.perf_counter()
+        status = "error"
+        try:
+            if method in ["GET", "DELETE"]:
+                response = self.session.request(method, url, headers=headers, timeout=timeout)
+            else:
+                response = self.session.request(method, url, headers=headers, data=data_json, timeout=timeout)
+            status = str(response.status_code)
+            if response.status_code == 429:
+                budget.throttle()
+            data = self.check_response_data(response)
+            status = "ok"
+            return data
+        finally:
+            KUCOIN_REQUEST_SECONDS.observe(time.perf_counter() - started, method=method, endpoint=endpoint, status=status)
+
+_client_factory = PooledTrade
+
+# =====================================================
+# 🔌 Inițializare client KuCoin (registry per API key)
+# =====================================================
+def get_client(api_key, api_secret, api_passphrase):
+    """Returnează clientul partajat pentru cont; îl creează la primul apel."""
+    with _clients_lock:
+        client = _clients.get(api_key)
+        if client is not None and client.secret == api_secret and client.passphrase == api_passphrase:
+            return client
+        client = _client_factory(api_key, api_secret, api_passphrase)
+        _clients[api_key] = client
+    logging.info(f"✅ KuCoin client initialized ({api_key[:6]}…).", extra={"account": api_key[:6]})
+    return client
+
+
+def use_client_factory(factory):
+    """Înlocuiește constructorul de clienți (ex. fakes.FakeTrade în benchmark) și golește cache-ul."""
+    global _client_factory
+    with _clients_lock:
+        _client_factory = factory
+        _clients.clear()
+
+
 def init_client(api_key, api_secret, api_passphrase):
-    """Creează conexiunea la KuCoin Trade API."""
+    """Creează (sau reutilizează) conexiunea la KuCoin Trade API."""
     try:
-        client = Trade(key=api_key, secret=api_secret, passphrase=api_passphrase)
-        print("✅ KuCoin client initialized.")
-        return client
+        return get_client(api_key, api_secret, api_passphrase)
     except Exception as e:
-        print(f"❌ Eroare la inițializarea clientului KuCoin: {e}")
+        logging.error(f"❌ Eroare la inițializarea clientului KuCoin: {e}")
         raise
 
 # =====================================================
 # 🧱 Funcție generală de retry (stabilitate 24/7)
 # =====================================================
-def safe_order(action_func, *args, retries=3, delay=5, **kwargs):
-    """Reîncearcă o acțiune KuCoin până la 3 ori dacă apare eroare temporară."""
+def safe_order(action_func, *args, retries=3, delay=RETRY_BASE_DELAY, endpoint=None, recover=None, resend=False, **kwargs):
+    """
+    Reîncearcă o acțiune KuCoin până la 3 ori, cu backoff exponențial și jitter.
+    `endpoint` alege circuit breaker-ul: cât e deschis, eșuăm imediat (None),
+    fără request și fără sleep. `recover` (pentru plasări cu clientOid) e
+    apelat înainte de fiecare reîncercare: dacă încercarea anterioară a ajuns
+    totuși la exchange (timeout după accept), întoarce rezultatul ei și
+    ordinul nu mai e trimis a doua oară. Cu `resend` verificăm și înaintea
+    primei încercări (același clientOid a mai fost trimis într-un apel anterior).
+    """
+    action = getattr(action_func, "__qualname__", "action").replace(".<locals>", "")
+    breaker = get_breaker(endpoint or action)
     for attempt in range(1, retries + 1):
+        if not breaker.allow():
+            KUCOIN_FAILURES.inc(action=action)
+            logging.warning(f"🔌 {action}: circuit {breaker.endpoint} deschis — nu trimit.",
+                            extra={"sample": f"circuit:{breaker.endpoint}"})
+            return None
         try:
-            return action_func(*args, **kwargs)
+            if recover is not None and (attempt > 1 or resend):
+                found = recover()
+                if found is not None:
+                    breaker.success()
+                    KUCOIN_RECOVERED.inc(action=action)
+                    logging.info(f"♻️ {action}: ordinul ajunsese deja la exchange (găsit după clientOid).")
+                    return found
+            result = action_func(*args, **kwargs)
+            breaker.success()
+            return result
         except Exception as e:
-            print(f"⚠️ Eroare la încercarea {attempt}/{retries}: {e}")
+            breaker.failure(e)
+            logging.warning(f"⚠️ Eroare la încercarea {attempt}/{retries} ({action}): {e}")
             if attempt < retries:
-                sleep_time = delay + random.uniform(0, 3)
-                print(f"⏳ Reîncerc în {round(sleep_time, 1)}s...")
+                KUCOIN_RETRIES.inc(action=action)
+                if breaker.is_open:
+                    continue  # circuitul tocmai s-a deschis: următoarea încercare eșuează imediat
+                # full jitter: thread-urile care au eșuat împreună nu reîncearcă împreună
+                sleep_time = random.uniform(0, min(RETRY_MAX_DELAY, delay * 2 ** (attempt - 1)))
+                logging.info(f"⏳ Reîncerc în {round(sleep_time, 1)}s...")
                 time.sleep(sleep_time)
-            else:
-                print("❌ Toate încercările au eșuat.")
-                return None
+    found = _recover_quietly(recover) if not breaker.is_open else None
+    if found is not None:  # ultima încercare expirase după ce exchange-ul acceptase ordinul
+        KUCOIN_RECOVERED.inc(action=action)
+        return found
+    KUCOIN_FAILURES.inc(action=action)
+    logging.error(f"❌ Toate încercările au eșuat ({action}).")
+    return None
+
+
+def _recover_quietly(recover):
+    if recover is None:
+        return None
+    try:
+        return recover()
+    except Exception as e:
+        logging.warning(f"⚠️ Nu am putut verifica ordinul după clientOid: {e}")
+        return None
+
+
+def client_oid(cycle_id, leg):
+    """
+    clientOid determinist pentru piciorul unui ciclu ('s' = SELL, 'b0'..'b4' =
+    BUY-uri): aceeași plasare repetată (retry, BUY reluat după restart) poartă
+    același id și poate fi găsită pe exchange. Maxim 40 de caractere.
+    """
+    base = str(cycle_id).replace("-", "")
+    if len(base) > 32 or not base.isalnum():
+        base = hashlib.sha1(str(cycle_id).encode()).hexdigest()[:32]
+    return f"{base}-{leg}"
+
+
+def find_by_client_oid(client, oid):
+    """Ordinul plasat cu clientOid-ul dat, sau None dacă exchange-ul nu îl cunoaște."""
+    try:
+        order = client.get_client_order_details(oid)
+    except Exception as e:
+        if is_outage(e):
+            raise  # nu știm dacă ordinul există: nu îl retrimitem
+        return None
+    return order if order and order.get("id") else None
 
 # =====================================================
 # 🔴 Market SELL (prima acțiune din strategia STB)
 # =====================================================
-def market_sell(client, symbol, amount, strategy_label="STB"):
-    """Plasează un ordin de vânzare MARKET."""
+def market_sell(client, symbol, amount, strategy_label="STB", cycle_id=None, resend=False):
+    """Plasează un ordin de vânzare MARKET (cu clientOid derivat din cycle_id, dacă e dat)."""
+    size = round_size(symbol, amount)
+    problem = order_problem(symbol, size)
+    if problem:
+        # respins local: fără 3 încercări inutile și fără greutate consumată din buget
+        logging.error(f"[{symbol}][{strategy_label}] ❌ Market SELL invalid ({problem}) — nu îl trimit.", extra={"symbol": symbol, "side": "SELL"})
+        return None
+
+    oid = client_oid(cycle_id, "s") if cycle_id else uuid.uuid4().hex
+
     def action():
-        order = client.create_market_order(symbol, 'sell', size=str(amount))
+        order = client.create_market_order(symbol, 'sell', clientOid=oid, size=fmt(size))
         return order.get('orderId') or order.get('id')
 
-    order_id = safe_order(action)
+    def recover():
+        order = find_by_client_oid(client, oid)
+        return order["id"] if order else None
+
+    order_id = safe_order(action, endpoint="POST /api/v1/orders", recover=recover, resend=resend)
     if order_id:
-        print(f"[{symbol}][{strategy_label}] 🔴 Market SELL placed (orderId: {order_id})")
+        logging.info(f"[{symbol}][{strategy_label}] 🔴 Market SELL placed (orderId: {order_id})",
+                     extra={"symbol": symbol, "order_id": order_id, "side": "SELL"})
     else:
-        print(f"[{symbol}][{strategy_label}] ❌ Market SELL failed after retries.")
+        logging.error(f"[{symbol}][{strategy_label}] ❌ Market SELL failed after retries.", extra={"symbol": symbol, "side": "SELL"})
     return order_id
 
 # =====================================================
@@ -54,11 +273,15 @@ def market_sell(client, symbol, amount, strategy_label="STB"):
 # =====================================================
 def check_order_executed(client, order_id):
     """Verifică dacă un ordin a fost complet executat."""
+    breaker = get_breaker("GET /api/v1/orders/{id}")
+    if not breaker.allow():
+        return False, 0  # exchange-ul e căzut: apelantul reîncearcă la următorul poll
     try:
         if hasattr(client, "get_order_details"):
             status = client.get_order_details(order_id)
         else:
             status = client.get_order(order_id)
+        breaker.success()
 
         filled = float(status.get('dealSize', 0))
         total = float(status.get('size', 0))
@@ -68,25 +291,128 @@ def check_order_executed(client, order_id):
         avg_price = (deal_funds / filled) if filled > 0 else 0
 
         symbol = status.get('symbol', '')
-        print(f"[{symbol}] 🔎 check_order_executed → {state} {filled}/{total} avg={avg_price}")
+        logging.info(
+            f"[{symbol}] 🔎 check_order_executed → {state} {filled}/{total} avg={avg_price}",
+            extra={"symbol": symbol, "order_id": order_id, "status": state, "price": avg_price,
+                   "sample": None if done else f"check:{order_id}"},
+        )
         return done, avg_price
     except Exception as e:
-        print(f"❌ Eroare la check_order_executed pentru {order_id}: {e}")
-        time.sleep(5)
+        breaker.failure(e)
+        # fără sleep aici: ritmul îl dau apelantul și bugetul de rate limit al contului
+        logging.error(f"❌ Eroare la check_order_executed pentru {order_id}: {e}", extra={"order_id": order_id})
         return False, 0
 
+# =====================================================
+# 📋 Listare ordine (paginat, pentru reconciliere)
+# =====================================================
+def list_orders(client, status, page_size=500, max_pages=20, **filters):
+    """Returnează toate ordinele 'active' sau 'done' (ultimele 7 zile) ale contului."""
+    orders = []
+    page = 1
+    with priority(BACKGROUND):
+        while page <= max_pages:
+            data = safe_order(
+                client.get_order_list,
+                endpoint="GET /api/v1/orders",
+                status=status,
+                tradeType="TRADE",
+                currentPage=page,
+                pageSize=page_size,
+                **filters,
+            )
+            if data is None:
+                raise RuntimeError(f"get_order_list({status}) failed after retries")
+
+            orders.extend(data.get("items") or [])
+            if page >= int(data.get("totalPage") or 1):
+                break
+            page += 1
+    return orders
+
 # =====================================================
 # 🟢 Limit BUY (a doua acțiune din strategia STB)
 # =====================================================
-def place_limit_buy(client, symbol, amount, price, strategy_label="STB"):
-    """Plasează un ordin de cumpărare LIMIT."""
+def place_limit_buy(client, symbol, amount, price, strategy_label="STB", cycle_id=None, resend=False):
+    """Plasează un ordin de cumpărare LIMIT (preț și cantitate rotunjite la incrementele simbolului)."""
+    size = round_size(symbol, amount)
+    price = round_price(symbol, price)
+    problem = order_problem(symbol, size, price)
+    if problem:
+        logging.error(f"[{symbol}][{strategy_label}] ❌ Limit BUY invalid ({problem}) — nu îl trimit.", extra={"symbol": symbol, "side": "BUY"})
+        return None
+
+    oid = client_oid(cycle_id, "b0") if cycle_id else uuid.uuid4().hex
+
     def action():
-        order = client.create_limit_order(symbol, 'buy', size=str(amount), price=str(price))
+        order = client.create_limit_order(symbol, 'buy', size=fmt(size), price=fmt(price), clientOid=oid)
         return order.get('orderId') or order.get('id')
 
-    order_id = safe_order(action)
+    def recover():
+        order = find_by_client_oid(client, oid)
+        return order["id"] if order else None
+
+    # BUY-ul de după fill trece înaintea verificărilor de rutină ale contului
+    with priority(URGENT):
+        order_id = safe_order(action, endpoint="POST /api/v1/orders", recover=recover, resend=resend)
     if order_id:
-        print(f"[{symbol}][{strategy_label}] 🟢 Limit BUY @ {price} (id: {order_id})")
+        logging.info(f"[{symbol}][{strategy_label}] 🟢 Limit BUY @ {price} (id: {order_id})",
+                     extra={"symbol": symbol, "order_id": order_id, "side": "BUY", "price": price})
     else:
-        print(f"[{symbol}][{strategy_label}] ❌ Limit BUY failed after retries.")
+        logging.error(f"[{symbol}][{strategy_label}] ❌ Limit BUY failed after retries.", extra={"symbol": symbol, "side": "BUY"})
     return order_id
+
+# =====================================================
+# 🪜 BUY în scară (toate picioarele într-un singur request)
+# =====================================================
+MAX_BULK_LEGS = 5  # limita KuCoin pentru /api/v1/orders/multi
+
+
+def place_buy_ladder(client, symbol, legs, strategy_label="STB", cycle_id=None, resend=False):
+    """
+    Plasează până la 5 BUY LIMIT [(size, price), ...] printr-un singur
+    create_bulk_orders. Returnează picioarele acceptate [(order_id, size, price)];
+    picioarele invalide local sau respinse de exchange sunt doar logate.
+    La reîncercare, picioarele găsite după clientOid nu mai sunt retrimise.
+    """
+    order_list = []
+    for i, (size, price) in enumerate(legs[:MAX_BULK_LEGS]):
+        size = round_size(symbol, size)
+        price = round_price(symbol, price)
+        problem = order_problem(symbol, size, price)
+        if problem:
+            logging.warning(f"[{symbol}][{strategy_label}] ⚠️ Picior BUY @ {price} omis ({problem})", extra={"symbol": symbol, "side": "BUY"})
+            continue
+        order_list.append({"clientOid": client_oid(cycle_id, f"b{i}") if cycle_id else uuid.uuid4().hex,
+                           "side": "buy", "type": "limit", "size": fmt(size), "price": fmt(price)})
+    if not order_list:
+        return []
+    pending, recovered = list(order_list), []
+
+    def action():
+        return recovered + (client.create_bulk_orders(symbol, pending).get('data') or [])
+
+    def recover():
+        for leg in list(pending):
+            order = find_by_client_oid(client, leg["clientOid"])
+            if order:
+                recovered.append({**leg, "id": order["id"], "status": "success"})
+                pending.remove(leg)
+        return recovered if recovered and not pending else None
+
+    with priority(URGENT):
+        results = safe_order(action, endpoint="POST /api/v1/orders/multi", recover=recover, resend=resend)
+    if results is None:
+        logging.error(f"[{symbol}][{strategy_label}] ❌ BUY ladder failed after retries.", extra={"symbol": symbol, "side": "BUY"})
+        return []
+
+    placed = []
+    for leg in results:
+        if leg.get("status") == "success" and leg.get("id"):
+            placed.append((leg["id"], float(leg["size"]), float(leg["price"])))
+        else:
+            logging.warning(f"[{symbol}][{strategy_label}] ⚠️ Picior BUY @ {leg.get('price')} respins: {leg.get('failMsg')}",
+                            extra={"symbol": symbol, "side": "BUY"})
+    logging.info(f"[{symbol}][{strategy_label}] 🪜 BUY ladder: {len(placed)}/{len(order_list)} picioare plasate "
+                 f"@ {', '.join(str(p) for _, _, p in placed)}", extra={"symbol": symbol, "side": "BUY"})
+    return placed
@@ -0,0 +1,453 @@
+import math
+import time
+import uuid
+import random
+import threading
+from collections import Counter, defaultdict
+from rate_limit import get_budget, current_priority, DEFAULT_WEIGHT
+
+# =====================================================
+# 🧪 Exchange KuCoin simulat (în proces)
+# =====================================================
+class FakeExchange:
+    """
+    Exchange simulat pentru benchmark: preț random-walk per simbol, ordine
+    market executate după `market_fill_delay`, ordine limit executate când
+    prețul le atinge, latență configurabilă, fill-uri parțiale și erori injectate.
+    Opțional împinge evenimente orderChange către OrderStream-uri locale.
+    `outage()` simulează o cădere (503 pe toate endpoint-urile), iar
+    `lost_reply_rate` ordine acceptate al căror răspuns expiră.
+    """
+
+    def __init__(self, start_price=0.1, volatility=0.002, latency_ms=20.0, jitter_ms=5.0,
+                 error_rate=0.0, partial_fill_rate=0.0, market_fill_delay=0.05, tick=0.01, seed=None,
+                 lost_reply_rate=0.0):
+        self.start_price = start_price
+        self.volatility = volatility  # deviația prețului per secundă
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.lost_reply_rate = lost_reply_rate  # ordin plasat, dar răspunsul se pierde (timeout)
+        self.down_until = 0.0
+        self.partial_fill_rate = partial_fill_rate
+        self.market_fill_delay = market_fill_delay
+        self.tick = tick
+        self.rng = random.Random(seed)
+
+        self.lock = threading.Lock()
+        self.prices = {}
+        self.orders = {}
+        self.by_client_oid = {}
+        self.active = set()
+        self.streams = {}
+        self.market = None
+        self.counts = Counter()
+        self.errors = Counter()
+        self.last_sell_fill = {}  # (api_key, symbol) -> momentul fill-ului SELL
+        self.sell_to_buy = []  # latența SELL umplut → BUY plasat (secunde)
+        self._stopped = threading.Event()
+        threading.Thread(target=self._ticker, daemon=True).start()
+
+    def client(self, api_key, api_secret="", api_passphrase=""):
+        return FakeTrade(self, api_key, api_secret, api_passphrase)
+
+    def list_symbols(self, symbols):
+        with self.lock:
+            for symbol in symbols:
+                self.price(symbol)
+
+    def symbol_list(self):
+        """Răspunsul lui Market.get_symbol_list_v2 pentru simbolurile simulate."""
+        return [
+            {"symbol": s, "baseCurrency": s.split("-")[0], "quoteCurrency": "USDT", "baseMinSize": "0.1",
+             "baseIncrement": "0.0001", "priceIncrement": "0.00001", "minFunds": "0.1", "enableTrading": True}
+            for s in list(self.prices)
+        ]
+
+    def attach_stream(self, api_key, stream):
+        self.streams[api_key] = stream
+
+    def attach_market(self, market, interval=0.1, levels=5, level_size=50.0, spread=0.0005):
+        """Împinge în `market` (MarketData local) o carte sintetică în jurul prețului, ca depth-ul KuCoin."""
+        self.market = market
+
+        def publish():
+            while not self._stopped.wait(interval):
+                with self.lock:
+                    prices = dict(self.prices)
+                for symbol, price in prices.items():
+                    bids = [(price * (1 - spread * (i + 1)), level_size) for i in range(levels)]
+                    asks = [(price * (1 + spread * (i + 1)), level_size) for i in range(levels)]
+                    market.feed(symbol, bids, asks)
+
+        threading.Thread(target=publish, daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+
+    # -------------------------------------------------
+    # Simulare
+    # -------------------------------------------------
+    def price(self, symbol):
+        return self.prices.setdefault(symbol, self.start_price)
+
+    def _ticker(self):
+        step = self.volatility * math.sqrt(self.tick)
+        while not self._stopped.wait(self.tick):
+            now = time.time()
+            events = []
+            with self.lock:
+                for symbol in list(self.prices):
+                    self.prices[symbol] *= math.exp(self.rng.gauss(0, step))
+                for order_id in list(self.active):
+                    events.extend(self._advance(self.orders[order_id], now))
+            for api_key, data in events:
+                stream = self.streams.get(api_key)
+                if stream:
+                    stream.feed(data)
+
+    def _advance(self, order, now):
+        """Avansează un ordin activ; întoarce evenimentele de stream generate."""
+        price = self.price(order["symbol"])
+        if order["type"] == "market":
+            if now < order["fill_at"]:
+                return []
+            fill_price = order["ref_price"]
+        else:
+            crossed = price <= order["price"] if order["side"] == "buy" else price >= order["price"]
+            if not crossed:
+                return []
+            fill_price = order["price"]
+
+        remaining = order["size"] - order["dealSize"]
+        fill = remaining
+        if order["parts"] > 1:
+            fill = round(order["size"] / order["parts"], 8)
+            order["parts"] -= 1
+            order["fill_at"] = now + self.market_fill_delay
+        order["dealSize"] += fill
+        order["dealFunds"] += fill * fill_price
+
+        done = order["dealSize"] >= order["size"] - 1e-12
+        events = [(order["api_key"], self._event(order, "match", fill_price, fill))]
+        if done:
+            order["isActive"] = False
+            self.active.discard(order["id"])
+            events.append((order["api_key"], self._event(order, "filled")))
+            if order["side"] == "sell":
+                self.last_sell_fill[(order["api_key"], order["symbol"])] = now
+        return events
+
+    @staticmethod
+    def _event(order, kind, match_price=None, match_size=None):
+        data = {
+            "orderId": order["id"], "symbol": order["symbol"], "side": order["side"],
+            "type": kind, "status": "done" if kind in ("filled", "canceled") else "match",
+            "size": str(order["size"]), "filledSize": str(order["dealSize"]),
+            "clientOid": order["clientOid"], "ts": int(time.time() * 1e9),
+        }
+        if kind == "match":
+            data.update({"matchPrice": str(match_price), "matchSize": str(match_size)})
+        return data
+
+    # -------------------------------------------------
+    # Apel „de rețea”: numărare, latență, erori
+    # -------------------------------------------------
+    def call(self, api_key, endpoint, weight=DEFAULT_WEIGHT):
+        get_budget(api_key).acquire(weight, current_priority())
+        self.counts[endpoint] += 1
+        delay = max(0.0, self.rng.gauss(self.latency_ms, self.jitter_ms)) / 1000
+        if delay:
+            time.sleep(delay)
+        if time.time() < self.down_until:
+            self.errors[endpoint] += 1
+            raise Exception("503-{\"code\":\"503000\",\"msg\":\"fake exchange outage\"}")
+        if self.error_rate and self.rng.random() < self.error_rate:
+            self.errors[endpoint] += 1
+            raise Exception("500-{\"code\":\"500000\",\"msg\":\"fake exchange error\"}")
+
+    def outage(self, seconds):
+        """Toate request-urile eșuează cu 503 în următoarele `seconds` secunde."""
+        self.down_until = time.time() + seconds
+
+    def lose_reply(self, endpoint):
+        """După o plasare reușită: uneori clientul primește timeout în loc de răspuns."""
+        if self.lost_reply_rate and self.rng.random() < self.lost_reply_rate:
+            self.errors[f"{endpoint} (lost reply)"] += 1
+            raise TimeoutError("fake: read timed out")
+
+    def place(self, api_key, symbol, side, order_type, size, price=None, client_oid=""):
+        with self.lock:
+            if client_oid and client_oid in self.by_client_oid:
+                self.errors["clientOid duplicated"] += 1
+                raise Exception("400-{\"code\":\"400100\",\"msg\":\"clientOid duplicated\"}")
+            order_id = uuid.uuid4().hex[:24]
+            now = time.time()
+            order = {
+                "id": order_id, "symbol": symbol, "side": side, "type": order_type,
+                "size": float(size), "price": float(price or 0), "dealSize": 0.0, "dealFunds": 0.0,
+                "isActive": True, "cancelExist": False, "clientOid": client_oid or uuid.uuid4().hex,
+                "createdAt": int(now * 1000), "api_key": api_key,
+                "ref_price": self.price(symbol), "fill_at": now + self.market_fill_delay,
+                "parts": 2 if self.rng.random() < self.partial_fill_rate else 1,
+            }
+            self.orders[order_id] = order
+            self.by_client_oid[order["clientOid"]] = order_id
+            self.active.add(order_id)
+            if side == "buy" and order_type == "limit":
+                filled_at = self.last_sell_fill.pop((api_key, symbol), None)
+                if filled_at:
+                    self.sell_to_buy.append(now - filled_at)
+        return order_id
+
+    def snapshot(self, order_id):
+        with self.lock:
+            order = self.orders.get(order_id)
+            if order is None:
+                raise Exception("404-{\"code\":\"400100\",\"msg\":\"order not exist\"}")
+            return {
+                "id": order["id"], "symbol": order["symbol"], "type": order["type"], "side": order["side"],
+                "price": str(order["price"]), "size": str(order["size"]),
+                "dealSize": str(order["dealSize"]), "dealFunds": str(order["dealFunds"]),
+                "isActive": order["isActive"], "cancelExist": order["cancelExist"],
+                "clientOid": order["clientOid"], "createdAt": order["createdAt"], "tradeType": "TRADE",
+            }
+
+    def cancel(self, order_id):
+        with self.lock:
+            order = self.orders[order_id]
+            if order["isActive"]:
+                order["isActive"] = False
+                order["cancelExist"] = True
+                self.active.discard(order_id)
+
+
+class FakeTrade:
+    """Înlocuitor pentru kucoin.client.Trade cu metodele folosite de exchange.py."""
+
+    def __init__(self, exchange, key, secret="", passphrase=""):
+        self.exchange = exchange
+        self.key = key
+        self.secret = secret
+        self.passphrase = passphrase
+
+    def create_market_order(self, symbol, side, clientOid="", size=None, funds=None, **kwargs):
+        self.exchange.call(self.key, "POST /api/v1/orders")
+        order_id = self.exchange.place(self.key, symbol, side, "market", size, client_oid=clientOid)
+        self.exchange.lose_reply("POST /api/v1/orders")
+        return {"orderId": order_id}
+
+    def create_limit_order(self, symbol, side, size, price, clientOid="", **kwargs):
+        self.exchange.call(self.key, "POST /api/v1/orders")
+        order_id = self.exchange.place(self.key, symbol, side, "limit", size, price, clientOid)
+        self.exchange.lose_reply("POST /api/v1/orders")
+        return {"orderId": order_id}
+
+    def create_bulk_orders(self, symbol, orderList):
+        self.exchange.call(self.key, "POST /api/v1/orders/multi", weight=3)
+        data = []
+        for leg in orderList:
+            order_id = self.exchange.place(self.key, symbol, leg["side"], leg.get("type", "limit"),
+                                           leg["size"], leg.get("price"), leg.get("clientOid", ""))
+            data.append({**leg, "symbol": symbol, "id": order_id, "status": "success", "failMsg": None})
+        self.exchange.lose_reply("POST /api/v1/orders/multi")
+        return {"data": data}
+
+    def get_order_details(self, orderId):
+        self.exchange.call(self.key, "GET /api/v1/orders/{id}")
+        return self.exchange.snapshot(orderId)
+
+    def get_client_order_details(self, clientOid):
+        self.exchange.call(self.key, "GET /api/v1/order/client-order/{id}", weight=3)
+        order_id = self.exchange.by_client_oid.get(clientOid)
+        if order_id is None:
+            raise Exception("404-{\"code\":\"400100\",\"msg\":\"order not exist\"}")
+        return self.exchange.snapshot(order_id)
+
+    def cancel_order(self, orderId):
+        self.exchange.call(self.key, "DELETE /api/v1/orders/{id}")
+        self.exchange.cancel(orderId)
+        return {"cancelledOrderIds": [orderId]}
+
+    def get_order_list(self, status="active", currentPage=1, pageSize=50, **kwargs):
+        self.exchange.call(self.key, "GET /api/v1/orders")
+        with self.exchange.lock:
+            ids = [o["id"] for o in self.exchange.orders.values()
+                   if o["api_key"] == self.key and o["isActive"] == (status == "active")]
+        items = [self.exchange.snapshot(i) for i in ids]
+        start = (int(currentPage) - 1) * int(pageSize)
+        total_page = max(1, math.ceil(len(items) / int(pageSize)))
+        return {"currentPage": currentPage, "pageSize": pageSize, "totalNum": len(items),
+                "totalPage": total_page, "items": items[start:start + int(pageSize)]}
+
+# =====================================================
+# 🧪 Supabase simulat (tabele în memorie)
+# =====================================================
+class FakeResult:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+class FakeSupabase:
+    """
+    Stocare în memorie cu subsetul de query builder folosit de bot:
+    select/insert/update/upsert/delete + eq/neq/in_/gt/gte/lt/lte/order/limit/range.
+    """
+
+    PRIMARY_KEYS = {"profit_per_cycle": "cycle_id", "bot_leases": "bot_key", "stb_workers": "worker_id"}
+
+    def __init__(self, latency_ms=0.0, error_rate=0.0, seed=None):
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.tables = defaultdict(list)
+        self.next_id = Counter()
+        self.lock = threading.Lock()
+        self.counts = Counter()
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def seed(self, name, rows):
+        with self.lock:
+            for row in rows:
+                self._insert_row(name, dict(row))
+
+    def _insert_row(self, name, row):
+        if "id" not in row:
+            self.next_id[name] += 1
+            row["id"] = self.next_id[name]
+        self.tables[name].append(row)
+        return row
+
+
+class FakeQuery:
+    def __init__(self, db, name):
+        self.db = db
+        self.name = name
+        self.op = "select"
+        self.columns = "*"
+        self.want_count = None
+        self.payload = None
+        self.on_conflict = None
+        self.ignore_duplicates = False
+        self.filters = []
+        self.sort = []
+        self.max_rows = None
+        self.offset = 0
+
+    # --- operații ---
+    def select(self, columns="*", count=None):
+        self.columns, self.want_count = columns, count
+        return self
+
+    def insert(self, rows):
+        self.op, self.payload = "insert", rows
+        return self
+
+    def update(self, patch):
+        self.op, self.payload = "update", patch
+        return self
+
+    def upsert(self, rows, on_conflict=None, ignore_duplicates=False, **kwargs):
+        self.op, self.payload, self.on_conflict = "upsert", rows, on_conflict
+        self.ignore_duplicates = ignore_duplicates
+        return self
+
+    def delete(self):
+        self.op = "delete"
+        return self
+
+    # --- filtre ---
+    def _filter(self, func):
+        self.filters.append(func)
+        return self
+
+    def eq(self, col, val):
+        return self._filter(lambda r: _same(r.get(col), val))
+
+    def neq(self, col, val):
+        return self._filter(lambda r: not _same(r.get(col), val))
+
+    def in_(self, col, values):
+        return self._filter(lambda r: any(_same(r.get(col), v) for v in values))
+
+    def gt(self, col, val):
+        return self._filter(lambda r: r.get(col) is not None and r.get(col) > val)
+
+    def gte(self, col, val):
+        return self._filter(lambda r: r.get(col) is not None and r.get(col) >= val)
+
+    def lt(self, col, val):
+        return self._filter(lambda r: r.get(col) is not None and r.get(col) < val)
+
+    def lte(self, col, val):
+        return self._filter(lambda r: r.get(col) is not None and r.get(col) <= val)
+
+    def order(self, col, desc=False):
+        self.sort.append((col, desc))
+        return self
+
+    def limit(self, n):
+        self.max_rows = n
+        return self
+
+    def range(self, start, end):
+        self.offset, self.max_rows = start, end - start + 1
+        return self
+
+    # --- execuție ---
+    def execute(self):
+        db = self.db
+        db.counts[f"{self.op} {self.name}"] += 1
+        if db.latency_ms:
+            time.sleep(db.latency_ms / 1000)
+        if db.error_rate and db.rng.random() < db.error_rate:
+            raise Exception("fake supabase error")
+
+        with db.lock:
+            table = db.tables[self.name]
+            if self.op == "insert":
+                rows = self.payload if isinstance(self.payload, list) else [self.payload]
+                return FakeResult([dict(db._insert_row(self.name, dict(r))) for r in rows])
+
+            if self.op == "upsert":
+                key = self.on_conflict or db.PRIMARY_KEYS.get(self.name, "id")
+                rows = self.payload if isinstance(self.payload, list) else [self.payload]
+                out = []
+                for row in rows:
+                    existing = next((r for r in table if key in row and _same(r.get(key), row[key])), None)
+                    if existing is not None:
+                        if self.ignore_duplicates:
+                            continue  # ca PostgREST: rândul existent rămâne neatins și nu e returnat
+                        existing.update(row)
+                        out.append(dict(existing))
+                    else:
+                        out.append(dict(db._insert_row(self.name, dict(row))))
+                return FakeResult(out)
+
+            matched = [r for r in table if all(f(r) for f in self.filters)]
+            if self.op == "update":
+                for row in matched:
+                    row.update(self.payload)
+                return FakeResult([dict(r) for r in matched])
+            if self.op == "delete":
+                db.tables[self.name] = [r for r in table if r not in matched]
+                return FakeResult([dict(r) for r in matched])
+
+            for col, desc in reversed(self.sort):
+                matched.sort(key=lambda r: (r.get(col) is None, r.get(col) or ""), reverse=desc)
+            count = len(matched) if self.want_count else None
+            end = None if self.max_rows is None else self.offset + self.max_rows
+            matched = matched[self.offset:end]
+            if self.columns.strip() != "*":
+                cols = [c.strip() for c in self.columns.split(",")]
+                matched = [{c: r.get(c) for c in cols} for r in matched]
+            else:
+                matched = [dict(r) for r in matched]
+            return FakeResult(matched, count)
+
+
+def _same(a, b):
+    return a == b or (a is not None and str(a) == str(b))
@@ -0,0 +1,131 @@
+import os
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# =====================================================
+# ⚙️ Constante
+# =====================================================
+LOG_DIR = os.getenv("LOG_DIR", "logs")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(20 * 1024 * 1024)))  # rotație la 20 MB
+LOG_BACKUPS = int(os.getenv("LOG_BACKUPS", "5"))
+LOG_CONSOLE = os.getenv("LOG_CONSOLE", "text").lower()  # text | json | off
+# mesajele repetitive (ex. „încă în așteptare”) trec de maximum LOG_SAMPLE_BURST ori
+# per cheie în fiecare fereastră de LOG_SAMPLE_WINDOW secunde
+LOG_SAMPLE_BURST = int(os.getenv("LOG_SAMPLE_BURST", "3"))
+LOG_SAMPLE_WINDOW = float(os.getenv("LOG_SAMPLE_WINDOW", "300"))
+
+# câmpuri `extra=` copiate în JSON
+STRUCTURED_FIELDS = ("symbol", "cycle_id", "order_id", "side", "status", "price", "latency_ms", "account", "suppressed")
+TEXT_FORMAT = "%(asctime)s [%(levelname)s] %(message)s"
+
+_listener = None
+_setup_lock = threading.Lock()
+
+# =====================================================
+# 🧾 Format JSON (un obiect per linie)
+# =====================================================
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+        }
+        for field in STRUCTURED_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+# =====================================================
+# 🎚️ Eșantionare pentru mesajele repetitive
+# =====================================================
+class SampleFilter(logging.Filter):
+    """
+    Înregistrările cu `extra={"sample": cheie}` trec de cel mult `burst` ori
+    per fereastră; restul sunt numărate, iar următoarea înregistrare care
+    trece primește câmpul `suppressed` cu câte au fost omise.
+    """
+
+    def __init__(self, burst=LOG_SAMPLE_BURST, window=LOG_SAMPLE_WINDOW):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self._keys = {}  # cheie -> [începutul ferestrei, trecute, omise]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        key = getattr(record, "sample", None)
+        if key is None or self.burst <= 0:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            state = self._keys.get(key)
+            if state is None or now - state[0] >= self.window:
+                suppressed = state[2] if state else 0
+                self._keys[key] = [now, 1, 0]
+                if len(self._keys) > 50_000:  # chei vechi (ordine închise) → curățăm
+                    cutoff = now - self.window
+                    self._keys = {k: v for k, v in self._keys.items() if v[0] >= cutoff}
+            elif state[1] < self.burst:
+                state[1] += 1
+                suppressed = 0
+            else:
+                state[2] += 1
+                return False
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+# =====================================================
+# 🚚 Pipeline: QueueHandler în thread-urile botilor, I/O pe un singur thread
+# =====================================================
+def setup_logging(name="stb"):
+    """
+    Root logger-ul pune înregistrările într-o coadă (fără I/O pe thread-ul
+    apelant); un QueueListener le scrie în logs/<name>.log (JSON, rotit după
+    mărime) și pe consolă. Idempotent per proces.
+    """
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return _listener
+
+        handlers = []
+        if LOG_DIR:
+            os.makedirs(LOG_DIR, exist_ok=True)
+            file_handler = RotatingFileHandler(
+                os.path.join(LOG_DIR, f"{name}.log"), maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8")
+            file_handler.setFormatter(JsonFormatter())
+            handlers.append(file_handler)
+        if LOG_CONSOLE != "off":
+            console = logging.StreamHandler()
+            console.setFormatter(JsonFormatter() if LOG_CONSOLE == "json" else logging.Formatter(TEXT_FORMAT))
+            handlers.append(console)
+
+        log_queue = queue.SimpleQueue()
+        queue_handler = QueueHandler(log_queue)
+        queue_handler.addFilter(SampleFilter())
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(queue_handler)
+        root.setLevel(LOG_LEVEL)
+        for noisy in ("httpx", "httpcore", "hpack", "websockets"):
+            logging.getLogger(noisy).setLevel(logging.WARNING)
+
+        _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+        return _listener
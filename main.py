@@ -1,7 +1,10 @@
 import time
+import asyncio
 import threading
 import uuid
 import os
+import sys
+import signal
 import logging
 from datetime import datetime, timezone
 from exchange import (
@@ -9,51 +12,66 @@ from exchange import (
     market_sell,
     check_order_executed,
     place_limit_buy,
+    place_buy_ladder,
+    MAX_BULK_LEGS,
 )
 from supabase_client import (
     get_latest_settings,
-    save_order,
-    supabase,
-    update_execution_time_and_profit,
+    get_settings_fingerprint,
+    build_order_row,
+    get_existing_order_ids,
 )
+from order_stream import get_order_stream
+from market_data import subscribe_book, release_book
+from reconciler import CHECKER_MODE, reconcile_account, group_bots_by_account
+from rate_limit import PollSchedule, priority, BACKGROUND
+from bot_runtime import Pause, BotControl, BotSupervisor, StartupScheduler, drive_blocking, any_signal
+from settings_watcher import SettingsWatcher
+from write_behind import get_journal, persist_insert, persist_update, pending_keys
+from cycle_ledger import ledger, settle_order
+from open_orders import get_order_index
+from symbols import round_price, preload_symbols
+from cycle_state import get_cycle_store, cycle_key, SELL_PLACED, SELL_FILLED, BUY_PLACED, BUY_FILLED
+from metrics import start_metrics_server, CYCLE_SECONDS, SELL_FILL_SECONDS, BUY_PLACE_SECONDS, SELL_SLIPPAGE_PERCENT, CYCLES
+from log_pipeline import setup_logging
+from sharding import start_sharding, holds_lease, owned_bots, owns_symbol, LEASE_HEARTBEAT
+from tracing import start_cycle
 
 # =====================================================
 # 🪵 Setup logging
 # =====================================================
-os.makedirs("logs", exist_ok=True)
-logging.basicConfig(
-    filename="logs/stb.log",
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-)
-console = logging.StreamHandler()
-console.setLevel(logging.INFO)
-formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(message)s")
-console.setFormatter(formatter)
-logging.getLogger("").addHandler(console)
-
+setup_logging("stb")  # logs/stb.log (JSON, rotit) + consolă, scrise de un singur thread
 logging.info("🚀 STB BOT (Sell-Then-Buy) started...\n")
 
 # =====================================================
 # ⚙️ Constante
 # =====================================================
 MARKET_TIMEOUT_SECONDS = 600  # 10 minute max pentru execuție MARKET
-TICK_SIZE = 0.00001  # pentru HONEY-USDT
-
-# =====================================================
-# 🧮 Tick Size Adjust
-# =====================================================
-def adjust_price_to_tick(price, tick_size=TICK_SIZE):
-    return round(round(price / tick_size) * tick_size, 5)
+STREAM_FALLBACK_POLL_SECONDS = 60  # cu stream activ, REST doar ca plasă de siguranță
+BOT_RUNTIME = os.getenv("BOT_RUNTIME", "threads").lower()  # threads | asyncio
+# SELL-ul e amânat dacă estimarea din cartea de ordine depășește pragul (%); 0 = doar estimare în log
+MAX_SELL_SLIPPAGE = float(os.getenv("MAX_SELL_SLIPPAGE", "0"))
+# programarea ciclurilor: "fixed" = SELL nou după cycle_delay; "fill" = SELL nou imediat ce BUY-ul
+# ciclului anterior e executat (cel puțin min_cycle_spacing între cicluri), cycle_delay rămâne plafonul
+CYCLE_SCHEDULE = os.getenv("CYCLE_SCHEDULE", "fixed").lower()
+MIN_CYCLE_SPACING = int(os.getenv("MIN_CYCLE_SPACING", "300"))  # secunde între două SELL-uri în modul fill
+MAX_OPEN_CYCLES = int(os.getenv("MAX_OPEN_CYCLES", "3"))  # cicluri cu BUY neexecutat per bot (modul fill)
+MAX_OPEN_BUYS = int(os.getenv("MAX_OPEN_BUYS", "0"))  # BUY-uri deschise per simbol peste care nu mai vindem; 0 = fără limită
+FILL_POLL_MAX_SECONDS = int(os.getenv("FILL_POLL_MAX_SECONDS", "60"))  # fără stream: BUY verificat la 1s, 2s, 4s... până la atât
 
 # =====================================================
 # 💾 Save wrapper
 # =====================================================
 def safe_save_order(symbol, side, price, status, meta):
     try:
-        save_order(symbol, side, price, status, meta)
+        # scriere în jurnalul local; flusher-ul o trimite în Supabase în fundal
+        row = build_order_row(symbol, side, price, status, meta)
+        persist_insert("orders", row)
+        get_order_index().apply(row)
+        ledger.record_order(meta.get("cycle_id"), meta.get("order_id"), symbol, side, price, status)
         logging.info(
-            f"[{symbol}] 💾 Saved {side} ({status}) | price={price} | cycle_id={meta.get('cycle_id')}"
+            f"[{symbol}] 💾 Saved {side} ({status}) | price={price} | cycle_id={meta.get('cycle_id')}",
+            extra={"symbol": symbol, "cycle_id": meta.get("cycle_id"), "order_id": meta.get("order_id"), "side": side},
         )
     except Exception as e:
         logging.error(f"[{symbol}] ❌ save_order failed: {e}")
@@ -61,27 +79,54 @@ def safe_save_order(symbol, side, price, status, meta):
 # =====================================================
 # ⏱️ Așteaptă execuția MARKET cu timeout
 # =====================================================
-def wait_market_execution(client, symbol, order_id, amount, check_delay, cycle_id):
+def wait_market_execution(client, symbol, order_id, amount, check_delay, cycle_id, stream=None, trace=None):
+    """Generator: cedează pauze până se execută SELL-ul; returnează (ok, avg_price)."""
     start_ts = time.time()
-    while True:
-        executed, avg_price = check_order_executed(client, order_id)
-        if executed:
-            supabase.table("orders").update(
-                {
+    last_poll = start_ts
+    schedule = PollSchedule(check_delay)  # 1s, 2s, 4s... până la check_delay
+    try:
+        while True:
+            streaming = bool(stream and stream.connected)
+            fill = stream.get_fill(order_id) if streaming else None
+
+            executed, avg_price = False, 0
+            if fill and fill["complete"] and fill["avg_price"] > 0:
+                executed, avg_price = True, fill["avg_price"]
+            elif fill or not streaming or time.time() - last_poll >= STREAM_FALLBACK_POLL_SECONDS:
+                # fallback REST: stream deconectat, fill incomplet sau verificare periodică
+                polled_at = time.time()
+                executed, avg_price = check_order_executed(client, order_id)
+                last_poll = time.time()
+                if trace:
+                    trace.add("check_order", polled_at, last_poll - polled_at, "ok" if executed else "pending")
+
+            if executed:
+                data = {
                     "status": "executed",
                     "price": avg_price,
                     "filled_size": amount,
                     "last_updated": datetime.now(timezone.utc).isoformat(),
                 }
-            ).eq("order_id", order_id).execute()
-            logging.info(f"[{symbol}] ✅ SELL executat @ {avg_price}")
-            return True, avg_price
-
-        if time.time() - start_ts > MARKET_TIMEOUT_SECONDS:
-            logging.warning(f"[{symbol}] ⏰ Timeout MARKET SELL — ordin pending, skip cycle.")
-            return False, 0
-
-        time.sleep(check_delay)
+                persist_update("orders", "order_id", order_id, data)
+                get_order_index().update(order_id, data)
+                ledger.record_fill(cycle_id, order_id, avg_price, amount)
+                logging.info(f"[{symbol}] ✅ SELL executat @ {avg_price}",
+                             extra={"symbol": symbol, "cycle_id": cycle_id, "order_id": order_id, "side": "SELL",
+                                    "price": avg_price, "latency_ms": round((time.time() - start_ts) * 1000, 1)})
+                return True, avg_price
+
+            if time.time() - start_ts > MARKET_TIMEOUT_SECONDS:
+                logging.warning(f"[{symbol}] ⏰ Timeout MARKET SELL — ordin pending, skip cycle.",
+                                extra={"symbol": symbol, "cycle_id": cycle_id, "order_id": order_id, "side": "SELL"})
+                return False, 0
+
+            if streaming:
+                yield Pause(check_delay, stream.done_event(order_id))
+            else:
+                yield Pause(schedule.next())
+    finally:
+        if stream:
+            stream.forget(order_id)
 
 # =====================================================
 # 🔍 Verificare ordine vechi (ultimele 5)
@@ -96,25 +141,17 @@ def update_order_status(order_id, new_status, avg_price=None, filled_size=None,
     if filled_size is not None:
         data["filled_size"] = filled_size
 
-    supabase.table("orders").update(data).eq("order_id", order_id).execute()
+    persist_update("orders", "order_id", order_id, data)
+    get_order_index().update(order_id, data)
     if new_status == "executed" and cycle_id:
-        update_execution_time_and_profit(cycle_id)
-    logging.info(f"🟢 Updated {order_id}: {new_status} ({avg_price})")
+        settle_order(cycle_id, order_id, avg_price, filled_size)
+    logging.info(f"🟢 Updated {order_id}: {new_status} ({avg_price})",
+                 extra={"order_id": order_id, "cycle_id": cycle_id, "status": new_status, "price": avg_price,
+                        "sample": None if new_status == "executed" else "pending_update"})
 
 
 def check_old_orders(client, symbol):
-    result = (
-        supabase.table("orders")
-        .select("*")
-        .eq("symbol", symbol)
-        .eq("strategy", "STB")
-        .in_("status", ["pending", "open"])
-        .order("last_updated", desc=False)
-        .limit(5)
-        .execute()
-    )
-
-    orders = result.data or []
+    orders = get_order_index().for_symbol(symbol, limit=5)  # din index, fără scanare 'orders'
     if not orders:
         logging.info(f"[{symbol}] ✅ Nicio comandă veche de verificat.")
         return
@@ -126,13 +163,42 @@ def check_old_orders(client, symbol):
         if not order_id:
             continue
 
-        done, avg_price = check_order_executed(client, order_id)
+        with priority(BACKGROUND):
+            done, avg_price = check_order_executed(client, order_id)
         if done:
             update_order_status(order_id, "executed", avg_price, None, cycle_id)
-            logging.info(f"[{symbol}] ✅ Ordin {side} executat: {order_id}")
+            logging.info(f"[{symbol}] ✅ Ordin {side} executat: {order_id}",
+                         extra={"symbol": symbol, "order_id": order_id, "cycle_id": cycle_id, "side": side})
         else:
             update_order_status(order_id, "pending")
-            logging.info(f"[{symbol}] ⏳ Ordin {side} încă în așteptare: {order_id}")
+            logging.info(f"[{symbol}] ⏳ Ordin {side} încă în așteptare: {order_id}",
+                         extra={"symbol": symbol, "order_id": order_id, "cycle_id": cycle_id, "side": side,
+                                "sample": "pending_status"})
+
+
+def saved_orders(order_ids):
+    """Ordinele deja salvate: încă în jurnalul write-behind sau deja în 'orders'."""
+    return pending_keys("orders", "order_id", order_ids) | get_existing_order_ids(order_ids)
+
+
+def handle_stream_fill(fill):
+    """Listener pentru order stream: marchează imediat BUY-urile executate."""
+    if str(fill.get("side")).lower() != "buy":
+        return  # SELL-urile MARKET sunt tratate de wait_market_execution
+
+    order_id = fill["order_id"]
+    row = get_order_index().get(order_id, refresh=True)
+    if not row:
+        # BUY plasat chiar acum, încă nesalvat: ciclul îl știm din checkpoint
+        cp = get_cycle_store().checkpoint_of(order_id)
+        row = {"symbol": fill.get("symbol"), "cycle_id": cp["cycle_id"]} if cp else None
+    if not row or not owns_symbol(row.get("symbol")):
+        return  # cu sharding, fill-ul e tratat de worker-ul care deține botul
+
+    # dacă stream-ul a ratat match-uri păstrăm prețul limit salvat la plasare
+    avg_price = fill["avg_price"] if fill["complete"] and fill["avg_price"] > 0 else None
+    update_order_status(order_id, "executed", avg_price, fill.get("filled_size"), row.get("cycle_id"))
+    logging.info(f"[{fill.get('symbol')}] 📡 BUY executat (stream): {order_id} @ {avg_price}")
 
 # =====================================================
 # 🕒 Checker periodic
@@ -141,7 +207,7 @@ def run_order_checker():
     while True:
         try:
             bots = get_latest_settings()
-            stb_bots = [b for b in bots if str(b.get("strategy", "")).lower() == "sell_buy"]
+            stb_bots = owned_bots([b for b in bots if str(b.get("strategy", "")).lower() == "sell_buy"])
 
             if not stb_bots:
                 logging.warning("⚠️ Niciun bot STB activ în settings.")
@@ -149,10 +215,25 @@ def run_order_checker():
                 continue
 
             logging.info(f"\n🔍 Pornesc verificarea la {datetime.now(timezone.utc).isoformat()}...\n")
+            get_order_index().sync()  # doar rândurile scrise între timp, nu o scanare per bot
             for bot in stb_bots:
-                symbol = bot["symbol"]
-                client = init_client(bot["api_key"], bot["api_secret"], bot["api_passphrase"])
-                check_old_orders(client, symbol)
+                stream = get_order_stream(bot["api_key"], bot["api_secret"], bot["api_passphrase"])
+                if stream:
+                    stream.add_listener(handle_stream_fill)
+
+            if CHECKER_MODE == "reconcile":
+                for account in group_bots_by_account(stb_bots):
+                    bot = account["bot"]
+                    try:
+                        client = init_client(bot["api_key"], bot["api_secret"], bot["api_passphrase"])
+                        reconcile_account(client, account["symbols"])
+                    except Exception as e:
+                        logging.error(f"❌ Reconciliere eșuată pentru {sorted(account['symbols'])}: {e}")
+            else:
+                for bot in stb_bots:
+                    symbol = bot["symbol"]
+                    client = init_client(bot["api_key"], bot["api_secret"], bot["api_passphrase"])
+                    check_old_orders(client, symbol)
 
             logging.info("✅ Verificarea STB s-a terminat. Următoarea în 1 oră.\n")
             time.sleep(3600)
@@ -164,76 +245,458 @@ def run_order_checker():
 # =====================================================
 # 🤖 Bot principal STB
 # =====================================================
-def run_bot(settings):
-    symbol = settings["symbol"]
-    amount = float(settings["amount"])
-    buy_discount = float(settings["buy_discount"])
-    check_delay = int(settings["check_delay"])
-    cycle_delay = int(settings["cycle_delay"])
-    api_key = settings["api_key"]
-    api_secret = settings["api_secret"]
-    api_passphrase = settings["api_passphrase"]
+def parse_buy_ladder(value):
+    """
+    Coloana opțională 'buy_ladder': "discount%:pondere,..." (ex. "1:40,2:30,3:30")
+    sau listă JSON [[1, 40], [2, 30], ...]. Returnează [(discount, fracțiune)] cu
+    fracțiunile normalizate la 1; listă goală = un singur BUY la buy_discount.
+    """
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = [part.split(":") for part in value.replace(";", ",").split(",") if part.strip()]
+    legs = []
+    for leg in value:
+        if isinstance(leg, dict):
+            discount, weight = leg.get("discount"), leg.get("weight", 1)
+        else:
+            discount, weight = leg[0], (leg[1] if len(leg) > 1 else 1)
+        discount, weight = float(discount) / 100.0, float(weight)
+        if not 0 <= discount < 1 or weight <= 0:
+            raise ValueError(f"buy_ladder invalid: {leg}")
+        legs.append((discount, weight))
+    if len(legs) > MAX_BULK_LEGS:
+        raise ValueError(f"buy_ladder: maximum {MAX_BULK_LEGS} picioare (limita batch KuCoin)")
+    total = sum(weight for _, weight in legs)
+    return [(discount, weight / total) for discount, weight in legs]
+
+
+def _setting(settings, name, default):
+    """Coloana opțională din 'settings'; doar NULL înseamnă valoarea implicită (0 e o valoare validă)."""
+    value = settings.get(name)
+    return default if value is None else value
+
 
+def parse_bot_settings(settings):
+    """Parametrii STB dintr-un rând 'settings' (buy_discount acceptat și în %)."""
+    buy_discount = float(settings["buy_discount"])
     if buy_discount > 1:
         buy_discount = buy_discount / 100.0
+    return {
+        "symbol": settings["symbol"],
+        "amount": float(settings["amount"]),
+        "buy_discount": buy_discount,
+        "buy_ladder": parse_buy_ladder(settings.get("buy_ladder")),
+        "check_delay": int(settings["check_delay"]),
+        "cycle_delay": int(settings["cycle_delay"]),
+        "schedule": str(settings.get("schedule_mode") or CYCLE_SCHEDULE).lower(),
+        "min_spacing": int(_setting(settings, "min_cycle_spacing", MIN_CYCLE_SPACING)),
+        "max_open_cycles": int(_setting(settings, "max_open_cycles", MAX_OPEN_CYCLES)),
+        "max_open_buys": int(_setting(settings, "max_open_buys", MAX_OPEN_BUYS)),
+        "api_key": settings["api_key"],
+        "api_secret": settings["api_secret"],
+        "api_passphrase": settings["api_passphrase"],
+    }
 
-    logging.info(f"[{symbol}] ⚙️ STB bot started | amount={amount}, buy-={buy_discount*100:.2f}%, cycle={cycle_delay/3600}h")
 
-    while True:
-        try:
-            client = init_client(api_key, api_secret, api_passphrase)
-            cycle_id = str(uuid.uuid4())
-            logging.info(f"[{symbol}] 🧠 New STB cycle {cycle_id} started...")
-
-            # 1️⃣ SELL MARKET
-            sell_id = market_sell(client, symbol, amount, "STB")
-            if not sell_id:
-                logging.warning(f"[{symbol}] ⚠️ Market SELL failed — skipping cycle.")
-                time.sleep(cycle_delay)
-                continue
+def wait_next_cycle(control, since=None):
+    """Așteaptă cycle_delay (de la `since`); se recalculează dacă botul e reconfigurat, iese la stop."""
+    started = since or time.time()
+    while not control.stopped:
+        control.wake.clear()
+        remaining = parse_bot_settings(control.settings)["cycle_delay"] - (time.time() - started)
+        if remaining <= 0:
+            return
+        yield Pause(remaining, control.wake)
+
+
+def open_buy_cycles(symbol, cycle_ids=None):
+    """
+    (BUY-uri deschise, cicluri distincte cu BUY deschis) pentru simbol, din indexul
+    de ordine; cu `cycle_ids` doar ciclurile date (ale unui bot).
+    """
+    buys = [r for r in get_order_index().for_symbol(symbol)
+            if str(r.get("side")).upper() == "BUY" and (cycle_ids is None or r.get("cycle_id") in cycle_ids)]
+    return len(buys), len({r.get("cycle_id") for r in buys})
+
+
+def buy_legs(cp):
+    return cp.get("buy_ids") or [cp["buy_id"]]
+
+
+def poll_buy_fills(client, stream, cp, rest_check=False):
+    """
+    Verifică picioarele BUY încă deschise ale ciclului; cele închise sunt marcate (→ BUY_FILLED).
+    Cu stream conectat REST-ul e folosit doar cu `rest_check` (plasă de siguranță pentru evenimente pierdute).
+    """
+    filled = set(cp.get("buy_filled") or [])
+    for order_id in [i for i in buy_legs(cp) if i not in filled]:
+        streaming = bool(stream and stream.connected)
+        fill = stream.get_fill(order_id) if streaming else None
+        if fill and fill["complete"] and (fill["avg_price"] > 0 or fill["canceled"]):
+            done, avg_price = True, fill["avg_price"]
+        elif streaming and not fill and not rest_check:
+            continue  # stream-ul anunță fill-ul, fără request REST
+        else:
+            # fără stream sau fill cu match-uri ratate → prețul mediu prin REST
+            with priority(BACKGROUND):
+                done, avg_price = check_order_executed(client, order_id)
+        if not done:
+            continue
+        if avg_price > 0:
+            update_order_status(order_id, "executed", avg_price, fill.get("filled_size") if fill else None, cp["cycle_id"])
+        else:
+            update_order_status(order_id, "canceled")  # anulat fără execuție: nimic de cumpărat înapoi
+            get_cycle_store().mark_order_filled(order_id)
+
+
+def wait_cycle_slot(control, client, stream, store, bot, since):
+    """
+    Așteptarea dintre cicluri. În modul "fixed" e cycle_delay, ca înainte. În modul
+    "fill" următorul SELL pleacă imediat ce toate BUY-urile ciclului sunt executate
+    (dar nu mai devreme de min_spacing de la BUY); dacă BUY-ul nu se execută, după
+    cycle_delay pornim totuși un ciclu nou, cât timp botul are sub max_open_cycles
+    cicluri cu BUY deschis.
+    """
+    schedule = PollSchedule(FILL_POLL_MAX_SECONDS)
+    last_rest = time.time()
+    try:
+        yield from _wait_cycle_slot(control, client, stream, store, bot, since, schedule, last_rest)
+    finally:
+        cp = store.get(bot)
+        if stream and cp and cp.get("state") == BUY_PLACED:
+            for order_id in buy_legs(cp):
+                stream.forget(order_id)  # ciclu lăsat în urmă cu BUY deschis: fill-ul vine prin checker
+
+
+def _wait_cycle_slot(control, client, stream, store, bot, since, schedule, last_rest):
+    while not control.stopped:
+        control.wake.clear()
+        p = parse_bot_settings(control.settings)
+        if p["schedule"] != "fill":
+            yield from wait_next_cycle(control, since=since)
+            return
+
+        elapsed = time.time() - since
+        cp = store.get(bot)
+        if cp and cp["state"] == BUY_PLACED:
+            rest_check = time.time() - last_rest >= STREAM_FALLBACK_POLL_SECONDS
+            poll_buy_fills(client, stream, cp, rest_check)
+            if rest_check:
+                last_rest = time.time()
+            cp = store.get(bot)
+        if not cp or cp["state"] != BUY_PLACED:
+            if elapsed >= p["min_spacing"]:
+                logging.info(f"[{p['symbol']}] ⚡ BUY executat → ciclu nou", extra={"symbol": p["symbol"]})
+                return
+            wait = p["min_spacing"] - elapsed
+        elif elapsed >= p["cycle_delay"] and open_buy_cycles(p["symbol"], store.cycles_of(bot))[1] < p["max_open_cycles"]:
+            return  # BUY încă deschis, dar mai avem loc pentru un ciclu paralel
+        else:
+            wait = schedule.next()
+            if elapsed < p["cycle_delay"]:
+                wait = min(wait, p["cycle_delay"] - elapsed)
+
+        if cp and cp["state"] == BUY_PLACED and stream and stream.connected:
+            # trezire la fill-ul oricărui picior al scării (sau la reconfigurare)
+            event, detach = any_signal([control.wake] + [stream.done_event(i) for i in buy_legs(cp)])
+            try:
+                yield Pause(max(min(wait, STREAM_FALLBACK_POLL_SECONDS), 0.1), event)
+            finally:
+                detach()
+        else:
+            yield Pause(max(wait, 0.1), control.wake)
+
+
+def plan_buys(amount, buy_discount, ladder):
+    """Picioarele BUY ale ciclului ca [(size, discount)], calculate înainte de SELL."""
+    if not ladder:
+        return [(amount, buy_discount)]
+    return [(amount * share, discount) for discount, share in ladder]
+
+
+def place_buys(client, symbol, plan, sell_price, cycle_id=None, resend=False):
+    """
+    Trimite BUY-urile planificate la prețul mediu real al SELL-ului → [(order_id, size, price)].
+    clientOid-urile vin din cycle_id, deci un BUY reluat (`resend`) nu dublează ordinele deja plasate.
+    """
+    if len(plan) == 1:
+        size, discount = plan[0]
+        buy_price = float(round_price(symbol, sell_price * (1 - discount)))
+        buy_id = place_limit_buy(client, symbol, size, buy_price, "STB", cycle_id=cycle_id, resend=resend)
+        return [(buy_id, size, buy_price)] if buy_id else []
+    legs = [(size, sell_price * (1 - discount)) for size, discount in plan]
+    return place_buy_ladder(client, symbol, legs, "STB", cycle_id=cycle_id, resend=resend)
+
+
+def pre_trade_estimate(book, symbol, amount):
+    """Estimarea SELL-ului market din cartea de ordine partajată (None fără date proaspete)."""
+    estimate = book.estimate_sell(amount) if book is not None and book.fresh else None
+    if estimate:
+        logging.info(f"[{symbol}] 📖 SELL estimat @ {estimate['avg_price']:.8f} (best bid {estimate['best_bid']}, "
+                     f"slippage {estimate['slippage_pct']:.3f}%{'' if estimate['covered'] else ', peste adâncimea vizibilă'})",
+                     extra={"symbol": symbol, "side": "SELL", "price": estimate["avg_price"]})
+    return estimate
+
+
+def stb_cycles(control):
+    """
+    Generator cu logica STB: execută pașii unui ciclu și cedează o Pause
+    de fiecare dată când trebuie să aștepte. Rulat fie pe thread (run_bot),
+    fie ca task asyncio (async_engine). Setările sunt recitite din `control`
+    la fiecare ciclu, iar la stop botul iese la granița de ciclu.
+    """
+    symbol = control.settings["symbol"]
+    book = subscribe_book(symbol)  # o singură abonare publică per simbol, partajată de boti
+    try:
+        yield from _stb_cycles(control, book)
+    finally:
+        release_book(symbol)
 
-            safe_save_order(symbol, "SELL", 0, "pending", {"order_id": sell_id, "cycle_id": cycle_id, "strategy": "STB"})
-            ok, avg_price = wait_market_execution(client, symbol, sell_id, amount, check_delay, cycle_id)
-            if not ok or avg_price <= 0:
-                time.sleep(cycle_delay)
-                continue
 
-            # 2️⃣ BUY LIMIT
-            buy_price = adjust_price_to_tick(avg_price * (1 - buy_discount))
-            buy_id = place_limit_buy(client, symbol, amount, buy_price, "STB")
-            if not buy_id:
-                logging.warning(f"[{symbol}] ⚠️ Limit BUY failed — skipping cycle.")
-                time.sleep(cycle_delay)
+def _stb_cycles(control, book):
+    symbol = control.settings["symbol"]
+    try:
+        p = parse_bot_settings(control.settings)
+        logging.info(f"[{symbol}] ⚙️ STB bot started | amount={p['amount']}, buy-={p['buy_discount']*100:.2f}%, cycle={p['cycle_delay']/3600}h")
+    except (KeyError, TypeError, ValueError) as e:
+        # setările sunt recitite în buclă: botul reîncearcă până sunt corectate
+        logging.error(f"[{symbol}] ❌ Setări invalide: {e}", extra={"symbol": symbol})
+
+    store = get_cycle_store()
+    bot = cycle_key(control.settings)
+    resume = store.get(bot)  # checkpoint-ul lăsat de rularea anterioară
+    failed_sell = None  # cycle_id-ul unui SELL eșuat, refolosit la ciclul următor
+    if resume:
+        logging.info(f"[{symbol}] ♻️ Reiau ciclul {resume['cycle_id']} din starea {resume['state']}",
+                     extra={"symbol": symbol, "cycle_id": resume["cycle_id"], "status": resume["state"]})
+
+    while not control.stopped:
+        trace = start_cycle(symbol)  # timeline-ul încercării curente (păstrat la finish, după eșantionare)
+        try:
+            with trace.span("settings"):
+                p = parse_bot_settings(control.settings)
+            buy_discount = p["buy_discount"]
+            check_delay = p["check_delay"]
+            cycle_delay = p["cycle_delay"]
+
+            with trace.span("init_client"):
+                client = init_client(p["api_key"], p["api_secret"], p["api_passphrase"])
+                stream = get_order_stream(p["api_key"], p["api_secret"], p["api_passphrase"])
+            cp, resume = resume, None
+            resumed = cp is not None  # BUY-ul poate fi plecat deja înainte de restart / eșecul anterior
+
+            if cp and cp["state"] in (BUY_PLACED, BUY_FILLED):
+                # ciclul anterior era complet: doar restul așteptării, fără un SELL nou
+                yield from wait_cycle_slot(control, client, stream, store, bot, since=cp.get("buy_placed_at") or time.time())
                 continue
 
-            safe_save_order(symbol, "BUY", buy_price, "open", {"order_id": buy_id, "cycle_id": cycle_id, "strategy": "STB"})
-            logging.info(f"[{symbol}] 🟢 BUY limit placed @ {buy_price} (-{buy_discount*100:.2f}%)")
+            estimate = None
+            if cp is None:
+                amount = p["amount"]
+                # după un SELL eșuat reluăm același cycle_id: clientOid-ul SELL-ului rămâne același,
+                # deci un SELL acceptat totuși de exchange (timeout) e găsit, nu dublat
+                cycle_id, sell_resend = (failed_sell, True) if failed_sell else (str(uuid.uuid4()), False)
+                failed_sell = None
+                trace.cycle_id = cycle_id
+                logging.info(f"[{symbol}] 🧠 New STB cycle {cycle_id} started...", extra={"symbol": symbol, "cycle_id": cycle_id})
+
+                if not holds_lease(control.settings):
+                    # lease nereînnoit: alt worker poate prelua botul → niciun SELL nou
+                    logging.warning(f"[{symbol}] 🔐 Lease neconfirmat — amân SELL-ul.", extra={"symbol": symbol})
+                    yield Pause(LEASE_HEARTBEAT, control.wake)
+                    continue
+
+                open_buys, _ = open_buy_cycles(symbol) if p["max_open_buys"] else (0, 0)
+                if p["max_open_buys"] and open_buys > p["max_open_buys"]:
+                    CYCLES.inc(symbol=symbol, result="open_buys_skip")
+                    trace.finish("open_buys_skip")
+                    logging.warning(f"[{symbol}] ⚠️ {open_buys} BUY-uri încă deschise (limita {p['max_open_buys']}) — skipping SELL.",
+                                    extra={"symbol": symbol, "sample": f"open_buys:{symbol}"})
+                    yield Pause(max(p["min_spacing"], 1) if p["schedule"] == "fill" else cycle_delay, control.wake)
+                    continue
+
+                with trace.span("pre_trade"):
+                    estimate = pre_trade_estimate(book, symbol, amount)
+                if MAX_SELL_SLIPPAGE and estimate and (not estimate["covered"] or estimate["slippage_pct"] > MAX_SELL_SLIPPAGE):
+                    CYCLES.inc(symbol=symbol, result="slippage_skip")
+                    trace.finish("slippage_skip")
+                    logging.warning(f"[{symbol}] ⚠️ Slippage estimat peste {MAX_SELL_SLIPPAGE}% — skipping cycle.", extra={"symbol": symbol})
+                    yield from wait_next_cycle(control)
+                    continue
+
+                # 1️⃣ SELL MARKET
+                with trace.span("market_sell") as span:
+                    sell_id = market_sell(client, symbol, amount, "STB", cycle_id=cycle_id, resend=sell_resend)
+                    span.outcome = "ok" if sell_id else "fail"
+                sell_placed_at = time.time()
+                if not sell_id:
+                    failed_sell = cycle_id
+                    CYCLES.inc(symbol=symbol, result="sell_failed")
+                    trace.finish("sell_failed")
+                    logging.warning(f"[{symbol}] ⚠️ Market SELL failed — skipping cycle.")
+                    yield from wait_next_cycle(control)
+                    continue
+
+                with trace.span("checkpoint"):
+                    cp = store.save(bot, SELL_PLACED, cycle_id=cycle_id, sell_id=sell_id, amount=amount,
+                                    sell_placed_at=sell_placed_at)
+                with trace.span("save_order"):
+                    safe_save_order(symbol, "SELL", 0, "pending", {"order_id": sell_id, "cycle_id": cycle_id, "strategy": "STB"})
+            else:
+                # reluare după restart: ledger-ul (în memorie) trebuie să cunoască SELL-ul pentru profit
+                filled = cp["state"] == SELL_FILLED
+                ledger.record_order(cp["cycle_id"], cp["sell_id"], symbol, "SELL", cp.get("sell_price") or 0,
+                                    "executed" if filled else "pending",
+                                    created_at=datetime.fromtimestamp(cp["sell_placed_at"], timezone.utc).isoformat(),
+                                    filled_size=cp["amount"] if filled else None)
+
+            cycle_id, sell_id, amount = cp["cycle_id"], cp["sell_id"], cp["amount"]
+            trace.cycle_id = cycle_id
+            sell_placed_at = cp["sell_placed_at"]
+            # BUY-urile (cantități, discount-uri) sunt pregătite cât așteptăm fill-ul;
+            # la confirmare rămâne doar prețul din media reală a SELL-ului
+            plan = plan_buys(amount, buy_discount, p["buy_ladder"])
+
+            if cp["state"] == SELL_PLACED:
+                wait_started = time.time()
+                ok, avg_price = yield from wait_market_execution(client, symbol, sell_id, amount, check_delay, cycle_id, stream, trace)
+                trace.add("sell_wait", wait_started, time.time() - wait_started, "ok" if ok and avg_price > 0 else "timeout")
+                if not ok or avg_price <= 0:
+                    CYCLES.inc(symbol=symbol, result="sell_timeout")
+                    trace.finish("sell_timeout")
+                    store.clear(bot)  # SELL-ul rămas pending e preluat de checker
+                    yield from wait_next_cycle(control)
+                    continue
+                SELL_FILL_SECONDS.observe(time.time() - sell_placed_at, symbol=symbol)
+                if estimate:
+                    SELL_SLIPPAGE_PERCENT.observe(estimate["slippage_pct"], symbol=symbol, kind="estimated")
+                    SELL_SLIPPAGE_PERCENT.observe((estimate["best_bid"] - avg_price) / estimate["best_bid"] * 100,
+                                                  symbol=symbol, kind="realized")
+                with trace.span("checkpoint"):
+                    cp = store.save(bot, SELL_FILLED, sell_price=avg_price, sell_filled_at=time.time())
+            sell_filled_at = cp["sell_filled_at"]
+
+            # 2️⃣ BUY LIMIT (unul singur sau în scară, într-un singur request batch)
+            with trace.span("place_buy") as span:
+                buys = place_buys(client, symbol, plan, cp["sell_price"], cycle_id, resend=resumed)
+                span.outcome = "ok" if buys else "fail"
+            if not buys:
+                CYCLES.inc(symbol=symbol, result="buy_failed")
+                trace.finish("buy_failed")
+                logging.warning(f"[{symbol}] ⚠️ Limit BUY failed — retrying the BUY next cycle (no new SELL).")
+                resume = cp
+                yield from wait_next_cycle(control)
+                continue
 
-            # Așteaptă următorul ciclu
-            logging.info(f"[{symbol}] ⏳ Cycle complete → waiting {cycle_delay/3600}h\n")
-            time.sleep(cycle_delay)
+            buy_placed_at = time.time()
+            # rândurile BUY intră în index/jurnal înaintea checkpoint-ului: un fill rapid venit pe
+            # stream găsește ordinul; la reluare nu salvăm din nou picioarele deja cunoscute
+            with trace.span("save_order"):
+                known = saved_orders([buy_id for buy_id, _, _ in buys]) if resumed else set()
+                for buy_id, _, buy_price in buys:  # toate picioarele sub același cycle_id
+                    if buy_id not in known:
+                        safe_save_order(symbol, "BUY", buy_price, "open", {"order_id": buy_id, "cycle_id": cycle_id, "strategy": "STB"})
+            with trace.span("checkpoint"):
+                store.save(bot, BUY_PLACED, buy_id=buys[0][0], buy_price=buys[0][2], buy_placed_at=buy_placed_at,
+                           buy_ids=[order_id for order_id, _, _ in buys], buy_prices=[price for _, _, price in buys])
+            BUY_PLACE_SECONDS.observe(buy_placed_at - sell_filled_at, symbol=symbol)
+            CYCLE_SECONDS.observe(buy_placed_at - sell_placed_at, symbol=symbol)
+            CYCLES.inc(symbol=symbol, result="completed")
+            trace.finish("completed")
+            logging.info(f"[{symbol}] 🟢 BUY limit placed @ {', '.join(str(price) for _, _, price in buys)} "
+                         f"(-{buy_discount*100:.2f}%{', ladder' if len(buys) > 1 else ''})",
+                         extra={"symbol": symbol, "cycle_id": cycle_id, "order_id": buys[0][0], "side": "BUY", "price": buys[0][2],
+                                "latency_ms": round((buy_placed_at - sell_filled_at) * 1000, 1)})
+
+            # Așteaptă următorul ciclu (cycle_delay sau fill-ul BUY-ului, după schedule_mode)
+            if p["schedule"] == "fill":
+                logging.info(f"[{symbol}] ⏳ Cycle complete → next SELL when the BUY fills (max {cycle_delay/3600}h)\n")
+            else:
+                logging.info(f"[{symbol}] ⏳ Cycle complete → waiting {cycle_delay/3600}h\n")
+            yield from wait_cycle_slot(control, client, stream, store, bot, since=buy_placed_at)
 
         except Exception as e:
+            CYCLES.inc(symbol=symbol, result="error")
+            trace.finish("error")
             logging.error(f"[{symbol}] ❌ Error: {e}")
-            time.sleep(30)
+            # un ciclu deja checkpoint-uit (ex. SELL plasat) e reluat, nu înlocuit de un SELL nou
+            resume = store.get(bot)
+            yield Pause(30)
+
+    logging.info(f"[{symbol}] 🛑 STB bot stopped.")
+
+
+def run_bot(settings):
+    drive_blocking(stb_cycles(BotControl(settings)))
+
+
+def launch_thread_bot(control, start_delay=0):
+    def target():
+        time.sleep(start_delay)
+        drive_blocking(stb_cycles(control))
+
+    threading.Thread(target=target, daemon=True).start()
 
 # =====================================================
 # 🚀 Start doar pentru strategia STB
 # =====================================================
-def start_stb_bot():
+def valid_bot_settings(settings):
+    """False (cu log) pentru un rând 'settings' care nu poate fi parsat, ex. buy_ladder greșit."""
+    try:
+        parse_bot_settings(settings)
+        return True
+    except (KeyError, TypeError, ValueError) as e:
+        logging.error(f"[{settings.get('symbol')}] ❌ Bot ignorat, setări invalide: {e}",
+                      extra={"symbol": settings.get("symbol")})
+        return False
+
+
+def load_stb_bots():
     bots = get_latest_settings()
-    stb_bots = [b for b in bots if str(b.get("strategy", "")).lower() == "sell_buy"]
+    return [b for b in bots if str(b.get("strategy", "")).lower() == "sell_buy" and valid_bot_settings(b)]
+
+
+def resumes_in_flight(settings):
+    """Botul are un ciclu întrerupt între SELL și BUY → pornește imediat."""
+    cp = get_cycle_store().get(cycle_key(settings))
+    return bool(cp) and cp["state"] in (SELL_PLACED, SELL_FILLED)
+
+
+def start_stb_bot():
+    start_metrics_server()
+    get_journal()  # reia scrierile rămase în jurnal de la rularea anterioară
+    get_cycle_store()  # snapshot-ul ciclurilor în curs, citit o singură dată
+    get_order_index()  # ordinele deschise, încărcate o singură dată pentru checker
+    preload_symbols()  # tick/lot pentru toate simbolurile, înainte de primul ordin
+    stb_bots = load_stb_bots()
 
     if not stb_bots:
         logging.warning("⚠️ No SELL_BUY bots found in Supabase.")
-        return
 
-    for i, settings in enumerate(stb_bots):
-        threading.Thread(target=run_bot, args=(settings,), daemon=True).start()
-        logging.info(f"🕒 Delay 10s înainte de următorul bot ({i+1}/{len(stb_bots)})...")
-        time.sleep(10)
+    def start_watching(launcher):
+        # toți botii pornesc deodată, primul SELL e împrăștiat în bugetul fiecărui cont;
+        # apoi doar diff-uri la schimbarea setărilor
+        supervisor = BotSupervisor(launcher, StartupScheduler(immediate=resumes_in_flight))
+        # cu sharding, setările trec prin coordonator: rulăm doar botii cu lease
+        apply = start_sharding(supervisor.apply)
+        if apply is not supervisor.apply and threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))  # restart de dyno → atexit eliberează lease-urile
+        apply(stb_bots)
+        watcher = SettingsWatcher(load_stb_bots, apply, get_settings_fingerprint)
+        watcher.check()
+        watcher.start()
+        threading.Thread(target=run_order_checker, daemon=True).start()
+        return supervisor
+
+    if BOT_RUNTIME == "asyncio":
+        from async_engine import AsyncBotEngine
+
+        engine = AsyncBotEngine(stb_cycles)
+        asyncio.run(engine.run_forever(on_ready=lambda: start_watching(engine.launch)))
+        return
 
-    threading.Thread(target=run_order_checker, daemon=True).start()
+    start_watching(launch_thread_bot)
     while True:
         time.sleep(60)
 
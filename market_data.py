@@ -0,0 +1,274 @@
+import os
+import json
+import time
+import uuid
+import random
+import asyncio
+import logging
+import threading
+
+try:
+    import websockets
+except ImportError:  # fără websockets botii tranzacționează fără carte de ordine
+    websockets = None
+
+from kucoin.client import WsToken
+
+# =====================================================
+# ⚙️ Constante
+# =====================================================
+MARKET_DATA_ENABLED = os.getenv("MARKET_DATA_ENABLED", "1") != "0"
+MARKET_DEPTH = 50 if os.getenv("MARKET_DEPTH", "5") == "50" else 5  # canalele level2Depth5 / level2Depth50
+MARKET_DATA_MAX_AGE = float(os.getenv("MARKET_DATA_MAX_AGE", "5"))  # secunde; o carte mai veche e ignorată
+TICKER_TOPIC = "/market/ticker"
+DEPTH_TOPIC = f"/spotMarket/level2Depth{MARKET_DEPTH}"
+SYMBOLS_PER_SUBSCRIBE = 100  # limita KuCoin de simboluri într-un singur topic
+SYMBOLS_PER_CONNECTION = 150  # 2 topic-uri per simbol, sub limita de topic-uri a unei conexiuni
+RECONNECT_MAX_DELAY = 60
+
+_market = None
+_market_lock = threading.Lock()
+
+# =====================================================
+# 📖 Cartea de ordine a unui simbol (în memorie)
+# =====================================================
+class OrderBook:
+    """
+    Top-of-book și adâncime pentru un simbol, înlocuite la fiecare push.
+    Un snapshot e un singur tuplu atribuit atomic, deci cititorii (boti pe
+    thread-uri sau în asyncio) nu au nevoie de lock.
+    """
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self._depth = ((), (), 0.0)  # (bids, asks, updated_at), nivele [(preț, cantitate)]
+        self.last_price = 0.0
+
+    def update_depth(self, bids, asks, ts=None):
+        self._depth = (
+            tuple((float(p), float(q)) for p, q in bids),
+            tuple((float(p), float(q)) for p, q in asks),
+            ts or time.time(),
+        )
+
+    def update_ticker(self, data):
+        self.last_price = float(data.get("price") or self.last_price)
+        if not self._depth[0] and data.get("bestBid"):  # încă fără adâncime: măcar top-of-book din ticker
+            self.update_depth([(data["bestBid"], data.get("bestBidSize") or 0)],
+                              [(data["bestAsk"], data.get("bestAskSize") or 0)] if data.get("bestAsk") else [])
+
+    @property
+    def fresh(self):
+        return time.time() - self._depth[2] <= MARKET_DATA_MAX_AGE
+
+    @property
+    def best_bid(self):
+        bids = self._depth[0]
+        return bids[0][0] if bids else 0.0
+
+    @property
+    def best_ask(self):
+        asks = self._depth[1]
+        return asks[0][0] if asks else 0.0
+
+    def estimate_sell(self, size):
+        """
+        Prețul mediu estimat pentru un SELL market de `size` consumat din bid-uri.
+        Dacă adâncimea vizibilă nu ajunge, restul e evaluat la ultimul nivel
+        (estimare optimistă) și `covered` e False.
+        """
+        bids = self._depth[0]
+        if not bids or size <= 0:
+            return None
+        remaining, funds = float(size), 0.0
+        for price, qty in bids:
+            take = min(remaining, qty)
+            funds += take * price
+            remaining -= take
+            if remaining <= 1e-12:
+                break
+        covered = remaining <= 1e-12
+        if not covered:
+            funds += remaining * bids[-1][0]
+        avg_price = funds / float(size)
+        best = bids[0][0]
+        return {
+            "avg_price": avg_price,
+            "best_bid": best,
+            "slippage_pct": (best - avg_price) / best * 100,
+            "covered": covered,
+        }
+
+# =====================================================
+# 📡 O conexiune WebSocket publică (ticker + depth pentru un grup de simboluri)
+# =====================================================
+class MarketFeed:
+    def __init__(self, market):
+        self.market = market
+        self.symbols = set()  # simbolurile dorite pe această conexiune
+        self._subscribed = set()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=lambda: asyncio.run(self._run_forever()), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    async def _run_forever(self):
+        delay = 1
+        while not self._stopped.is_set():
+            try:
+                await self._session()
+                delay = 1
+            except Exception as e:
+                logging.warning(f"⚠️ Market data deconectat ({len(self.symbols)} simboluri): {e}")
+            self._subscribed = set()
+            if self._stopped.is_set():
+                return
+            await asyncio.sleep(delay + random.uniform(0, 1))
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+    async def _session(self):
+        token_data = await asyncio.to_thread(WsToken().get_ws_token, False)
+        server = token_data["instanceServers"][0]
+        url = f"{server['endpoint']}?token={token_data['token']}&connectId={uuid.uuid4().hex}"
+        ping_interval = server.get("pingInterval", 18000) / 1000
+
+        async with websockets.connect(url, ping_interval=None, max_size=None) as ws:
+            welcome = json.loads(await ws.recv())
+            if welcome.get("type") != "welcome":
+                raise RuntimeError(f"Răspuns neașteptat la conectare: {welcome}")
+            logging.info("📖 Market data conectat")
+
+            last_ping = time.time()
+            while not self._stopped.is_set():
+                await self._sync_subscriptions(ws)
+                # timeout scurt: simbolurile noi sunt abonate fără să așteptăm următorul mesaj
+                timeout = max(0.1, min(0.5, ping_interval - (time.time() - last_ping)))
+                try:
+                    raw = await asyncio.wait_for(ws.recv(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    if time.time() - last_ping >= ping_interval:
+                        await ws.send(json.dumps({"id": uuid.uuid4().hex, "type": "ping"}))
+                        last_ping = time.time()
+                    continue
+
+                msg = json.loads(raw)
+                if msg.get("type") == "message":
+                    self._handle(msg.get("topic") or "", msg.get("data") or {})
+                elif msg.get("type") == "error":
+                    raise RuntimeError(msg.get("data"))
+
+    async def _sync_subscriptions(self, ws):
+        with self.market._lock:
+            wanted = set(self.symbols)
+        for kind, symbols in (("subscribe", wanted - self._subscribed), ("unsubscribe", self._subscribed - wanted)):
+            symbols = sorted(symbols)
+            for i in range(0, len(symbols), SYMBOLS_PER_SUBSCRIBE):
+                chunk = ",".join(symbols[i:i + SYMBOLS_PER_SUBSCRIBE])
+                for topic in (TICKER_TOPIC, DEPTH_TOPIC):
+                    await ws.send(json.dumps({"id": uuid.uuid4().hex, "type": kind,
+                                              "topic": f"{topic}:{chunk}", "response": False}))
+        self._subscribed = wanted
+
+    def _handle(self, topic, data):
+        channel, _, symbol = topic.partition(":")
+        book = self.market.books.get(symbol)
+        if book is None:
+            return
+        if channel == DEPTH_TOPIC:
+            ts = data.get("timestamp")
+            book.update_depth(data.get("bids") or [], data.get("asks") or [], ts / 1000 if ts else None)
+        elif channel == TICKER_TOPIC:
+            book.update_ticker(data)
+
+# =====================================================
+# 🗂️ Serviciul partajat: o carte și o abonare per simbol
+# =====================================================
+class MarketData:
+    """
+    Cărțile de ordine ale simbolurilor tranzacționate, partajate de toți botii
+    din proces. Fiecare simbol e abonat o singură dată (numărăm botii care îl
+    folosesc); conexiunile publice sunt deschise la nevoie, câte una la
+    SYMBOLS_PER_CONNECTION simboluri.
+    """
+
+    def __init__(self, local=False):
+        self.local = local  # True = fără WebSocket, cărțile vin prin feed() (benchmark)
+        self.books = {}
+        self._refs = {}
+        self._feeds = []
+        self._feed_of = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, symbol):
+        with self._lock:
+            self._refs[symbol] = self._refs.get(symbol, 0) + 1
+            book = self.books.get(symbol)
+            if book is None:
+                book = self.books[symbol] = OrderBook(symbol)
+                if not self.local:
+                    self._assign(symbol)
+            return book
+
+    def unsubscribe(self, symbol):
+        with self._lock:
+            refs = self._refs.get(symbol, 0) - 1
+            if refs > 0:
+                self._refs[symbol] = refs
+                return
+            self._refs.pop(symbol, None)
+            self.books.pop(symbol, None)
+            feed = self._feed_of.pop(symbol, None)
+            if feed:
+                feed.symbols.discard(symbol)
+
+    def get_book(self, symbol):
+        return self.books.get(symbol)
+
+    def feed(self, symbol, bids, asks, ts=None):
+        """Injectează un snapshot de adâncime (folosit de exchange-ul fake din benchmark)."""
+        book = self.books.get(symbol)
+        if book is not None:
+            book.update_depth(bids, asks, ts)
+
+    def _assign(self, symbol):
+        feed = next((f for f in self._feeds if len(f.symbols) < SYMBOLS_PER_CONNECTION), None)
+        if feed is None:
+            feed = MarketFeed(self)
+            self._feeds.append(feed)
+            feed.start()
+        feed.symbols.add(symbol)
+        self._feed_of[symbol] = feed
+
+
+def get_market_data():
+    """Serviciul global (pornit la primul apel), sau None dacă e dezactivat."""
+    global _market
+    with _market_lock:
+        if _market is None and MARKET_DATA_ENABLED and websockets is not None:
+            _market = MarketData()
+        return _market
+
+
+def use_market_data(market):
+    """Înlocuiește serviciul global (ex. MarketData(local=True) alimentat de exchange-ul fake)."""
+    global _market
+    with _market_lock:
+        _market = market
+
+
+def subscribe_book(symbol):
+    market = get_market_data()
+    return market.subscribe(symbol) if market else None
+
+
+def release_book(symbol):
+    market = get_market_data()
+    if market:
+        market.unsubscribe(symbol)
@@ -0,0 +1,193 @@
+import os
+import re
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# =====================================================
+# ⚙️ Constante
+# =====================================================
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))  # 0 = endpoint dezactivat
+# secunde; acoperă de la un request KuCoin rapid până la un SELL care stă minute întregi
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900)
+CYCLE_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)
+SLIPPAGE_BUCKETS = (0, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5)  # procente
+
+_registry = []
+_server = None
+_server_lock = threading.Lock()
+_ID_SEGMENT = re.compile(r"^(?=.*\d)[0-9A-Za-z_-]{12,}$")
+
+# =====================================================
+# 📈 Counter / Histogram (format text Prometheus)
+# =====================================================
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(label, "")) for label in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(str(labels.get(label, "")) for label in self.labels), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # labels -> [contoare per bucket..., sum, count]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(label, "")) for label in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Măsoară blocul; eticheta `status` devine 'error' dacă blocul aruncă excepție."""
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            yield
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            if "status" in self.labels:
+                labels.setdefault("status", status)
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), key + (_num(bound),))} {cumulative}")
+                lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), key + ('+Inf',))} {series[-1]}")
+                lines.append(f"{self.name}_sum{_labels(self.labels, key)} {series[-2]}")
+                lines.append(f"{self.name}_count{_labels(self.labels, key)} {series[-1]}")
+        return lines
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _num(value):
+    return repr(float(value))
+
+
+def render():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def endpoint_label(uri):
+    """'/api/v1/orders/5c35c0…' → '/api/v1/orders/{id}' (etichete cu cardinalitate mică)."""
+    path = uri.split("?", 1)[0]
+    return "/".join("{id}" if _ID_SEGMENT.match(part) else part for part in path.split("/"))
+
+# =====================================================
+# 📊 Metricile botului
+# =====================================================
+KUCOIN_REQUEST_SECONDS = Histogram(
+    "stb_kucoin_request_seconds", "Latența request-urilor REST KuCoin", ("method", "endpoint", "status"))
+KUCOIN_RATE_WAIT_SECONDS = Histogram(
+    "stb_kucoin_rate_wait_seconds", "Timp așteptat în bugetul de rate limit înainte de request", ("priority",))
+KUCOIN_RETRIES = Counter("stb_kucoin_retries_total", "Reîncercări în safe_order", ("action",))
+KUCOIN_FAILURES = Counter("stb_kucoin_failures_total", "Acțiuni KuCoin eșuate după toate reîncercările", ("action",))
+KUCOIN_CIRCUIT_OPENED = Counter("stb_kucoin_circuit_opened_total", "Deschideri ale circuit breaker-ului per endpoint", ("endpoint",))
+KUCOIN_SHORT_CIRCUITS = Counter(
+    "stb_kucoin_short_circuits_total", "Apeluri KuCoin refuzate local cât circuitul era deschis", ("endpoint",))
+KUCOIN_RECOVERED = Counter(
+    "stb_kucoin_recovered_orders_total", "Ordine găsite după clientOid în loc să fie retrimise", ("action",))
+SUPABASE_OP_SECONDS = Histogram(
+    "stb_supabase_op_seconds", "Latența operațiilor Supabase", ("table", "op", "status"))
+CYCLE_SECONDS = Histogram(
+    "stb_cycle_seconds", "SELL plasat → BUY plasat, per ciclu", ("symbol",), CYCLE_BUCKETS)
+SELL_FILL_SECONDS = Histogram(
+    "stb_sell_fill_seconds", "SELL plasat → SELL executat (detectat)", ("symbol",))
+BUY_PLACE_SECONDS = Histogram(
+    "stb_buy_place_seconds", "SELL executat → BUY plasat (drumul critic)", ("symbol",))
+SELL_SLIPPAGE_PERCENT = Histogram(
+    "stb_sell_slippage_percent", "Prețul mediu al SELL-ului market sub best bid-ul de la plasare (%)",
+    ("symbol", "kind"), SLIPPAGE_BUCKETS)
+CYCLES = Counter("stb_cycles_total", "Cicluri STB după rezultat", ("symbol", "result"))
+
+# =====================================================
+# 🌐 Endpoint HTTP /metrics
+# =====================================================
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # fără un rând în log la fiecare scrape
+
+
+def start_metrics_server(port=METRICS_PORT, host=METRICS_HOST):
+    """Pornește (o singură dată per proces) serverul /metrics pe un thread de fundal."""
+    global _server
+    if not port:
+        return None
+    with _server_lock:
+        if _server is not None:
+            return _server
+        try:
+            _server = ThreadingHTTPServer((host, port), _Handler)
+        except OSError as e:
+            logging.warning(f"⚠️ Nu pot porni endpoint-ul de metrici pe {host}:{port}: {e}")
+            return None
+        _server.daemon_threads = True
+        threading.Thread(target=_server.serve_forever, daemon=True).start()
+    logging.info(f"📈 Metrici Prometheus pe http://{host}:{port}/metrics")
+    return _server
@@ -0,0 +1,181 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+# =====================================================
+# ⚙️ Constante
+# =====================================================
+OPEN_STATUSES = ("pending", "open")
+# delta-ul citește și puțin înapoi: scrierile din jurnalul write-behind ajung cu întârziere
+OPEN_ORDERS_SYNC_OVERLAP = int(os.getenv("OPEN_ORDERS_SYNC_OVERLAP", "600"))
+OPEN_ORDERS_RESEED_SECONDS = int(os.getenv("OPEN_ORDERS_RESEED_SECONDS", "86400"))  # reîncărcare completă zilnică
+MIN_SYNC_INTERVAL = 5  # un ordin necunoscut (ex. fill pe stream) forțează un delta, dar nu mai des de atât
+MAX_CLOSED_TRACKED = 50000
+
+_index = None
+_index_lock = threading.Lock()
+
+# =====================================================
+# 🗂️ Index în memorie al ordinelor deschise
+# =====================================================
+class OpenOrderIndex:
+    """
+    Rândurile pending/open din 'orders', după order_id, cu indecși secundari
+    după simbol și cycle_id. Încărcat o singură dată din Supabase, apoi ținut
+    la zi de scrierile procesului (plasări, fill-uri, reconciliere); checker-ul
+    iterează indexul în loc să scaneze tabelul. `sync()` aduce doar rândurile
+    scrise între timp (ex. de alt proces).
+    """
+
+    def __init__(self, strategy="STB"):
+        self.strategy = strategy
+        self._orders = {}
+        self._by_symbol = {}
+        self._by_cycle = {}
+        self._closed = OrderedDict()  # order_id → last_updated la închidere (delta-uri întârziate)
+        self._lock = threading.RLock()
+        self.seeded_at = 0.0
+        self._synced_at = 0.0
+        self._watermark = None
+
+    # -------------------------------------------------
+    # Încărcare din Supabase
+    # -------------------------------------------------
+    def seed(self):
+        from supabase_client import get_open_orders
+
+        rows = get_open_orders(None, self.strategy)
+        with self._lock:
+            self._orders, self._by_symbol, self._by_cycle = {}, {}, {}
+            self._closed.clear()
+            for row in rows:
+                self._add(row)
+            self.seeded_at = self._synced_at = time.time()
+            self._watermark = max((r.get("last_updated") or "" for r in rows), default="") or _now()
+        logging.info(f"🗂️ Index ordine deschise: {len(rows)} ordin(e) încărcate", extra={"status": "seed"})
+        return len(rows)
+
+    def sync(self):
+        """Delta de la ultimul watermark (cu suprapunere); reîncărcare completă dacă e cazul."""
+        if not self.seeded_at or time.time() - self.seeded_at > OPEN_ORDERS_RESEED_SECONDS:
+            return self.seed()
+        from supabase_client import get_orders_updated_since
+
+        since = (_parse_ts(self._watermark) - timedelta(seconds=OPEN_ORDERS_SYNC_OVERLAP)).isoformat()
+        rows = get_orders_updated_since(since, self.strategy)
+        with self._lock:
+            for row in rows:
+                self.apply(row)
+            self._synced_at = time.time()
+            if rows:
+                self._watermark = max(self._watermark, max(r.get("last_updated") or "" for r in rows))
+        return len(rows)
+
+    # -------------------------------------------------
+    # Actualizări din proces
+    # -------------------------------------------------
+    def apply(self, row):
+        """Un rând complet din 'orders': intră / rămâne dacă e deschis, altfel iese din index."""
+        order_id = row.get("order_id")
+        if not order_id or row.get("strategy", self.strategy) != self.strategy:
+            return
+        with self._lock:
+            closed_at = self._closed.get(order_id)
+            if closed_at is not None and str(row.get("last_updated") or "") <= closed_at:
+                return  # rând vechi din DB pentru un ordin deja închis local
+            if row.get("status") in OPEN_STATUSES:
+                self._remove(order_id)
+                self._add(row)
+            else:
+                self._close(order_id, row.get("last_updated"))
+
+    def update(self, order_id, fields):
+        """Câmpurile scrise cu update pe 'orders' (status, preț, last_updated...)."""
+        with self._lock:
+            row = self._orders.get(order_id)
+            if row is None:
+                return
+            if fields.get("status", row.get("status")) in OPEN_STATUSES:
+                row.update(fields)
+            else:
+                self._close(order_id, fields.get("last_updated"))
+
+    # -------------------------------------------------
+    # Citiri pentru checker
+    # -------------------------------------------------
+    def get(self, order_id, refresh=False):
+        """Rândul ordinului deschis; cu `refresh` un ordin necunoscut declanșează un delta (limitat)."""
+        with self._lock:
+            row = self._orders.get(order_id)
+        if row is None and refresh and time.time() - self._synced_at >= MIN_SYNC_INTERVAL:
+            self.sync()
+            with self._lock:
+                row = self._orders.get(order_id)
+        return dict(row) if row else None
+
+    def for_symbol(self, symbol, limit=None):
+        """Ordinele deschise ale simbolului, cele mai vechi (last_updated) primele."""
+        return self.for_symbols([symbol], limit)
+
+    def for_symbols(self, symbols, limit=None):
+        with self._lock:
+            rows = [dict(self._orders[i]) for s in symbols for i in self._by_symbol.get(s, ())]
+        rows.sort(key=lambda r: str(r.get("last_updated") or ""))
+        return rows[:limit] if limit else rows
+
+    def for_cycle(self, cycle_id):
+        with self._lock:
+            return [dict(self._orders[i]) for i in self._by_cycle.get(cycle_id, ())]
+
+    def __len__(self):
+        return len(self._orders)
+
+    # -------------------------------------------------
+    # Intern (apelate cu lock-ul ținut)
+    # -------------------------------------------------
+    def _add(self, row):
+        order_id = row["order_id"]
+        self._orders[order_id] = dict(row)
+        self._by_symbol.setdefault(row.get("symbol"), set()).add(order_id)
+        if row.get("cycle_id"):
+            self._by_cycle.setdefault(row["cycle_id"], set()).add(order_id)
+        self._closed.pop(order_id, None)
+
+    def _remove(self, order_id):
+        row = self._orders.pop(order_id, None)
+        if row is None:
+            return
+        for key, index in ((row.get("symbol"), self._by_symbol), (row.get("cycle_id"), self._by_cycle)):
+            ids = index.get(key)
+            if ids is not None:
+                ids.discard(order_id)
+                if not ids:
+                    del index[key]
+
+    def _close(self, order_id, last_updated=None):
+        self._remove(order_id)
+        self._closed[order_id] = str(last_updated or _now())
+        self._closed.move_to_end(order_id)
+        while len(self._closed) > MAX_CLOSED_TRACKED:
+            self._closed.popitem(last=False)
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _parse_ts(value):
+    return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+
+
+def get_order_index():
+    """Indexul global, încărcat din Supabase la primul apel."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = OpenOrderIndex()
+            _index.seed()
+        return _index
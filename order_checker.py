@@ -1,9 +1,34 @@
+import os
 import time
+import logging
 from datetime import datetime, timezone
 from exchange import init_client, check_order_executed
 from supabase_client import get_latest_settings, supabase, update_execution_time_and_profit
+from order_stream import get_order_stream
+from reconciler import CHECKER_MODE, reconcile_account, group_bots_by_account
+from rate_limit import priority, BACKGROUND
+from metrics import start_metrics_server, METRICS_PORT
+from open_orders import get_order_index
+from cycle_state import cycle_key
+from sharding import shard_score
+from tracing import record_late
+from log_pipeline import setup_logging
+
+setup_logging("order_checker")
+logging.info("🕒 STB Order Checker started... (runs every hour)")
 
-print("🕒 STB Order Checker started... (runs every hour)\n")
+# =====================================================
+# ⚙️ Constante
+# =====================================================
+# partiția acestui checker: "k/n" → verifică doar botii cu hash(bot) % n == k (ex. un checker per nod)
+CHECKER_SHARD = os.getenv("CHECKER_SHARD", "0/1")
+
+# =====================================================
+# 🧩 Partiționare
+# =====================================================
+def in_shard(bot, shard=CHECKER_SHARD):
+    index, count = (int(x) for x in shard.split("/"))
+    return count <= 1 or shard_score(cycle_key(bot), "checker") % count == index
 
 # =====================================================
 # 🧱 Actualizare status în Supabase
@@ -18,31 +43,25 @@ def update_order_status(order_id, new_status, avg_price=None, symbol=None, cycle
         data["price"] = avg_price
 
     supabase.table("orders").update(data).eq("order_id", order_id).execute()
-    print(f"[{symbol}] 🟢 Updated {order_id} → {new_status} @ {avg_price}")
+    get_order_index().update(order_id, data)
+    logging.info(f"[{symbol}] 🟢 Updated {order_id} → {new_status} @ {avg_price}",
+                 extra={"symbol": symbol, "order_id": order_id, "status": new_status, "price": avg_price,
+                        "sample": None if new_status == "executed" else "pending_update"})
 
     # Dacă ordinul e executat complet → actualizează profitul ciclului
     if new_status == "executed" and cycle_id:
+        started = time.time()
         update_execution_time_and_profit(cycle_id)
+        record_late(cycle_id, "profit_update", started, time.time() - started)
 
 # =====================================================
 # 🔍 Verificare ordine vechi (ultimele 5)
 # =====================================================
 def check_old_orders(client, symbol):
     """Verifică ultimele 5 ordine neînchise pentru simbolul dat și strategia STB"""
-    result = (
-        supabase.table("orders")
-        .select("*")
-        .eq("symbol", symbol)
-        .eq("strategy", "STB")  # ✅ doar pentru strategia Sell-Then-Buy
-        .in_("status", ["pending", "open"])
-        .order("last_updated", desc=False)
-        .limit(5)
-        .execute()
-    )
-
-    orders = result.data or []
+    orders = get_order_index().for_symbol(symbol, limit=5)  # ✅ index STB din memorie, fără scanare
     if not orders:
-        print(f"[{symbol}][STB] ✅ Nicio comandă de verificat.")
+        logging.info(f"[{symbol}][STB] ✅ Nicio comandă de verificat.", extra={"symbol": symbol})
         return
 
     for order in orders:
@@ -52,13 +71,34 @@ def check_old_orders(client, symbol):
         if not order_id:
             continue
 
-        done, avg_price = check_order_executed(client, order_id)
+        with priority(BACKGROUND):
+            done, avg_price = check_order_executed(client, order_id)
         if done:
             update_order_status(order_id, "executed", avg_price, symbol, cycle_id)
-            print(f"[{symbol}][STB] ✅ Ordin {side} executat: {order_id} | preț mediu: {avg_price}")
+            logging.info(f"[{symbol}][STB] ✅ Ordin {side} executat: {order_id} | preț mediu: {avg_price}",
+                         extra={"symbol": symbol, "order_id": order_id, "cycle_id": cycle_id, "side": side, "price": avg_price})
         else:
             update_order_status(order_id, "pending", symbol=symbol)
-            print(f"[{symbol}][STB] ⏳ Ordin {side} încă în așteptare: {order_id}")
+            logging.info(f"[{symbol}][STB] ⏳ Ordin {side} încă în așteptare: {order_id}",
+                         extra={"symbol": symbol, "order_id": order_id, "cycle_id": cycle_id, "side": side,
+                                "sample": "pending_status"})
+
+# =====================================================
+# 📡 Fill-uri BUY împinse de order stream
+# =====================================================
+def handle_stream_fill(fill):
+    """Marchează imediat ca executat un BUY raportat done pe stream-ul privat."""
+    if str(fill.get("side")).lower() != "buy":
+        return
+
+    order_id = fill["order_id"]
+    row = get_order_index().get(order_id, refresh=True)  # ordin plasat de worker după ultimul delta → sync
+    if not row:
+        return
+
+    # dacă stream-ul a ratat match-uri păstrăm prețul limit salvat la plasare
+    avg_price = fill["avg_price"] if fill["complete"] and fill["avg_price"] > 0 else None
+    update_order_status(order_id, "executed", avg_price, row.get("symbol"), row.get("cycle_id"))
 
 # =====================================================
 # 🔁 Bucla principală (rulează din oră în oră)
@@ -69,34 +109,45 @@ def run_checker():
         try:
             bots = get_latest_settings()
             if not bots:
-                print("⚠️ Niciun bot activ în settings.")
+                logging.warning("⚠️ Niciun bot activ în settings.")
                 time.sleep(3600)
                 continue
 
-            print(f"\n🔍 [STB] Pornesc verificarea la {datetime.now(timezone.utc).isoformat()}...\n")
-
-            for bot in bots:
-                symbol = bot["symbol"]
-                strategy = bot.get("strategy", "").lower()
-                if strategy != "sell_buy":  # ✅ ignoră botii BTS (buy_sell)
-                    continue
-
-                api_key = bot["api_key"]
-                api_secret = bot["api_secret"]
-                api_passphrase = bot["api_passphrase"]
-
-                client = init_client(api_key, api_secret, api_passphrase)
-                check_old_orders(client, symbol)
-
-            print("\n✅ [STB] Verificarea s-a terminat. Următoarea în 1 oră.\n")
+            logging.info(f"🔍 [STB] Pornesc verificarea la {datetime.now(timezone.utc).isoformat()}...")
+            get_order_index().sync()  # ordinele scrise de worker de la trecerea anterioară
+
+            stb_bots = [b for b in bots if b.get("strategy", "").lower() == "sell_buy"]  # ✅ ignoră botii BTS
+            stb_bots = [b for b in stb_bots if in_shard(b)]  # ✅ doar partiția acestui checker
+
+            for bot in stb_bots:
+                stream = get_order_stream(bot["api_key"], bot["api_secret"], bot["api_passphrase"])
+                if stream:
+                    stream.add_listener(handle_stream_fill)
+
+            if CHECKER_MODE == "reconcile":
+                # O singură trecere pe cont: liste paginate + un upsert în bloc
+                for account in group_bots_by_account(stb_bots):
+                    bot = account["bot"]
+                    try:
+                        client = init_client(bot["api_key"], bot["api_secret"], bot["api_passphrase"])
+                        reconcile_account(client, account["symbols"])
+                    except Exception as e:
+                        logging.error(f"❌ Reconciliere eșuată pentru {sorted(account['symbols'])}: {e}")
+            else:
+                for bot in stb_bots:
+                    client = init_client(bot["api_key"], bot["api_secret"], bot["api_passphrase"])
+                    check_old_orders(client, bot["symbol"])
+
+            logging.info("✅ [STB] Verificarea s-a terminat. Următoarea în 1 oră.")
             time.sleep(3600)
 
         except Exception as e:
-            print("❌ Eroare în STB order_checker:", e)
+            logging.error(f"❌ Eroare în STB order_checker: {e}")
             time.sleep(60)
 
 # =====================================================
 # 🚀 Start
 # =====================================================
 if __name__ == "__main__":
+    start_metrics_server(METRICS_PORT + 1 if METRICS_PORT else 0)  # portul de bază e al worker-ului main.py
     run_checker()
@@ -0,0 +1,288 @@
+import os
+import json
+import time
+import uuid
+import queue
+import random
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+
+try:
+    import websockets
+except ImportError:  # fără websockets rămânem pe polling REST
+    websockets = None
+
+from kucoin.client import WsToken
+from bot_runtime import Signal
+
+# =====================================================
+# ⚙️ Constante
+# =====================================================
+ORDER_STREAM_ENABLED = os.getenv("ORDER_STREAM_ENABLED", "1") != "0"
+ORDER_TOPIC = "/spotMarket/tradeOrdersV2"
+MAX_TRACKED_ORDERS = 5000  # câte ordine ținem în memorie per cont
+RECONNECT_MAX_DELAY = 60
+SUBSCRIBE_ACK_TIMEOUT = 10  # secunde până la confirmarea abonării
+
+_streams = {}
+_streams_lock = threading.Lock()
+
+# =====================================================
+# 📡 Stream privat de ordine (un WebSocket per cont)
+# =====================================================
+class OrderStream:
+    """
+    Ascultă canalul privat KuCoin de schimbări de ordine și împinge
+    evenimentele de fill/done către thread-urile botilor și către checker.
+    """
+
+    def __init__(self, api_key, api_secret, api_passphrase):
+        self.api_key = api_key
+        self._token_api = WsToken(key=api_key, secret=api_secret, passphrase=api_passphrase)
+        self._orders = OrderedDict()
+        self._events = {}
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._dispatch = queue.Queue()
+        self._connected = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    # -------------------------------------------------
+    # Pornire / oprire
+    # -------------------------------------------------
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._thread_main, daemon=True)
+        self._thread.start()
+        threading.Thread(target=self._dispatch_loop, daemon=True).start()
+
+    def start_local(self):
+        """Pornește doar dispatcher-ul; evenimentele vin prin feed(), nu prin WebSocket."""
+        self._connected.set()
+        threading.Thread(target=self._dispatch_loop, daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+        self._dispatch.put(None)
+
+    @property
+    def connected(self):
+        return self._connected.is_set()
+
+    # -------------------------------------------------
+    # API pentru boti și checker
+    # -------------------------------------------------
+    def add_listener(self, callback):
+        """Înregistrează un callback(fill) apelat la fiecare ordin complet executat."""
+        with self._lock:
+            if callback not in self._listeners:
+                self._listeners.append(callback)
+
+    def get_fill(self, order_id):
+        """Returnează fill-ul cunoscut pentru ordin (sau None dacă nu e încă done)."""
+        with self._lock:
+            state = self._orders.get(order_id)
+            return _as_fill(order_id, state) if state and state["done"] else None
+
+    def done_event(self, order_id):
+        """
+        Signal setat când ordinul devine done (deja setat dacă e done). Evenimentul e
+        uitat la done sau la forget(); sunt ținute cel mult MAX_TRACKED_ORDERS.
+        """
+        with self._lock:
+            state = self._orders.get(order_id)
+            if state and state["done"]:
+                event = Signal()
+                event.set()
+                return event
+            event = self._events.get(order_id)
+            if event is None:
+                event = self._events[order_id] = Signal()
+                while len(self._events) > MAX_TRACKED_ORDERS:
+                    self._events.pop(next(iter(self._events)))  # cel mai vechi; așteptarea lui cade pe REST
+            return event
+
+    def wait_done(self, order_id, timeout):
+        """Blochează până la `timeout` secunde așteptând ordinul să fie done."""
+        fill = self.get_fill(order_id)
+        if fill or timeout <= 0:
+            return fill
+        self.done_event(order_id).wait(timeout)
+        return self.get_fill(order_id)
+
+    def forget(self, order_id):
+        with self._lock:
+            self._events.pop(order_id, None)
+
+    # -------------------------------------------------
+    # Procesare mesaje
+    # -------------------------------------------------
+    def feed(self, data):
+        """Injectează un eveniment orderChange (folosit și de exchange-ul fake din benchmark)."""
+        self._handle_order_change(data)
+
+    def _handle_order_change(self, data):
+        order_id = data.get("orderId")
+        if not order_id:
+            return
+
+        with self._lock:
+            state = self._orders.get(order_id)
+            if state is None:
+                state = {"symbol": data.get("symbol"), "side": data.get("side"),
+                         "size": 0.0, "filled": 0.0, "funds": 0.0, "done": False}
+                self._orders[order_id] = state
+                while len(self._orders) > MAX_TRACKED_ORDERS:
+                    old_id, _ = self._orders.popitem(last=False)
+                    self._events.pop(old_id, None)
+
+            state["size"] = float(data.get("size") or state["size"] or 0)
+            if data.get("type") == "match":
+                match_size = float(data.get("matchSize") or 0)
+                state["filled"] += match_size
+                state["funds"] += match_size * float(data.get("matchPrice") or 0)
+            state["reported_filled"] = float(data.get("filledSize") or state["filled"])
+
+            newly_done = data.get("status") == "done" and not state["done"]
+            if newly_done:
+                state["done"] = True
+                state["canceled"] = data.get("type") == "canceled"
+                event = self._events.pop(order_id, None)
+                listeners = list(self._listeners)
+                fill = _as_fill(order_id, state)
+
+        if newly_done:
+            if event:
+                event.set()
+            if not fill["canceled"]:
+                for callback in listeners:
+                    self._dispatch.put((callback, fill))
+
+    def _dispatch_loop(self):
+        """Rulează callback-urile (scrieri în DB) în afara buclei WebSocket."""
+        while True:
+            item = self._dispatch.get()
+            if item is None:
+                return
+            callback, fill = item
+            try:
+                callback(fill)
+            except Exception as e:
+                logging.error(f"❌ Eroare în listener order stream ({fill.get('order_id')}): {e}", extra={"order_id": fill.get("order_id")})
+
+    # -------------------------------------------------
+    # Conexiune WebSocket
+    # -------------------------------------------------
+    def _thread_main(self):
+        asyncio.run(self._run_forever())
+
+    async def _run_forever(self):
+        delay = 1
+        while not self._stopped.is_set():
+            try:
+                await self._session()
+                delay = 1
+            except Exception as e:
+                logging.warning(f"⚠️ Order stream deconectat ({self.api_key[:6]}…): {e}", extra={"account": self.api_key[:6]})
+            self._connected.clear()
+            if self._stopped.is_set():
+                return
+            await asyncio.sleep(delay + random.uniform(0, 1))
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+    async def _session(self):
+        token_data = await asyncio.to_thread(self._token_api.get_ws_token, True)
+        server = token_data["instanceServers"][0]
+        url = f"{server['endpoint']}?token={token_data['token']}&connectId={uuid.uuid4().hex}"
+        ping_interval = server.get("pingInterval", 18000) / 1000
+
+        async with websockets.connect(url, ping_interval=None) as ws:
+            welcome = json.loads(await ws.recv())
+            if welcome.get("type") != "welcome":
+                raise RuntimeError(f"Răspuns neașteptat la conectare: {welcome}")
+
+            subscribe_id = uuid.uuid4().hex
+            await ws.send(json.dumps({
+                "id": subscribe_id,
+                "type": "subscribe",
+                "topic": ORDER_TOPIC,
+                "privateChannel": True,
+                "response": True,
+            }))
+            await self._wait_ack(ws, subscribe_id)
+            self._connected.set()  # abia acum fill-urile sigur ajung pe stream
+            logging.info(f"📡 Order stream conectat ({self.api_key[:6]}…)", extra={"account": self.api_key[:6]})
+
+            last_ping = time.time()
+            while not self._stopped.is_set():
+                timeout = max(0.1, ping_interval - (time.time() - last_ping))
+                try:
+                    raw = await asyncio.wait_for(ws.recv(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    await ws.send(json.dumps({"id": uuid.uuid4().hex, "type": "ping"}))
+                    last_ping = time.time()
+                    continue
+
+                msg = json.loads(raw)
+                if msg.get("type") == "message" and msg.get("topic") == ORDER_TOPIC:
+                    self._handle_order_change(msg.get("data") or {})
+                elif msg.get("type") == "error":
+                    raise RuntimeError(msg.get("data"))
+
+
+    async def _wait_ack(self, ws, subscribe_id):
+        """Așteaptă ack-ul abonării; mesajele sosite între timp sunt procesate normal."""
+        deadline = time.time() + SUBSCRIBE_ACK_TIMEOUT
+        while True:
+            raw = await asyncio.wait_for(ws.recv(), timeout=max(0.1, deadline - time.time()))
+            msg = json.loads(raw)
+            if msg.get("type") == "ack" and msg.get("id") == subscribe_id:
+                return
+            if msg.get("type") == "error":
+                raise RuntimeError(msg.get("data"))
+            if msg.get("type") == "message" and msg.get("topic") == ORDER_TOPIC:
+                self._handle_order_change(msg.get("data") or {})
+
+
+def _as_fill(order_id, state):
+    filled = state["filled"]
+    avg_price = (state["funds"] / filled) if filled > 0 else 0
+    return {
+        "order_id": order_id,
+        "symbol": state["symbol"],
+        "side": state["side"],
+        "size": state["size"],
+        "filled_size": state.get("reported_filled", filled),
+        "avg_price": avg_price,
+        # dacă am ratat match-uri (ex. reconectare) prețul mediu trebuie luat prin REST
+        "complete": abs(filled - state.get("reported_filled", filled)) < 1e-12,
+        "canceled": state.get("canceled", False),
+    }
+
+# =====================================================
+# 🗂️ Registry – un singur stream per API key
+# =====================================================
+def get_order_stream(api_key, api_secret, api_passphrase):
+    """Returnează (și pornește la nevoie) stream-ul privat pentru cont, sau None."""
+    with _streams_lock:
+        if api_key in _streams:
+            return _streams[api_key]
+    if not ORDER_STREAM_ENABLED or websockets is None:
+        return None
+    with _streams_lock:
+        stream = _streams.get(api_key)
+        if stream is None:
+            stream = OrderStream(api_key, api_secret, api_passphrase)
+            _streams[api_key] = stream
+            stream.start()
+        return stream
+
+
+def register_stream(api_key, stream):
+    """Înregistrează un stream alimentat din afară (ex. exchange-ul fake din benchmark)."""
+    with _streams_lock:
+        _streams[api_key] = stream
@@ -0,0 +1,155 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+from metrics import KUCOIN_RATE_WAIT_SECONDS
+
+# =====================================================
+# ⚙️ Constante
+# =====================================================
+# KuCoin Spot: pool de greutate per cont reîncărcat la fiecare 30s (VIP0 = 4000)
+RATE_LIMIT_WEIGHT = int(os.getenv("KUCOIN_RATE_LIMIT_WEIGHT", "4000"))
+RATE_LIMIT_WINDOW = 30
+RATE_LIMIT_SAFETY = 0.8  # folosim doar 80% din pool, restul e marjă
+BACKOFF_ON_429 = 10  # secunde în care contul nu mai trimite nimic după un 429
+
+# Priorități: cu cât mai mic, cu atât mai urgent
+URGENT = 0  # BUY-ul după fill-ul SELL-ului
+NORMAL = 1  # SELL-ul de început de ciclu, verificări pe drumul critic
+BACKGROUND = 2  # checker, reconciliere, listări
+# cât din găleată trebuie să rămână liber pentru prioritățile mai mari
+RESERVE = {URGENT: 0.0, NORMAL: 0.1, BACKGROUND: 0.3}
+PRIORITY_NAMES = {URGENT: "urgent", NORMAL: "normal", BACKGROUND: "background"}
+
+# greutăți aproximative per endpoint (KuCoin docs)
+ENDPOINT_WEIGHTS = {
+    "/api/v1/orders": 2,
+    "/api/v1/orders/multi": 3,
+    "/api/v1/order/client-order": 3,
+    "/api/v1/timestamp": 0,
+}
+DEFAULT_WEIGHT = 2
+
+_budgets = {}
+_budgets_lock = threading.Lock()
+_local = threading.local()
+
+# =====================================================
+# 🪣 Token bucket per cont, cu priorități
+# =====================================================
+class RateBudget:
+    """
+    Găleată de greutate partajată de toate apelurile KuCoin ale unui cont.
+    Apelurile de fundal nu pot consuma rezerva păstrată pentru cele urgente,
+    iar cât timp un apel mai urgent așteaptă, cele mai puțin urgente stau la coadă.
+    """
+
+    def __init__(self, weight=RATE_LIMIT_WEIGHT, window=RATE_LIMIT_WINDOW):
+        self.capacity = weight * RATE_LIMIT_SAFETY
+        self.rate = self.capacity / window
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.waiting = {URGENT: 0, NORMAL: 0, BACKGROUND: 0}
+        self.cond = threading.Condition()
+        self.stats = {"acquired": 0, "waited": 0.0, "throttled": 0}
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return now
+
+    def _can_go(self, weight, priority, now):
+        if now < self.blocked_until:
+            return False
+        if any(self.waiting[p] for p in self.waiting if p < priority):
+            return False
+        return self.tokens - weight >= self.capacity * RESERVE[priority]
+
+    def acquire(self, weight=DEFAULT_WEIGHT, priority=NORMAL):
+        start = time.monotonic()
+        with self.cond:
+            self.waiting[priority] += 1
+            try:
+                while True:
+                    now = self._refill()
+                    if self._can_go(weight, priority, now):
+                        self.tokens -= weight
+                        break
+                    missing = weight + self.capacity * RESERVE[priority] - self.tokens
+                    wait = max(self.blocked_until - now, missing / self.rate, 0.01)
+                    self.cond.wait(min(wait, 1.0))
+            finally:
+                self.waiting[priority] -= 1
+                self.cond.notify_all()
+            waited = time.monotonic() - start
+            self.stats["acquired"] += 1
+            self.stats["waited"] += waited
+        KUCOIN_RATE_WAIT_SECONDS.observe(waited, priority=PRIORITY_NAMES[priority])
+        return waited
+
+    def available(self):
+        """Greutatea disponibilă acum în găleată."""
+        with self.cond:
+            self._refill()
+            return self.tokens
+
+    def throttle(self, seconds=BACKOFF_ON_429):
+        """Exchange-ul a răspuns 429: golim găleata și blocăm contul câteva secunde."""
+        with self.cond:
+            self.tokens = 0
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self.stats["throttled"] += 1
+            self.cond.notify_all()
+
+
+def get_budget(api_key):
+    with _budgets_lock:
+        budget = _budgets.get(api_key)
+        if budget is None:
+            budget = _budgets[api_key] = RateBudget()
+        return budget
+
+
+def endpoint_weight(uri):
+    path = uri.split("?", 1)[0]
+    if path in ENDPOINT_WEIGHTS:
+        return ENDPOINT_WEIGHTS[path]
+    for prefix, weight in ENDPOINT_WEIGHTS.items():
+        if path.startswith(prefix + "/"):
+            return weight
+    return DEFAULT_WEIGHT
+
+# =====================================================
+# 🎚️ Prioritatea apelurilor de pe thread-ul curent
+# =====================================================
+def current_priority():
+    return getattr(_local, "priority", NORMAL)
+
+
+@contextmanager
+def priority(level):
+    """Apelurile KuCoin din acest bloc folosesc prioritatea dată."""
+    previous = current_priority()
+    _local.priority = level
+    try:
+        yield
+    finally:
+        _local.priority = previous
+
+# =====================================================
+# ⏱️ Polling adaptiv: rapid imediat după plasare, apoi tot mai rar
+# =====================================================
+class PollSchedule:
+    """Intervale de verificare 1s, 2s, 4s... plafonate la max_delay."""
+
+    def __init__(self, max_delay, first=1.0, factor=2.0):
+        self.max_delay = max(float(max_delay), 0.1)
+        self.delay = min(first, self.max_delay)
+        self.factor = factor
+
+    def next(self):
+        delay = self.delay
+        self.delay = min(self.delay * self.factor, self.max_delay)
+        return delay
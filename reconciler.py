@@ -0,0 +1,129 @@
+import os
+import logging
+from datetime import datetime, timezone
+from exchange import list_orders, check_order_executed
+from rate_limit import priority, BACKGROUND
+from supabase_client import bulk_update_orders, ORDER_UPDATE_COLUMNS
+from write_behind import pending_keys, persist_update
+from open_orders import get_order_index
+from cycle_ledger import settle_order
+
+# =====================================================
+# ⚙️ Constante
+# =====================================================
+CHECKER_MODE = os.getenv("CHECKER_MODE", "reconcile").lower()  # reconcile | legacy
+FALLBACK_CHECK_LIMIT = 20  # ordine negăsite în liste → verificare individuală, prin rotație
+
+_fallback_cursor = {}
+
+# =====================================================
+# 🧮 Diff între rândul din DB și ordinul de pe exchange
+# =====================================================
+def diff_order(row, order, now=None):
+    """Returnează rândul actualizat dacă ordinul s-a schimbat, altfel None."""
+    if order.get("isActive"):
+        return None  # încă în carte → nimic de scris
+
+    filled = float(order.get("dealSize") or 0)
+    deal_funds = float(order.get("dealFunds") or 0)
+    now = now or datetime.now(timezone.utc).isoformat()
+
+    if filled > 0:
+        updated = dict(row)
+        updated.update({
+            "status": "executed",
+            "price": deal_funds / filled,
+            "filled_size": filled,
+            "last_updated": now,
+        })
+        return updated
+
+    if order.get("cancelExist"):
+        updated = dict(row)
+        updated.update({"status": "canceled", "last_updated": now})
+        return updated
+
+    return None
+
+# =====================================================
+# 🔄 Reconciliere în bloc pentru un cont
+# =====================================================
+def reconcile_account(client, symbols):
+    """
+    Compară toate ordinele active + done recente ale contului cu rândurile
+    pending/open din indexul de ordine deschise și scrie în bloc doar ce s-a schimbat.
+    """
+    index = get_order_index()
+    rows = index.for_symbols(symbols)
+    if not rows:
+        logging.info(f"[STB] ✅ Reconciliere {sorted(symbols)}: niciun ordin deschis.")
+        return {"open": 0, "changed": 0, "unresolved": 0}
+
+    exchange_orders = {}
+    for status in ("active", "done"):
+        for order in list_orders(client, status):
+            exchange_orders[order.get("id")] = order
+
+    now = datetime.now(timezone.utc).isoformat()  # același last_updated → anulările pleacă într-un singur update
+    changed = []
+    unresolved = []
+    for row in rows:
+        order_id = row.get("order_id")
+        if not order_id:
+            continue
+        order = exchange_orders.get(order_id)
+        if order is None:
+            unresolved.append(row)
+            continue
+        updated = diff_order(row, order, now)
+        if updated:
+            changed.append(updated)
+
+    # Ordine mai vechi decât fereastra listelor → verificare individuală, limitată.
+    # Cursorul se rotește ca să nu verificăm mereu aceleași ordine.
+    key = frozenset(symbols)
+    start = _fallback_cursor.get(key, 0) % max(len(unresolved), 1)
+    batch = (unresolved[start:] + unresolved[:start])[:FALLBACK_CHECK_LIMIT]
+    _fallback_cursor[key] = start + len(batch)
+
+    for row in batch:
+        with priority(BACKGROUND):
+            done, avg_price = check_order_executed(client, row["order_id"])
+        if done:
+            updated = dict(row)
+            updated.update({
+                "status": "executed",
+                "price": avg_price,
+                "last_updated": now,
+            })
+            changed.append(updated)
+
+    # Ordinele al căror insert e încă în jurnalul write-behind (salvate de acest
+    # proces) trec prin jurnal, după insert; restul – update-uri grupate pe patch.
+    queued = pending_keys("orders", "order_id", [row["order_id"] for row in changed])
+    for row in changed:
+        if row["order_id"] in queued:
+            patch = {col: row[col] for col in ORDER_UPDATE_COLUMNS if col in row}
+            persist_update("orders", "order_id", row["order_id"], patch)
+    bulk_update_orders([row for row in changed if row["order_id"] not in queued])
+    for row in changed:
+        index.apply(row)
+
+    for row in changed:
+        if row["status"] == "executed" and row.get("cycle_id"):
+            settle_order(row["cycle_id"], row["order_id"], row.get("price"), row.get("filled_size"))
+
+    logging.info(
+        f"[STB] 🔄 Reconciliere {sorted(symbols)}: {len(rows)} deschise, "
+        f"{len(changed)} modificate, {len(unresolved)} în afara ferestrei"
+    )
+    return {"open": len(rows), "changed": len(changed), "unresolved": len(unresolved)}
+
+
+def group_bots_by_account(bots):
+    """Grupează botii după API key → (bot reprezentativ, set de simboluri)."""
+    accounts = {}
+    for bot in bots:
+        entry = accounts.setdefault(bot["api_key"], {"bot": bot, "symbols": set()})
+        entry["symbols"].add(bot["symbol"])
+    return list(accounts.values())
@@ -0,0 +1,122 @@
+import os
+import json
+import time
+import random
+import asyncio
+import hashlib
+import logging
+import threading
+
+try:
+    import websockets
+except ImportError:  # fără websockets rămânem doar pe polling
+    websockets = None
+
+# =====================================================
+# ⚙️ Constante
+# =====================================================
+SETTINGS_POLL_SECONDS = int(os.getenv("SETTINGS_POLL_SECONDS", "60"))
+SETTINGS_REALTIME_ENABLED = os.getenv("SETTINGS_REALTIME_ENABLED", "1") != "0"
+REALTIME_HEARTBEAT_SECONDS = 25
+RECONNECT_MAX_DELAY = 60
+
+# =====================================================
+# 👀 Watcher pentru tabelul 'settings'
+# =====================================================
+class SettingsWatcher:
+    """
+    Urmărește tabelul 'settings' și cheamă apply(bots) doar când setările s-au
+    schimbat. Supabase Realtime (postgres_changes) doar semnalează schimbarea;
+    polling-ul ieftin (număr rânduri + max updated_at) rămâne ca plasă de siguranță.
+    """
+
+    def __init__(self, load_bots, apply, fingerprint=None):
+        self.load_bots = load_bots
+        self.apply = apply
+        self.fingerprint = fingerprint
+        self._poke = threading.Event()
+        self._last_probe = None
+        self._last_content = None
+
+    def start(self):
+        threading.Thread(target=self._poll_loop, daemon=True).start()
+        if SETTINGS_REALTIME_ENABLED and websockets is not None:
+            threading.Thread(target=lambda: asyncio.run(self._realtime_forever()), daemon=True).start()
+
+    def poke(self):
+        """Forțează o verificare imediată (ex. notificare realtime)."""
+        self._poke.set()
+
+    def check(self, force=False):
+        probe = self.fingerprint() if self.fingerprint else None
+        if probe is not None and probe == self._last_probe and not force:
+            return False
+
+        bots = self.load_bots()
+        content = hashlib.sha256(json.dumps(bots, sort_keys=True, default=str).encode()).hexdigest()
+        self._last_probe = probe
+        if content == self._last_content:
+            return False
+        self._last_content = content
+        self.apply(bots)
+        return True
+
+    def _poll_loop(self):
+        while True:
+            poked = self._poke.wait(SETTINGS_POLL_SECONDS)
+            self._poke.clear()
+            try:
+                self.check(force=poked)
+            except Exception as e:
+                logging.error(f"❌ Eroare la verificarea settings: {e}")
+
+    # -------------------------------------------------
+    # Supabase Realtime (protocol Phoenix peste WebSocket)
+    # -------------------------------------------------
+    async def _realtime_forever(self):
+        from supabase_client import SUPABASE_URL, SUPABASE_KEY
+
+        url = (
+            SUPABASE_URL.replace("https://", "wss://").replace("http://", "ws://").rstrip("/")
+            + f"/realtime/v1/websocket?apikey={SUPABASE_KEY}&vsn=1.0.0"
+        )
+        delay = 1
+        while True:
+            try:
+                await self._realtime_session(url, SUPABASE_KEY)
+                delay = 1
+            except Exception as e:
+                logging.warning(f"⚠️ Settings realtime deconectat: {e}")
+            await asyncio.sleep(delay + random.uniform(0, 1))
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+    async def _realtime_session(self, url, key):
+        async with websockets.connect(url, ping_interval=None) as ws:
+            ref = 1
+            await ws.send(json.dumps({
+                "topic": "realtime:stb-settings",
+                "event": "phx_join",
+                "payload": {
+                    "config": {"postgres_changes": [{"event": "*", "schema": "public", "table": "settings"}]},
+                    "access_token": key,
+                },
+                "ref": str(ref),
+            }))
+            logging.info("📡 Settings realtime conectat")
+            self.poke()  # am putut rata schimbări cât am fost deconectați
+
+            last_beat = time.time()
+            while True:
+                timeout = max(0.1, REALTIME_HEARTBEAT_SECONDS - (time.time() - last_beat))
+                try:
+                    msg = json.loads(await asyncio.wait_for(ws.recv(), timeout=timeout))
+                except asyncio.TimeoutError:
+                    ref += 1
+                    await ws.send(json.dumps({"topic": "phoenix", "event": "heartbeat", "payload": {}, "ref": str(ref)}))
+                    last_beat = time.time()
+                    continue
+
+                if msg.get("event") == "postgres_changes":
+                    self.poke()
+                elif msg.get("event") == "phx_reply" and msg.get("payload", {}).get("status") == "error":
+                    raise RuntimeError(msg["payload"].get("response"))
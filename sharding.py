@@ -0,0 +1,358 @@
+import os
+import math
+import atexit
+import time
+import socket
+import hashlib
+import logging
+import threading
+from datetime import datetime, timezone
+
+# =====================================================
+# ⚙️ Constante
+# =====================================================
+SHARDING_ENABLED = os.getenv("SHARDING_ENABLED", "0") == "1"
+# pe Heroku fiecare dyno are DYNO=worker.N; local: host + pid
+WORKER_ID = os.getenv("WORKER_ID") or os.getenv("DYNO") or f"{socket.gethostname()}-{os.getpid()}"
+LEASE_TTL = float(os.getenv("LEASE_TTL", "10"))  # secunde; un worker mort își pierde botii după atât
+LEASE_HEARTBEAT = float(os.getenv("LEASE_HEARTBEAT", "3"))
+LEASE_SAFETY = 2.0  # botul nu mai plasează SELL-uri cu atât înainte de expirarea lease-ului local
+LEASES_TABLE = "bot_leases"  # bot_key PK, worker_id, expires_at, checkpoint (jsonb), updated_at
+WORKERS_TABLE = "stb_workers"  # worker_id PK, last_seen
+KEYS_PER_REQUEST = 100  # chei într-un filtru in_ (lungimea URL-ului PostgREST)
+
+_coordinator = None
+
+# =====================================================
+# 🧮 Preferința worker → bot (rendezvous hashing)
+# =====================================================
+def shard_score(bot, worker):
+    return int.from_bytes(hashlib.sha256(f"{bot}|{worker}".encode()).digest()[:8], "big")
+
+
+def preferred_worker(bot, workers):
+    """Worker-ul „natural” al botului: cel cu scorul maxim; stabil când alți workeri apar/dispar."""
+    return max(workers, key=lambda w: shard_score(bot, w)) if workers else None
+
+
+def _iso(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat()
+
+
+def _chunks(items, size=KEYS_PER_REQUEST):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+# =====================================================
+# 🔐 Lease-uri în Supabase, reînnoite prin heartbeat
+# =====================================================
+class ShardCoordinator:
+    """
+    Împarte botii activi între workeri. Fiecare bot e rulat doar de worker-ul
+    care îi ține lease-ul (rând în 'bot_leases'); lease-urile sunt reînnoite la
+    fiecare heartbeat și preluate de alt worker după LEASE_TTL dacă deținătorul
+    moare. Fiecare worker ține cel mult partea lui (boti / workeri vii), întâi
+    botii pentru care e worker-ul preferat. Surplusul (ex. după apariția unui
+    worker nou) e cedat doar între cicluri: botul e oprit, iar lease-ul e
+    expirat abia după ce botul nu mai are un SELL fără BUY.
+    """
+
+    def __init__(self, worker_id=WORKER_ID, ttl=LEASE_TTL, heartbeat=LEASE_HEARTBEAT, on_change=None, clock=time.time):
+        self.worker_id = worker_id
+        self.ttl = ttl
+        self.heartbeat = heartbeat
+        self.on_change = on_change  # on_change(botii deținuți) → BotSupervisor.apply
+        self.clock = clock
+        self._bots = {}  # bot_key → settings, toți botii activi
+        self._held = {}  # bot_key → expirarea locală a lease-ului
+        self._releasing = {}  # bot_key → momentul în care am început cedarea
+        self._checkpoints = {}  # bot_key → ultimul checkpoint netrimis în lease
+        self._publish = threading.Event()
+        self._publish_lock = threading.Lock()  # un singur flush de checkpoint-uri odată, în ordine
+        self._dirty = True
+        self._lock = threading.RLock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+
+    # -------------------------------------------------
+    # Intrări / ieșiri
+    # -------------------------------------------------
+    def assign(self, bots):
+        """Setul complet de boti activi (din SettingsWatcher); revendicarea are loc imediat."""
+        from cycle_state import cycle_key
+
+        with self._lock:
+            self._bots = {cycle_key(b): b for b in bots}
+            self._dirty = True
+        self._wake.set()
+
+    def owned(self):
+        with self._lock:
+            return [self._bots[k] for k in self._held if k in self._bots and k not in self._releasing]
+
+    def holds(self, key):
+        return key not in self._releasing and self._held.get(key, 0) - LEASE_SAFETY > self.clock()
+
+    def owns_symbol(self, symbol):
+        with self._lock:
+            return any(self._bots[k]["symbol"] == symbol for k in self._held if k in self._bots)
+
+    # -------------------------------------------------
+    # Heartbeat
+    # -------------------------------------------------
+    def start(self):
+        threading.Thread(target=self._loop, daemon=True).start()
+        threading.Thread(target=self._publish_loop, daemon=True).start()
+
+    def stop(self):
+        """Oprire curată: ultimele checkpoint-uri ajung în lease, apoi lease-urile expiră imediat și alt worker preia."""
+        from supabase_client import supabase
+
+        self._stopped.set()
+        self.flush_checkpoints()
+        with self._lock:
+            keys, self._held = list(self._held), {}
+        self._expire(supabase, keys)
+        supabase.table(WORKERS_TABLE).delete().eq("worker_id", self.worker_id).execute()
+
+    def _loop(self):
+        while not self._stopped.is_set():
+            try:
+                self.beat()
+            except Exception as e:
+                logging.warning(f"⚠️ Heartbeat lease-uri eșuat ({self.worker_id}): {e}")
+            self._wake.wait(self.heartbeat)
+            self._wake.clear()
+
+    def beat(self):
+        """O rundă: worker viu, reînnoire, cedarea surplusului, revendicare până la cotă."""
+        from supabase_client import supabase
+
+        # starea e copiată sub lock; request-urile Supabase și citirile din store se fac fără el,
+        # ca publish_checkpoint (apelat din thread-urile de trading) să nu aștepte un heartbeat întreg
+        with self._lock:
+            now = self.clock()
+            bots = dict(self._bots)
+            previous = dict(self._held)
+            releasing = dict(self._releasing)
+            before = set(self.owned_keys())
+            dirty, self._dirty = self._dirty, False
+        try:
+            held, releasing, workers = self._renew(supabase, now, bots, previous, releasing)
+        except Exception:
+            with self._lock:
+                self._dirty = self._dirty or dirty
+            raise
+
+        with self._lock:
+            stopped = self._stopped.is_set()
+            if not stopped:
+                self._held, self._releasing = held, releasing
+                changed = set(self.owned_keys()) != before or dirty
+        if stopped:
+            self._expire(supabase, list(held))  # stop() a rulat în timpul rundei: nu păstrăm ce am revendicat
+            return {}
+
+        if changed:
+            logging.info(f"🔐 {self.worker_id}: {len(self.owned_keys())}/{len(bots)} bot(i) deținuți, {len(workers)} worker(i) vii")
+            if self.on_change:
+                self.on_change(self.owned())
+        return held
+
+    def _renew(self, supabase, now, bots, previous, releasing):
+        """Partea de rețea a unui heartbeat, pe o copie a stării → (held, releasing, workers)."""
+        expires_at = now + self.ttl
+        supabase.table(WORKERS_TABLE).upsert(
+            {"worker_id": self.worker_id, "last_seen": _iso(now)}, on_conflict="worker_id").execute()
+        rows = supabase.table(WORKERS_TABLE).select("worker_id").gte("last_seen", _iso(now - self.ttl)).execute().data or []
+        workers = sorted({r["worker_id"] for r in rows} | {self.worker_id})
+        quota = math.ceil(len(bots) / len(workers)) if bots else 0
+
+        # botii șterși din settings: lease-ul dispare cu totul
+        removed = [k for k in previous if k not in bots]
+        for chunk in _chunks(removed):
+            supabase.table(LEASES_TABLE).delete().in_("bot_key", chunk).eq("worker_id", self.worker_id).execute()
+
+        # cedare: cei opriți de cel puțin un heartbeat și fără ciclu în curs expiră acum
+        handed = [k for k, since in releasing.items()
+                  if k in bots and now - since >= self.heartbeat and not _in_flight(k)]
+        self._expire(supabase, handed)
+        for key in removed + handed:
+            releasing.pop(key, None)
+
+        # reînnoire: doar rândurile încă ale noastre revin din update
+        held = {}
+        keep = [k for k in previous if k in bots and k not in handed]
+        for chunk in _chunks(keep):
+            renewed = (
+                supabase.table(LEASES_TABLE)
+                .update({"expires_at": _iso(expires_at), "updated_at": _iso(now)})
+                .in_("bot_key", chunk)
+                .eq("worker_id", self.worker_id)
+                .execute()
+            ).data or []
+            held.update((r["bot_key"], expires_at) for r in renewed)
+        lost = set(keep) - set(held)
+        if lost:
+            logging.warning(f"⚠️ Lease pierdut pentru {len(lost)} bot(i) ({self.worker_id})")
+        releasing = {k: v for k, v in releasing.items() if k in held}
+
+        # peste cotă → începem cedarea botilor pentru care alt worker e preferat
+        active = [k for k in held if k not in releasing]
+        surplus = len(active) - quota
+        if surplus > 0:
+            active.sort(key=lambda k: (preferred_worker(k, workers) == self.worker_id, shard_score(k, self.worker_id)))
+            for key in active[:surplus]:
+                releasing[key] = now
+            logging.info(f"⚖️ {self.worker_id}: cedez {surplus} bot(i) către ceilalți {len(workers) - 1} worker(i)")
+
+        # sub cotă → revendicare dintre botii fără lease valid, întâi cei pentru care suntem preferați
+        free = []
+        if quota > len(held):
+            taken = supabase.table(LEASES_TABLE).select("bot_key").gte("expires_at", _iso(now)).execute().data or []
+            taken = {r["bot_key"] for r in taken}
+            free = [k for k in bots if k not in held and k not in taken]
+        free.sort(key=lambda k: (preferred_worker(k, workers) != self.worker_id, -shard_score(k, self.worker_id)))
+        wanted = free[:max(0, quota - len(held))]
+        for key, checkpoint in self._claim(supabase, wanted, now, expires_at):
+            held[key] = expires_at
+            if checkpoint:
+                _adopt_checkpoint(key, checkpoint)
+        return held, releasing, workers
+
+    def owned_keys(self):
+        return [k for k in self._held if k not in self._releasing]
+
+    def _expire(self, supabase, keys):
+        """Lease-ul devine imediat revendicabil; rândul (și checkpoint-ul) rămân pentru noul deținător."""
+        for chunk in _chunks(keys):
+            (
+                supabase.table(LEASES_TABLE)
+                .update({"expires_at": _iso(0)})
+                .in_("bot_key", chunk)
+                .eq("worker_id", self.worker_id)
+                .execute()
+            )
+
+    def _claim(self, supabase, keys, now, expires_at):
+        """Lease-uri noi (insert fără suprascriere) + cele expirate ale altor workeri."""
+        lease = {"worker_id": self.worker_id, "expires_at": _iso(expires_at), "updated_at": _iso(now)}
+        claimed = []
+        for chunk in _chunks(keys):
+            inserted = (
+                supabase.table(LEASES_TABLE)
+                .upsert([dict(lease, bot_key=k) for k in chunk], on_conflict="bot_key", ignore_duplicates=True)
+                .execute()
+            ).data or []
+            claimed.extend((r["bot_key"], None) for r in inserted)
+            taken = {r["bot_key"] for r in inserted}
+            rest = [k for k in chunk if k not in taken]
+            if rest:
+                stolen = (
+                    supabase.table(LEASES_TABLE)
+                    .update(lease)
+                    .in_("bot_key", rest)
+                    .lt("expires_at", _iso(now))
+                    .execute()
+                ).data or []
+                claimed.extend((r["bot_key"], r.get("checkpoint")) for r in stolen)
+                if stolen:
+                    logging.info(f"🔁 {self.worker_id}: preluat {len(stolen)} bot(i) cu lease expirat")
+        return claimed
+
+    def publish_checkpoint(self, bot, checkpoint):
+        """
+        Listener pentru CycleStateStore: checkpoint-ul ajunge în lease, pentru o
+        eventuală preluare. Scrierea se face pe thread-ul de publicare (nu pe
+        calea de trading) și doar cât lease-ul e încă al acestui worker.
+        """
+        with self._lock:
+            if bot not in self._held:
+                return
+            self._checkpoints[bot] = checkpoint
+        self._publish.set()
+
+    def _publish_loop(self):
+        while not self._stopped.is_set():
+            self._publish.wait(self.heartbeat)
+            self._publish.clear()
+            self.flush_checkpoints()
+
+    def flush_checkpoints(self):
+        """
+        Trimite checkpoint-urile în așteptare. Update-ul e condiționat de worker_id:
+        un worker care a pierdut lease-ul nu suprascrie checkpoint-ul noului deținător.
+        """
+        from supabase_client import supabase
+
+        with self._publish_lock:
+            with self._lock:
+                pending, self._checkpoints = self._checkpoints, {}
+            for bot, checkpoint in pending.items():
+                try:
+                    updated = (
+                        supabase.table(LEASES_TABLE)
+                        .update({"checkpoint": checkpoint})
+                        .eq("bot_key", bot)
+                        .eq("worker_id", self.worker_id)
+                        .execute()
+                    ).data
+                except Exception as e:
+                    with self._lock:
+                        self._checkpoints.setdefault(bot, checkpoint)  # reîncercat, dacă între timp n-a venit altul mai nou
+                    logging.warning(f"⚠️ Checkpoint netrimis în lease pentru {bot}: {e}")
+                    continue
+                if not updated:
+                    logging.warning(f"⚠️ Checkpoint ignorat pentru {bot}: lease-ul nu mai e al {self.worker_id}")
+
+
+def _in_flight(key):
+    """Botul are un SELL fără BUY (nu poate fi cedat încă)."""
+    from cycle_state import get_cycle_store, SELL_PLACED, SELL_FILLED
+
+    cp = get_cycle_store().get(key)
+    return bool(cp) and cp["state"] in (SELL_PLACED, SELL_FILLED)
+
+
+def _adopt_checkpoint(key, checkpoint):
+    """Ciclul preluat (worker mort sau cedare) intră în store-ul local și e reluat la pornirea botului."""
+    from cycle_state import get_cycle_store
+
+    if get_cycle_store().adopt(key, checkpoint):
+        logging.info(f"♻️ Ciclu preluat pentru {key}: {checkpoint.get('cycle_id')} ({checkpoint.get('state')})")
+
+# =====================================================
+# 🌐 Acces global
+# =====================================================
+def start_sharding(on_change):
+    """Pornește coordonatorul (dacă SHARDING_ENABLED); returnează funcția apply pentru SettingsWatcher."""
+    global _coordinator
+    if not SHARDING_ENABLED:
+        return on_change
+    from cycle_state import get_cycle_store
+
+    _coordinator = ShardCoordinator(on_change=on_change)
+    get_cycle_store().add_listener(_coordinator.publish_checkpoint)
+    _coordinator.start()
+    atexit.register(_coordinator.stop)  # oprire curată → lease-urile sunt preluate imediat, nu după TTL
+    logging.info(f"🔐 Sharding activ: worker {WORKER_ID}, lease {LEASE_TTL}s, heartbeat {LEASE_HEARTBEAT}s")
+    return _coordinator.assign
+
+
+def holds_lease(settings):
+    """Fără sharding procesul deține toți botii."""
+    if _coordinator is None:
+        return True
+    from cycle_state import cycle_key
+
+    return _coordinator.holds(cycle_key(settings))
+
+
+def owned_bots(bots):
+    """Partiția checker-ului: doar botii cu lease în acest worker."""
+    return bots if _coordinator is None else [b for b in bots if holds_lease(b)]
+
+
+def owns_symbol(symbol):
+    return _coordinator is None or _coordinator.owns_symbol(symbol)
@@ -1,8 +1,11 @@
 import os
 import uuid
+import logging
+import threading
 from datetime import datetime, timezone
 from dotenv import load_dotenv
-from supabase import create_client
+from cycle_ledger import compute_cycle_profit
+from metrics import SUPABASE_OP_SECONDS
 
 # =====================================================
 # 🔌 Load environment variables (.env)
@@ -12,14 +15,82 @@ load_dotenv()
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise ValueError("❌ Missing SUPABASE_URL or SUPABASE_KEY. Check your .env file.")
-
 # =====================================================
-# ⚙️ Create Supabase client
+# ⚙️ Supabase client (creat la prima utilizare)
 # =====================================================
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-print(f"✅ Connected to Supabase project: {SUPABASE_URL.split('//')[1].split('.')[0]} (STB)")
+class SupabaseHandle:
+    """
+    Referință stabilă la client: modulele importă `supabase` o dată, clientul
+    din spate e creat abia la primul query (importul rămâne ieftin pentru
+    order_checker, backfill etc.) și poate fi înlocuit cu use().
+    """
+
+    def __init__(self, client=None):
+        self._client = client
+        self._lock = threading.Lock()
+
+    def use(self, client):
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = _connect()
+        return self._client
+
+    def table(self, name):
+        return TimedQuery(self.client.table(name), name)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.client, name)
+
+
+def _connect():
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        raise ValueError("❌ Missing SUPABASE_URL or SUPABASE_KEY. Check your .env file.")
+    from supabase import create_client
+
+    client = create_client(SUPABASE_URL, SUPABASE_KEY)
+    logging.info(f"✅ Connected to Supabase project: {SUPABASE_URL.split('//')[1].split('.')[0]} (STB)")
+    return client
+
+
+class TimedQuery:
+    """Învelește query builder-ul postgrest: execute() e măsurat per (tabel, operație)."""
+
+    OPS = ("select", "insert", "update", "upsert", "delete")
+
+    def __init__(self, builder, table, op="select"):
+        self._builder = builder
+        self._table = table
+        self._op = op
+
+    def __getattr__(self, name):
+        attr = getattr(self._builder, name)
+        if not callable(attr):
+            return attr
+        op = name if name in self.OPS else self._op
+
+        def call(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            return TimedQuery(result, self._table, op) if hasattr(result, "execute") else result
+        return call
+
+    def execute(self):
+        with SUPABASE_OP_SECONDS.time(table=self._table, op=self._op):
+            return self._builder.execute()
+
+
+supabase = SupabaseHandle()
+
+
+def use_client(client):
+    """Înlocuiește clientul Supabase pentru tot procesul (ex. fakes.FakeSupabase în benchmark)."""
+    supabase.use(client)
 
 
 # =====================================================
@@ -31,18 +102,38 @@ def get_latest_settings():
         data = supabase.table("settings").select("*").eq("active", True).execute()
         bots = data.data or []
         bots = [b for b in bots if str(b.get("strategy", "")).upper() in ("SELL_BUY", "STB")]
-        print(f"♻️ Reloaded {len(bots)} active STB setting(s) from Supabase.")
+        logging.info(f"♻️ Reloaded {len(bots)} active STB setting(s) from Supabase.")
         return bots
     except Exception as e:
-        print(f"❌ Error reading latest settings (STB): {e}")
+        logging.error(f"❌ Error reading latest settings (STB): {e}")
         return []
 
 
+def get_settings_fingerprint():
+    """
+    Sondă ieftină pentru schimbări în 'settings': (nr. rânduri active, max updated_at).
+    Returnează None dacă tabelul nu are coloana updated_at.
+    """
+    try:
+        result = (
+            supabase.table("settings")
+            .select("updated_at", count="exact")
+            .eq("active", True)
+            .order("updated_at", desc=True)
+            .limit(1)
+            .execute()
+        )
+    except Exception:
+        return None
+    latest = result.data[0]["updated_at"] if result.data else None
+    return (result.count, latest)
+
+
 # =====================================================
 # 💾 Salvare ordine (strategie SELL → BUY)
 # =====================================================
-def save_order(symbol, side, price, status, extra=None):
-    """Salvează un ordin în tabelul 'orders' pentru strategia SELL → BUY (STB)."""
+def build_order_row(symbol, side, price, status, extra=None):
+    """Construiește rândul pentru tabelul 'orders' (strategia SELL → BUY)."""
     data = {
         "symbol": symbol,
         "side": side,
@@ -60,16 +151,106 @@ def save_order(symbol, side, price, status, extra=None):
     # Extra meta (order_id, cycle_id, etc.)
     if extra:
         data.update(extra)
+    return data
+
 
+def save_order(symbol, side, price, status, extra=None):
+    """Salvează un ordin în tabelul 'orders' pentru strategia SELL → BUY (STB)."""
+    data = build_order_row(symbol, side, price, status, extra)
     supabase.table("orders").insert(data).execute()
-    print(
-        f"[STB][{symbol}] 💾 Saved {side} ({status}) | price={price} | cycle_id={data.get('cycle_id')}"
+    logging.info(
+        f"[STB][{symbol}] 💾 Saved {side} ({status}) | price={price} | cycle_id={data.get('cycle_id')}",
+        extra={"symbol": symbol, "cycle_id": data.get("cycle_id"), "order_id": data.get("order_id"), "side": side},
     )
 
 
+# =====================================================
+# 📋 Ordine deschise (pentru reconciliere în bloc)
+# =====================================================
+OPEN_ORDERS_PAGE_SIZE = 1000
+
+
+def get_open_orders(symbols=None, strategy="STB"):
+    """Returnează toate ordinele pending/open (pentru simbolurile date sau toate), paginat."""
+    rows = []
+    start = 0
+    while True:
+        query = supabase.table("orders").select("*")
+        if symbols is not None:
+            query = query.in_("symbol", list(symbols))
+        result = (
+            query
+            .eq("strategy", strategy)
+            .in_("status", ["pending", "open"])
+            .order("last_updated", desc=False)
+            .range(start, start + OPEN_ORDERS_PAGE_SIZE - 1)
+            .execute()
+        )
+        page = result.data or []
+        rows.extend(page)
+        if len(page) < OPEN_ORDERS_PAGE_SIZE:
+            return rows
+        start += OPEN_ORDERS_PAGE_SIZE
+
+
+def get_existing_order_ids(order_ids):
+    """Care dintre `order_ids` au deja un rând în 'orders' (orice status)."""
+    if not order_ids:
+        return set()
+    rows = supabase.table("orders").select("order_id").in_("order_id", list(order_ids)).execute().data or []
+    return {str(r["order_id"]) for r in rows}
+
+
+def get_orders_updated_since(since, strategy="STB"):
+    """Ordinele (orice status) scrise după `since` (ISO) – delta pentru indexul de ordine deschise."""
+    rows = []
+    start = 0
+    while True:
+        result = (
+            supabase.table("orders")
+            .select("*")
+            .eq("strategy", strategy)
+            .gte("last_updated", since)
+            .order("last_updated", desc=False)
+            .range(start, start + OPEN_ORDERS_PAGE_SIZE - 1)
+            .execute()
+        )
+        page = result.data or []
+        rows.extend(page)
+        if len(page) < OPEN_ORDERS_PAGE_SIZE:
+            return rows
+        start += OPEN_ORDERS_PAGE_SIZE
+
+
+ORDER_UPDATE_COLUMNS = ("status", "price", "filled_size", "last_updated")
+ORDER_UPDATE_CHUNK = 100  # order_id-uri într-un filtru in_ (lungimea URL-ului PostgREST)
+
+
+def bulk_update_orders(rows):
+    """
+    Scrie ordinele modificate ca update-uri pe order_id: doar rânduri existente,
+    fără dependență de o constrângere unică. Rândurile cu același patch (ex. toate
+    anulările din reconcilierea curentă) pleacă într-un singur request cu in_.
+    """
+    if not rows:
+        return
+    groups = {}
+    for row in rows:
+        patch = {col: row[col] for col in ORDER_UPDATE_COLUMNS if col in row}
+        groups.setdefault(tuple(sorted(patch.items())), []).append(row["order_id"])
+    for patch, order_ids in groups.items():
+        for i in range(0, len(order_ids), ORDER_UPDATE_CHUNK):
+            supabase.table("orders").update(dict(patch)).in_("order_id", order_ids[i:i + ORDER_UPDATE_CHUNK]).execute()
+    logging.info(f"[STB] 💾 Bulk update {len(rows)} order(s) în {len(groups)} request(uri)")
+
+
 # =====================================================
 # 💰 Profit per cycle (SELL → BUY, profit în USDT)
 # =====================================================
+# rândurile 'orders' ale botului sunt scrise cu strategy="STB"; "SELL_BUY" la cele mai vechi
+ORDER_STRATEGIES = ("STB", "SELL_BUY")
+
+
 def update_execution_time_and_profit(cycle_id: str):
     """
     Calculează durata și profitul efectiv pentru un ciclu SELL → BUY (STB).
@@ -80,82 +261,22 @@ def update_execution_time_and_profit(cycle_id: str):
             supabase.table("orders")
             .select("side, price, created_at, last_updated, symbol, filled_size, strategy")
             .eq("cycle_id", cycle_id)
-            .eq("strategy", "SELL_BUY")
+            .in_("strategy", list(ORDER_STRATEGIES))
             .eq("status", "executed")
             .execute()
         )
         orders = result.data or []
-        if len(orders) < 2:
-            print(f"[STB] ⚠️ Skipping profit calc: incomplete cycle {cycle_id}")
-            return
-
-        # Separăm SELL / BUY și ignorăm ordinele fără preț
-        sells = [
-            o for o in orders
-            if str(o["side"]).upper() == "SELL" and float(o.get("price") or 0) > 0
-        ]
-        buys = [
-            o for o in orders
-            if str(o["side"]).upper() == "BUY" and float(o.get("price") or 0) > 0
-        ]
-
-        if not sells or not buys:
-            print(f"[STB] ⚠️ Missing SELL/BUY prices for cycle {cycle_id}")
+        row, reason = compute_cycle_profit(cycle_id, orders)
+        if row is None:
+            logging.warning(f"[STB] ⚠️ Skipping profit calc ({reason}) for cycle {cycle_id}", extra={"cycle_id": cycle_id})
             return
 
-        # Entry = primul SELL, Exit = ultimul BUY
-        first_sell = sorted(sells, key=lambda o: o["created_at"])[0]
-        last_buy = sorted(buys, key=lambda o: o["created_at"])[-1]
-
-        symbol = first_sell["symbol"]
-        sell_price = float(first_sell["price"])
-        buy_price = float(last_buy["price"])
-
-        sell_time = datetime.fromisoformat(
-            (first_sell.get("last_updated") or first_sell["created_at"]).replace("Z", "+00:00")
-        )
-        buy_time = datetime.fromisoformat(
-            (last_buy.get("last_updated") or last_buy["created_at"]).replace("Z", "+00:00")
-        )
-
-        sell_qty = float(first_sell.get("filled_size") or 0)
-        buy_qty = float(last_buy.get("filled_size") or 0)
-
-        qty = 0.0
-        if sell_qty > 0 and buy_qty > 0:
-            qty = min(sell_qty, buy_qty)
-        else:
-            qty = max(sell_qty, buy_qty)
-
-        if sell_price <= 0 or buy_price <= 0 or qty <= 0:
-            print(f"[STB] ⚠️ Invalid prices/qty for cycle {cycle_id}")
-            return
+        supabase.table("profit_per_cycle").upsert(row).execute()
 
-        # Profit în USDT – raportat la prețul de SELL (intrare)
-        profit_percent = round(((sell_price - buy_price) / sell_price) * 100, 2)
-        profit_usdt = round((sell_price - buy_price) * qty, 6)
-        profit_coin = 0.0  # pentru STB nu ne interesează COIN
-
-        execution_time = abs(buy_time - sell_time)
-
-        supabase.table("profit_per_cycle").upsert(
-            {
-                "cycle_id": cycle_id,
-                "symbol": symbol,
-                "strategy": "SELL_BUY",
-                "sell_price": sell_price,
-                "buy_price": buy_price,
-                "profit_percent": profit_percent,
-                "profit_usdt": profit_usdt,
-                "profit_coin": profit_coin,
-                "execution_time": str(execution_time),
-                "last_updated": datetime.now(timezone.utc).isoformat(),
-            }
-        ).execute()
-
-        print(
-            f"💰 [STB][{symbol}] cycle {cycle_id} → {profit_percent}% | USDT={profit_usdt}"
+        logging.info(
+            f"💰 [STB][{row['symbol']}] cycle {cycle_id} → {row['profit_percent']}% | USDT={row['profit_usdt']}",
+            extra={"symbol": row["symbol"], "cycle_id": cycle_id},
         )
 
     except Exception as e:
-        print(f"❌ [STB] Error updating profit for {cycle_id}: {e}")
+        logging.error(f"❌ [STB] Error updating profit for {cycle_id}: {e}", extra={"cycle_id": cycle_id})
@@ -0,0 +1,162 @@
+import os
+import time
+import logging
+import threading
+from decimal import Decimal, ROUND_DOWN, ROUND_HALF_UP
+
+# =====================================================
+# ⚙️ Constante
+# =====================================================
+SYMBOLS_TTL = int(os.getenv("SYMBOLS_TTL", "3600"))  # reîncărcarea listei de simboluri (secunde)
+UNKNOWN_RETRY_SECONDS = 60  # un simbol lipsă forțează reîncărcarea, dar nu mai des de atât
+# folosit doar dacă lista nu poate fi încărcată deloc (tick-ul HONEY-USDT, ca înainte)
+DEFAULT_PRICE_INCREMENT = Decimal("0.00001")
+
+# =====================================================
+# 📏 Metadatele unui simbol
+# =====================================================
+class SymbolInfo:
+    __slots__ = ("symbol", "price_increment", "base_increment", "base_min_size", "min_funds", "enable_trading")
+
+    def __init__(self, symbol, price_increment, base_increment, base_min_size=0, min_funds=0, enable_trading=True):
+        self.symbol = symbol
+        self.price_increment = Decimal(str(price_increment))
+        self.base_increment = Decimal(str(base_increment))
+        self.base_min_size = Decimal(str(base_min_size or 0))
+        self.min_funds = Decimal(str(min_funds or 0))
+        self.enable_trading = bool(enable_trading)
+
+    @classmethod
+    def from_exchange(cls, item):
+        return cls(
+            item["symbol"],
+            item["priceIncrement"],
+            item["baseIncrement"],
+            item.get("baseMinSize"),
+            item.get("minFunds"),
+            item.get("enableTrading", True),
+        )
+
+    def __repr__(self):
+        return f"SymbolInfo({self.symbol}, tick={self.price_increment}, lot={self.base_increment}, minFunds={self.min_funds})"
+
+# =====================================================
+# 🗂️ Cache partajat de toți botii (TTL)
+# =====================================================
+def _load_from_kucoin():
+    from kucoin.client import Market
+
+    return Market().get_symbol_list_v2()
+
+
+class SymbolCache:
+    """
+    Lista de simboluri KuCoin încărcată o dată și reîncărcată după TTL. Dacă
+    reîncărcarea eșuează rămânem pe datele vechi; un simbol necunoscut forțează
+    o reîncărcare (limitată), apoi se folosesc incrementele implicite.
+    """
+
+    def __init__(self, loader=_load_from_kucoin, ttl=SYMBOLS_TTL):
+        self.loader = loader
+        self.ttl = ttl
+        self._symbols = {}
+        self._loaded_at = 0.0
+        self._attempted_at = 0.0
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        with self._lock:
+            return self._load()
+
+    def get(self, symbol):
+        if self._needs_refresh(symbol):
+            with self._lock:
+                if self._needs_refresh(symbol):  # alt thread tocmai a reîncărcat
+                    self._load()
+        return self._symbols.get(symbol)
+
+    def _needs_refresh(self, symbol):
+        now = time.time()
+        if now - self._attempted_at < UNKNOWN_RETRY_SECONDS:
+            return False
+        return now - self._loaded_at > self.ttl or symbol not in self._symbols
+
+    def _load(self):
+        self._attempted_at = time.time()
+        try:
+            items = self.loader() or []
+        except Exception as e:
+            logging.warning(f"⚠️ Nu am putut încărca lista de simboluri KuCoin: {e}")
+            return False
+        symbols = {}
+        for item in items:
+            try:
+                info = SymbolInfo.from_exchange(item)
+            except (KeyError, ArithmeticError, ValueError):
+                continue
+            symbols[info.symbol] = info
+        self._symbols = symbols
+        self._loaded_at = time.time()
+        logging.info(f"📏 Metadate simboluri încărcate: {len(symbols)}")
+        return True
+
+
+_cache = SymbolCache()
+
+
+def use_loader(loader):
+    """Înlocuiește sursa listei de simboluri (ex. exchange-ul fake din benchmark) și golește cache-ul."""
+    global _cache
+    _cache = SymbolCache(loader)
+
+
+def get_symbol_info(symbol):
+    return _cache.get(symbol)
+
+
+def preload_symbols():
+    return _cache.refresh()
+
+# =====================================================
+# 🧮 Rotunjire exactă (Decimal) și validare
+# =====================================================
+def _quantize(value, step, rounding):
+    value = Decimal(str(value))
+    if step <= 0:
+        return value
+    return ((value / step).to_integral_value(rounding=rounding) * step).quantize(step)
+
+
+def round_price(symbol, price):
+    """Prețul rotunjit la cel mai apropiat priceIncrement al simbolului."""
+    info = get_symbol_info(symbol)
+    step = info.price_increment if info else DEFAULT_PRICE_INCREMENT
+    return _quantize(price, step, ROUND_HALF_UP)
+
+
+def round_size(symbol, size):
+    """Cantitatea rotunjită în jos la baseIncrement (nu vindem/cumpărăm mai mult decât s-a cerut)."""
+    info = get_symbol_info(symbol)
+    if info is None:
+        return Decimal(str(size))  # fără metadate trimitem cantitatea din settings neschimbată
+    return _quantize(size, info.base_increment, ROUND_DOWN)
+
+
+def order_problem(symbol, size, price=None):
+    """Motivul pentru care exchange-ul ar respinge ordinul, sau None dacă e valid."""
+    info = get_symbol_info(symbol)
+    if info is None:
+        return None  # fără metadate lăsăm exchange-ul să decidă
+    size = Decimal(str(size))
+    if not info.enable_trading:
+        return "trading dezactivat pentru simbol"
+    if size <= 0 or size < info.base_min_size:
+        return f"cantitate {size} < baseMinSize {info.base_min_size}"
+    if price is not None and size * Decimal(str(price)) < info.min_funds:
+        return f"valoare {size * Decimal(str(price))} < minFunds {info.min_funds}"
+    return None
+
+
+def fmt(value):
+    """Decimal → string fără notație exponențială, cum îl așteaptă API-ul."""
+    return format(Decimal(value).normalize(), "f")
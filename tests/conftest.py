@@ -0,0 +1,30 @@
+import os
+import sys
+
+import pytest
+
+# modulele botului sunt la rădăcina repo-ului (fără pachet)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fakes import FakeSupabase  # noqa: E402
+
+
+@pytest.fixture
+def fake_db():
+    """Supabase în memorie, injectat în supabase_client pe durata testului."""
+    import supabase_client
+
+    db = FakeSupabase()
+    supabase_client.use_client(db)
+    yield db
+    supabase_client.use_client(None)
+
+
+@pytest.fixture
+def cycle_store(tmp_path, monkeypatch):
+    """CycleStateStore izolat, folosit și ca store global (get_cycle_store)."""
+    import cycle_state
+
+    store = cycle_state.CycleStateStore(str(tmp_path / "cycle_state.db"))
+    monkeypatch.setattr(cycle_state, "_store", store)
+    return store
@@ -0,0 +1,81 @@
+import pytest
+
+import cycle_ledger
+from cycle_ledger import CycleLedger, compute_cycle_profit
+
+
+def _order(side, price, filled_size, created_at, symbol="HONEY-USDT"):
+    return {"symbol": symbol, "side": side, "price": price, "filled_size": filled_size,
+            "created_at": created_at, "last_updated": created_at}
+
+
+def test_profit_uses_weighted_average_of_buy_ladder():
+    orders = [
+        _order("SELL", 1.0, 100, "2024-01-01T00:00:00+00:00"),
+        _order("BUY", 0.98, 25, "2024-01-01T00:01:00+00:00"),
+        _order("BUY", 0.96, 75, "2024-01-01T00:03:00+00:00"),
+    ]
+    row, reason = compute_cycle_profit("c1", orders)
+    assert reason is None
+    assert row["buy_price"] == pytest.approx(0.965)
+    assert row["profit_usdt"] == pytest.approx(3.5)
+    assert row["profit_percent"] == 3.5
+    assert row["execution_time"] == "0:03:00"
+
+
+@pytest.mark.parametrize("orders, reason", [
+    ([_order("SELL", 1.0, 1, "2024-01-01T00:00:00Z")], "incomplete cycle"),
+    ([_order("SELL", 1.0, 1, "2024-01-01T00:00:00Z"), _order("BUY", 0, 1, "2024-01-01T00:01:00Z")],
+     "missing SELL/BUY prices"),
+])
+def test_incomplete_cycles_have_no_profit(orders, reason):
+    assert compute_cycle_profit("c1", orders) == (None, reason)
+
+
+def test_ledger_returns_row_once_sell_and_buy_are_executed():
+    ledger = CycleLedger()
+    ledger.record_order("c1", "s1", "HONEY-USDT", "SELL", 1.0, "active", filled_size=10)
+    ledger.record_order("c1", "b1", "HONEY-USDT", "BUY", 0.9, "active")
+    ledger.record_order("c1", "b2", "HONEY-USDT", "BUY", 0.8, "active")
+
+    assert ledger.record_fill("c1", "s1") is None
+    row = ledger.record_fill("c1", "b1", avg_price=0.9, filled_size=10)
+    assert row["buy_price"] == pytest.approx(0.9)
+    assert ledger.knows("c1")  # b2 încă activ
+
+    row = ledger.record_fill("c1", "b2", avg_price=0.8, filled_size=10)
+    assert row["buy_price"] == pytest.approx(0.85)
+    assert not ledger.knows("c1")
+
+
+def test_ledger_evicts_oldest_cycles():
+    ledger = CycleLedger(max_cycles=2)
+    for cycle_id in ("c1", "c2", "c3"):
+        ledger.record_order(cycle_id, f"s-{cycle_id}", "HONEY-USDT", "SELL", 1.0, "active")
+    assert not ledger.knows("c1")
+    assert ledger.record_fill("c1", "s-c1") is None
+    assert ledger.knows("c3")
+
+
+@pytest.fixture
+def settled(monkeypatch, cycle_store):
+    writes = []
+    monkeypatch.setattr(cycle_ledger, "ledger", CycleLedger())
+    monkeypatch.setattr(cycle_ledger, "persist_upsert", lambda table, row: writes.append((table, row["cycle_id"])))
+    monkeypatch.setattr(cycle_ledger, "persist_call", lambda name, *args: writes.append((name, *args)))
+    return writes
+
+
+def test_settle_order_writes_profit_from_ledger(settled):
+    cycle_ledger.ledger.record_order("c1", "s1", "HONEY-USDT", "SELL", 1.0, "active", filled_size=5)
+    cycle_ledger.ledger.record_order("c1", "b1", "HONEY-USDT", "BUY", 0.9, "active")
+    cycle_ledger.settle_order("c1", "s1")
+    assert settled == []
+    cycle_ledger.settle_order("c1", "b1", avg_price=0.9, filled_size=5)
+    assert settled == [("profit_per_cycle", "c1")]
+
+
+def test_settle_order_falls_back_to_db_for_unknown_cycles(settled):
+    cycle_ledger.settle_order("old-cycle", "b1")
+    cycle_ledger.settle_order(None, "b2")
+    assert settled == [("profit", "old-cycle")]
@@ -0,0 +1,67 @@
+import threading
+
+from cycle_state import BUY_FILLED, BUY_PLACED, SELL_FILLED, SELL_PLACED, CycleStateStore, cycle_key
+
+
+def test_save_keeps_fields_until_a_new_cycle_starts(cycle_store):
+    cycle_store.save("bot", SELL_PLACED, cycle_id="c1", sell_id="s1")
+    cycle_store.save("bot", SELL_FILLED, sell_price=1.5)
+    assert cycle_store.get("bot")["sell_id"] == "s1"
+    assert cycle_store.get("bot")["sell_price"] == 1.5
+
+    cycle_store.save("bot", SELL_PLACED, cycle_id="c2", sell_id="s2")
+    assert "sell_price" not in cycle_store.get("bot")
+    assert cycle_store.cycles_of("bot") == {"c1", "c2"}
+
+
+def test_snapshot_survives_restart(tmp_path):
+    path = str(tmp_path / "cycles.db")
+    store = CycleStateStore(path)
+    store.save("a", SELL_PLACED, cycle_id="c1", sell_id="s1")
+    store.save("b", SELL_PLACED, cycle_id="c2", sell_id="s2")
+    store.save("b", BUY_PLACED, buy_id="b2")
+
+    reopened = CycleStateStore(path)
+    assert [cp["cycle_id"] for cp in reopened.in_flight()] == ["c1"]
+    assert reopened.checkpoint_of("b2")["cycle_id"] == "c2"
+    assert reopened.cycles_of("b") == {"c2"}
+
+
+def test_ladder_is_filled_only_after_the_last_leg(cycle_store):
+    cycle_store.save("bot", SELL_PLACED, cycle_id="c1", sell_id="s1")
+    cycle_store.save("bot", BUY_PLACED, buy_id="b1", buy_ids=["b1", "b2"])
+    assert cycle_store.mark_order_filled("b1")
+    assert cycle_store.get("bot")["state"] == BUY_PLACED
+    assert cycle_store.mark_order_filled("b2")
+    assert cycle_store.get("bot")["state"] == BUY_FILLED
+    assert not cycle_store.mark_order_filled("unknown")
+
+
+def test_adopt_only_accepts_newer_checkpoints(cycle_store):
+    cycle_store.save("bot", SELL_PLACED, cycle_id="c2", sell_id="s2")
+    assert not cycle_store.adopt("bot", {"cycle_id": "c1", "state": BUY_PLACED, "updated_at": 1})
+    newer = cycle_store.get("bot")["updated_at"] + 1
+    assert cycle_store.adopt("bot", {"cycle_id": "c3", "state": BUY_PLACED, "updated_at": newer})
+    assert cycle_store.get("bot")["cycle_id"] == "c3"
+
+
+def test_listeners_run_outside_the_store_lock(cycle_store):
+    seen = []
+
+    def listener(bot, cp):
+        # alt thread trebuie să poată citi store-ul cât timp listener-ul rulează
+        reader = threading.Thread(target=lambda: seen.append((cycle_store.get(bot) or {}).get("state")))
+        reader.start()
+        reader.join(timeout=2)
+        assert not reader.is_alive()
+
+    cycle_store.add_listener(listener)
+    cycle_store.save("bot", SELL_PLACED, cycle_id="c1")
+    cycle_store.clear("bot")
+    assert seen == [SELL_PLACED, None]
+
+
+def test_cycle_key_separates_accounts():
+    a = cycle_key({"id": 1, "symbol": "X-USDT", "api_key": "key-a"})
+    b = cycle_key({"id": 1, "symbol": "X-USDT", "api_key": "key-b"})
+    assert a != b and a.startswith("1:X-USDT:")
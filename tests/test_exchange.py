@@ -0,0 +1,63 @@
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+import circuit_breaker
+import exchange
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(circuit_breaker, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def test_client_oid_is_deterministic_and_short():
+    assert exchange.client_oid("abc-123", "b0") == exchange.client_oid("abc-123", "b0") == "abc123-b0"
+    long_oid = exchange.client_oid("x" * 64, "s")
+    assert len(long_oid) <= 40
+    assert long_oid == exchange.client_oid("x" * 64, "s") != exchange.client_oid("y" * 64, "s")
+    assert exchange.client_oid("ciclu/1", "b1").endswith("-b1")
+
+
+def test_breaker_opens_after_consecutive_outages(clock):
+    breaker = CircuitBreaker("test", failures=3, open_seconds=10)
+    for _ in range(2):
+        breaker.failure(requests.Timeout())
+    assert breaker.state == CLOSED
+    breaker.failure(Exception("503-Service Unavailable"))
+    assert breaker.state == OPEN and not breaker.allow()
+
+    clock[0] += 10
+    assert breaker.allow()  # o singură probă
+    assert breaker.state == HALF_OPEN and not breaker.allow()
+    breaker.failure(requests.ConnectionError())
+    assert breaker.state == OPEN
+    clock[0] += 10
+    assert not breaker.allow()  # perioada s-a dublat
+    clock[0] += 10
+    assert breaker.allow()
+    breaker.success()
+    assert breaker.state == CLOSED and breaker.allow()
+
+
+def test_business_errors_do_not_open_breaker():
+    breaker = CircuitBreaker("test", failures=1)
+    breaker.failure(Exception("400-Balance insufficient"))
+    assert breaker.state == CLOSED
+
+
+def test_safe_order_recovers_instead_of_resending(monkeypatch):
+    monkeypatch.setattr(circuit_breaker, "_breakers", {})
+    sent = []
+
+    def action():
+        sent.append(1)
+        raise requests.Timeout("accepted, but the reply was lost")
+
+    result = exchange.safe_order(action, delay=0, endpoint="POST /test", recover=lambda: "order-1" if sent else None)
+    assert result == "order-1"
+    assert len(sent) == 1
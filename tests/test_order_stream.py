@@ -0,0 +1,60 @@
+import asyncio
+import json
+
+import pytest
+
+import order_stream
+from order_stream import OrderStream
+
+
+@pytest.fixture
+def stream():
+    stream = OrderStream("key", "secret", "pass")
+    stream.start_local()
+    yield stream
+    stream.stop()
+
+
+def change(order_id, status, **fields):
+    return {"orderId": order_id, "symbol": "X-USDT", "side": "buy", "status": status, "type": "open", **fields}
+
+
+def test_done_event_is_released_when_the_order_fills(stream):
+    event = stream.done_event("o1")
+    stream.feed(change("o1", "open", size="10"))
+    assert not event.is_set()
+    stream.feed(change("o1", "done", type="match", matchSize="10", matchPrice="1.5", filledSize="10"))
+    assert event.is_set()
+    assert stream._events == {}
+    assert stream.done_event("o1").is_set()  # deja done: semnal setat, nimic reținut
+    assert stream._events == {}
+    assert stream.get_fill("o1")["avg_price"] == 1.5
+
+
+def test_waiting_events_are_bounded(stream, monkeypatch):
+    monkeypatch.setattr(order_stream, "MAX_TRACKED_ORDERS", 3)
+    for i in range(10):
+        stream.done_event(f"o{i}")
+    assert list(stream._events) == ["o7", "o8", "o9"]
+    stream.forget("o9")
+    assert list(stream._events) == ["o7", "o8"]
+
+
+class FakeSocket:
+    def __init__(self, messages):
+        self.messages = [json.dumps(m) for m in messages]
+
+    async def recv(self):
+        return self.messages.pop(0)
+
+
+def test_subscription_counts_as_connected_only_after_ack():
+    stream = OrderStream("key", "secret", "pass")
+    fill = change("o1", "done", type="match", matchSize="1", matchPrice="2", filledSize="1")
+    ws = FakeSocket([{"type": "message", "topic": order_stream.ORDER_TOPIC, "data": fill},
+                     {"type": "ack", "id": "sub"}])
+    asyncio.run(stream._wait_ack(ws, "sub"))
+    assert stream.get_fill("o1") is not None  # mesajele dinaintea ack-ului nu se pierd
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(stream._wait_ack(FakeSocket([{"type": "error", "data": "bad token"}]), "sub"))
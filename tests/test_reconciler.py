@@ -0,0 +1,60 @@
+import time
+
+import pytest
+
+import open_orders
+import reconciler
+import write_behind
+from fakes import FakeExchange
+
+
+@pytest.fixture
+def exchange():
+    exchange = FakeExchange(latency_ms=0, jitter_ms=0, seed=1)
+    yield exchange
+    exchange.stop()
+
+
+@pytest.fixture
+def index(fake_db, monkeypatch):
+    monkeypatch.setattr(write_behind, "WRITE_BEHIND_ENABLED", False)
+    index = open_orders.OpenOrderIndex()
+    monkeypatch.setattr(open_orders, "_index", index)
+    monkeypatch.setattr(reconciler, "get_order_index", lambda: index)
+    return index
+
+
+def place(exchange, fake_db, index, price, row_in_db=True):
+    """Un BUY ca cel salvat de bot: rândul din index nu are cheia primară `id`."""
+    order_id = exchange.place("key", "X-USDT", "buy", "limit", 10, price)
+    row = {"order_id": order_id, "symbol": "X-USDT", "side": "BUY", "price": price, "status": "open",
+           "strategy": "STB", "cycle_id": f"cycle-{order_id}", "last_updated": "2026-01-01T00:00:00+00:00"}
+    if row_in_db:
+        fake_db.seed("orders", [row])
+    index.apply(dict(row))
+    return order_id
+
+
+def test_filled_and_canceled_orders_update_existing_rows(exchange, fake_db, index):
+    filled = place(exchange, fake_db, index, 10.0)  # peste piață → executat imediat
+    canceled = [place(exchange, fake_db, index, 0.0001) for _ in range(3)]
+    for order_id in canceled:
+        exchange.client("key").cancel_order(order_id)
+    time.sleep(exchange.tick * 5)
+
+    result = reconciler.reconcile_account(exchange.client("key"), {"X-USDT"})
+
+    rows = {r["order_id"]: r for r in fake_db.tables["orders"]}
+    assert len(fake_db.tables["orders"]) == 4  # niciun rând duplicat
+    assert rows[filled]["status"] == "executed" and rows[filled]["filled_size"] == 10
+    assert all(rows[o]["status"] == "canceled" for o in canceled)
+    assert result["changed"] == 4
+    assert fake_db.counts["update orders"] == 2  # un update pentru fill, unul pentru toate anulările
+    assert index.for_symbol("X-USDT") == []
+
+
+def test_order_missing_from_db_is_not_inserted_as_orphan(exchange, fake_db, index):
+    place(exchange, fake_db, index, 10.0, row_in_db=False)
+    time.sleep(exchange.tick * 5)
+    reconciler.reconcile_account(exchange.client("key"), {"X-USDT"})
+    assert fake_db.tables["orders"] == []
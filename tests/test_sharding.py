@@ -0,0 +1,114 @@
+import threading
+import time
+
+import sharding
+from cycle_state import BUY_PLACED, SELL_PLACED, cycle_key
+
+
+def make_bots(n):
+    return [{"id": i, "symbol": f"S{i}-USDT", "api_key": "key", "strategy": "SELL_BUY"} for i in range(n)]
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_preferred_worker_is_stable_when_another_worker_joins():
+    bots = [cycle_key(b) for b in make_bots(200)]
+    before = {b: sharding.preferred_worker(b, ["w1", "w2"]) for b in bots}
+    after = {b: sharding.preferred_worker(b, ["w1", "w2", "w3"]) for b in bots}
+    moved = [b for b in bots if before[b] != after[b]]
+    assert all(after[b] == "w3" for b in moved)  # doar spre noul worker
+    assert 0 < len(moved) < len(bots) / 2
+
+
+def test_workers_split_bots_and_take_over_a_stopped_worker(fake_db, cycle_store):
+    clock = Clock()
+    bots = make_bots(6)
+    a = sharding.ShardCoordinator("A", clock=clock)
+    b = sharding.ShardCoordinator("B", clock=clock)
+    a.assign(bots)
+    b.assign(bots)
+    a.beat()
+    b.beat()
+    a.beat()  # A vede workerul B și începe cedarea surplusului
+    clock.now += a.heartbeat
+    a.beat()
+    b.beat()
+    assert len(a.owned_keys()) == 3 and len(b.owned_keys()) == 3
+    assert not set(a.owned_keys()) & set(b.owned_keys())
+
+    a.stop()
+    b.beat()
+    assert len(b.owned_keys()) == 6
+
+
+def test_checkpoint_reaches_lease_before_stop_and_is_adopted(fake_db, cycle_store):
+    bots = make_bots(1)
+    key = cycle_key(bots[0])
+    a = sharding.ShardCoordinator("A", clock=Clock())
+    a.assign(bots)
+    a.beat()
+    cycle_store.add_listener(a.publish_checkpoint)
+    cycle_store.save(key, SELL_PLACED, cycle_id="c1", sell_id="s1")
+    a.stop()  # fără flush explicit: stop() trimite checkpoint-ul înainte să expire lease-ul
+
+    lease = fake_db.tables["bot_leases"][0]
+    assert lease["checkpoint"]["cycle_id"] == "c1"
+    cycle_store.clear(key)
+    b = sharding.ShardCoordinator("B", clock=Clock())
+    b.assign(bots)
+    b.beat()
+    assert cycle_store.get(key)["state"] == SELL_PLACED
+
+
+def test_worker_that_lost_the_lease_cannot_overwrite_checkpoint(fake_db, cycle_store):
+    bots = make_bots(1)
+    key = cycle_key(bots[0])
+    fake_db.seed("bot_leases", [{"bot_key": key, "worker_id": "B", "expires_at": sharding._iso(5000),
+                                 "checkpoint": {"cycle_id": "new", "state": SELL_PLACED}}])
+    a = sharding.ShardCoordinator("A", clock=Clock())
+    a._held[key] = 5000.0  # A încă crede că deține botul
+    a.publish_checkpoint(key, {"cycle_id": "old", "state": BUY_PLACED})
+    a.flush_checkpoints()
+    assert fake_db.tables["bot_leases"][0]["checkpoint"]["cycle_id"] == "new"
+
+
+def test_heartbeat_and_checkpoint_saves_do_not_deadlock(fake_db, cycle_store):
+    """beat() citește store-ul, iar store.save() notifică coordonatorul: ordinea lock-urilor nu trebuie să se inverseze."""
+    bots = make_bots(2)
+    held_key, stolen_key = cycle_key(bots[0]), cycle_key(bots[1])
+    coordinator = sharding.ShardCoordinator("A", clock=Clock())
+    coordinator.assign(bots[:1])
+    coordinator.beat()
+    cycle_store.add_listener(coordinator.publish_checkpoint)
+    # un lease expirat cu checkpoint → beat() îl preia și îl scrie în store
+    fake_db.seed("bot_leases", [{"bot_key": stolen_key, "worker_id": "dead", "expires_at": sharding._iso(0),
+                                 "checkpoint": {"cycle_id": "c0", "state": BUY_PLACED, "updated_at": 1}}])
+    coordinator.assign(bots)
+    fake_db.latency_ms = 50
+
+    stop = threading.Event()
+
+    def heartbeat():
+        coordinator.beat()
+        stop.set()
+
+    def trading():
+        i = 0
+        while not stop.is_set():
+            i += 1
+            cycle_store.save(held_key, SELL_PLACED, cycle_id=f"c{i}")
+            time.sleep(0.001)
+
+    threads = [threading.Thread(target=heartbeat, daemon=True), threading.Thread(target=trading, daemon=True)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=10)
+    assert not any(t.is_alive() for t in threads)
+    assert cycle_store.get(stolen_key)["cycle_id"] == "c0"
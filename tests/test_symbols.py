@@ -0,0 +1,79 @@
+from decimal import Decimal
+
+import pytest
+
+import symbols
+from symbols import SymbolCache, fmt, order_problem, round_price, round_size
+
+ITEMS = [
+    {"symbol": "HONEY-USDT", "priceIncrement": "0.0001", "baseIncrement": "0.01",
+     "baseMinSize": "1", "minFunds": "0.1", "enableTrading": True},
+    {"symbol": "OFF-USDT", "priceIncrement": "0.1", "baseIncrement": "1", "enableTrading": False},
+    {"symbol": "BROKEN-USDT", "priceIncrement": "x"},  # fără baseIncrement: ignorat
+]
+
+
+@pytest.fixture(autouse=True)
+def loaded(monkeypatch):
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return ITEMS
+
+    monkeypatch.setattr(symbols, "_cache", SymbolCache(loader))
+    return calls
+
+
+def test_price_rounds_half_up_to_tick():
+    assert round_price("HONEY-USDT", 0.12345) == Decimal("0.1235")
+    assert round_price("HONEY-USDT", "0.12344") == Decimal("0.1234")
+
+
+def test_size_rounds_down_to_lot():
+    assert round_size("HONEY-USDT", 10.999) == Decimal("10.99")
+    assert round_size("UNKNOWN-USDT", 10.999) == Decimal("10.999")
+
+
+def test_unknown_symbol_uses_default_tick():
+    assert round_price("UNKNOWN-USDT", 0.123456) == Decimal("0.12346")
+    assert order_problem("UNKNOWN-USDT", 0) is None
+
+
+def test_order_problem():
+    assert order_problem("HONEY-USDT", 5, price=0.5) is None
+    assert "baseMinSize" in order_problem("HONEY-USDT", "0.5")
+    assert "minFunds" in order_problem("HONEY-USDT", 2, price="0.01")
+    assert order_problem("OFF-USDT", 5) == "trading dezactivat pentru simbol"
+
+
+def test_bad_items_are_skipped_and_unknown_refresh_is_throttled(loaded):
+    assert symbols.get_symbol_info("BROKEN-USDT") is None
+    assert symbols.get_symbol_info("MISSING-USDT") is None
+    assert symbols.get_symbol_info("HONEY-USDT").base_min_size == Decimal("1")
+    assert len(loaded) == 1
+
+
+def test_failed_load_keeps_previous_symbols():
+    answers = [ITEMS, RuntimeError("down")]
+
+    def loader():
+        answer = answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    cache = SymbolCache(loader)
+    assert cache.refresh()
+    assert not cache.refresh()
+    assert cache.get("HONEY-USDT").symbol == "HONEY-USDT"
+
+
+def test_use_loader_resets_cache():
+    symbols.use_loader(lambda: [dict(ITEMS[0], priceIncrement="0.01")])
+    assert round_price("HONEY-USDT", 0.125) == Decimal("0.13")
+
+
+def test_fmt_has_no_exponent():
+    assert fmt(Decimal("0.00001000")) == "0.00001"
+    assert fmt(Decimal("1E+2")) == "100"
@@ -0,0 +1,159 @@
+import pytest
+
+import write_behind
+from write_behind import WriteBehindJournal, is_permanent
+
+
+class APIError(Exception):
+    """Ca postgrest.APIError: codul Postgres/PostgREST în `.code`."""
+
+    def __init__(self, code):
+        super().__init__(code)
+        self.code = code
+
+
+class FailingDB:
+    """Învelește FakeSupabase: cererile care ating `order_id`-urile din `fail` eșuează (după ce se execută, dacă `commit`)."""
+
+    def __init__(self, db):
+        self.db = db
+        self.fail = {}  # order_id → excepție
+        self.ops = ("select", "insert", "update", "upsert")
+        self.commit = False
+
+    def table(self, name):
+        query = self.db.table(name)
+        execute = query.execute
+
+        def checked():
+            rows = query.payload if isinstance(query.payload, list) else [query.payload]
+            keys = {r.get("order_id") for r in rows if isinstance(r, dict)}
+            keys |= {k for k in self.fail if any(f({"order_id": k}) for f in query.filters)}
+            error = next((self.fail[k] for k in keys if k in self.fail), None) if query.op in self.ops else None
+            if error and not self.commit:
+                raise error
+            result = execute()
+            if error:
+                raise error
+            return result
+
+        query.execute = checked
+        return query
+
+
+@pytest.fixture
+def journal(tmp_path, fake_db):
+    db = FailingDB(fake_db)
+    journal = WriteBehindJournal(db, str(tmp_path / "journal.db"))
+    journal.db = db
+    return journal
+
+
+def flush(journal):
+    while journal.flush_once():
+        pass
+    journal.flush_once()
+
+
+def insert(journal, order_id, **fields):
+    journal.append("orders", "insert", {"order_id": order_id, "status": "open", **fields}, "order_id", order_id)
+
+
+def orders(fake_db):
+    return sorted((r["order_id"], r["status"]) for r in fake_db.tables["orders"])
+
+
+def dead(journal):
+    return journal._db.execute("SELECT op, key_val, error FROM dead").fetchall()
+
+
+def test_consecutive_inserts_become_one_request_and_updates_merge(journal, fake_db):
+    for i in range(3):
+        insert(journal, f"o{i}")
+    journal.append("orders", "update", {"status": "executed"}, "order_id", "o1")
+    flush(journal)
+    assert orders(fake_db) == [("o0", "open"), ("o1", "executed"), ("o2", "open")]
+    assert fake_db.counts["insert orders"] == 1
+    assert fake_db.counts["update orders"] == 0
+    assert journal.pending() == 0
+
+
+def test_permanent_error_goes_to_dead_and_does_not_block_others(journal, fake_db):
+    journal.db.fail["o1"] = APIError("23502")  # NOT NULL
+    for i in range(3):
+        insert(journal, f"o{i}")
+    flush(journal)
+    assert orders(fake_db) == [("o0", "open"), ("o2", "open")]
+    assert dead(journal) == [("insert", "o1", "23502")]
+    assert journal.pending() == 0
+
+
+def test_transient_error_holds_back_only_the_same_key(journal, fake_db):
+    journal.db.fail["o1"] = TimeoutError("timeout")
+    for i in range(3):
+        insert(journal, f"o{i}")
+    journal.append("orders", "update", {"status": "executed"}, "order_id", "o1")
+    journal.append("orders", "update", {"status": "executed"}, "order_id", "o2")
+    journal.append("profit", "call", {"args": ["c1"]})
+    flush(journal)
+    assert orders(fake_db) == [("o0", "open"), ("o2", "executed")]
+    held = journal._db.execute("SELECT op, key_val FROM journal ORDER BY id").fetchall()
+    assert held == [("insert", "o1"), ("update", "o1"), ("call", None)]
+
+    journal.db.fail.clear()
+    calls = []
+    write_behind.register_call("profit", calls.append)
+    journal._db.execute("UPDATE journal SET retry_at = 0")
+    flush(journal)
+    assert orders(fake_db) == [("o0", "open"), ("o1", "executed"), ("o2", "executed")]
+    assert calls == ["c1"]
+
+
+def test_retried_insert_that_was_committed_is_not_duplicated(journal, fake_db):
+    journal.db.fail["o1"] = TimeoutError("timeout")
+    journal.db.commit = True  # Supabase a scris rândul, dar răspunsul s-a pierdut
+    insert(journal, "o1")
+    flush(journal)
+    journal.db.fail.clear()
+    journal.append("orders", "update", {"status": "executed"}, "order_id", "o1")
+    journal._db.execute("UPDATE journal SET retry_at = 0")
+    flush(journal)
+    assert orders(fake_db) == [("o1", "executed")]
+
+
+def test_duplicate_key_error_updates_existing_row(journal, fake_db):
+    fake_db.seed("orders", [{"order_id": "o1", "status": "open"}])
+    journal.db.fail["o1"] = APIError("23505")  # constrângere unică pe order_id
+    journal.db.ops = ("insert",)
+    insert(journal, "o1", status="executed")
+    insert(journal, "o2")
+    flush(journal)
+    assert orders(fake_db) == [("o1", "executed"), ("o2", "open")]
+    assert dead(journal) == []
+
+
+def test_missing_unique_constraint_is_retried_not_dead_lettered():
+    assert not is_permanent(APIError("42P10"))
+    assert is_permanent(APIError("42703"))
+    assert is_permanent(APIError("23502"))
+    assert not is_permanent(TimeoutError("timeout"))
+
+
+def test_entry_is_dead_lettered_after_max_attempts(journal, fake_db, monkeypatch):
+    monkeypatch.setattr(write_behind, "MAX_ATTEMPTS", 2)
+    journal.db.fail["o1"] = TimeoutError("timeout")
+    insert(journal, "o1")
+    for _ in range(2):
+        journal._db.execute("UPDATE journal SET retry_at = 0")
+        flush(journal)
+    assert journal.pending() == 0
+    assert [row[:2] for row in dead(journal)] == [("insert", "o1")]
+
+
+def test_journal_survives_restart(tmp_path, fake_db):
+    path = str(tmp_path / "journal.db")
+    insert(WriteBehindJournal(fake_db, path), "o1")
+    reopened = WriteBehindJournal(fake_db, path)
+    assert reopened.pending() == 1
+    flush(reopened)
+    assert orders(fake_db) == [("o1", "open")]
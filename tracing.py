@@ -0,0 +1,358 @@
+import os
+import sys
+import time
+import random
+import logging
+import sqlite3
+import argparse
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# =====================================================
+# ⚙️ Constante
+# =====================================================
+TRACE_ENABLED = os.getenv("TRACE_ENABLED", "1") != "0"
+# un singur fișier pentru toate procesele (main, order_checker, workeri): SQLite serializează scrierile
+TRACE_PATH = os.getenv("TRACE_PATH", "data/traces.db")
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.1"))  # fracțiunea de cicluri normale păstrate
+# ciclurile lente și cele eșuate sunt păstrate mereu, indiferent de eșantionare
+TRACE_KEEP_SLOW_SECONDS = float(os.getenv("TRACE_KEEP_SLOW_SECONDS", "10"))
+TRACE_RETENTION_DAYS = float(os.getenv("TRACE_RETENTION_DAYS", "14"))
+FLUSH_INTERVAL = 1.0
+PRUNE_INTERVAL = 3600
+
+# etapele ciclului, stocate ca index (un octet) în loc de text
+STAGES = (
+    "settings",       # parse_bot_settings
+    "init_client",    # init_client + order stream
+    "pre_trade",      # estimarea din cartea de ordine
+    "market_sell",    # SELL market trimis
+    "sell_wait",      # SELL plasat → fill detectat (include poll-urile check_order)
+    "check_order",    # un poll REST check_order_executed
+    "save_order",     # rândul din 'orders' în jurnalul write-behind
+    "checkpoint",     # CycleStateStore.save
+    "place_buy",      # BUY limit / scară
+    "profit_update",  # profitul ciclului (la fill-ul BUY-ului, mai târziu)
+)
+OUTCOMES = ("ok", "pending", "fail", "error", "timeout")
+KEEP_ALWAYS = ("sell_failed", "sell_timeout", "buy_failed", "error")  # rezultate de ciclu păstrate mereu
+_STAGE_IDS = {name: i for i, name in enumerate(STAGES)}
+_OUTCOME_IDS = {name: i for i, name in enumerate(OUTCOMES)}
+
+_store = None
+_store_lock = threading.Lock()
+
+# =====================================================
+# 🧵 Timeline-ul unui ciclu (în memorie până la final)
+# =====================================================
+class Span:
+    __slots__ = ("outcome",)
+
+    def __init__(self):
+        self.outcome = "ok"
+
+
+class CycleTrace:
+    """
+    Etapele unui ciclu STB cu momentul de start, durata și rezultatul.
+    Colectarea e ieftină (tupluri într-o listă); decizia de păstrare se ia
+    la finish(), când durata și rezultatul ciclului sunt cunoscute.
+    """
+
+    __slots__ = ("cycle_id", "symbol", "started", "spans", "sampled", "done")
+
+    def __init__(self, symbol, cycle_id=None):
+        self.cycle_id = cycle_id
+        self.symbol = symbol
+        self.started = time.time()
+        self.spans = []
+        self.sampled = random.random() < TRACE_SAMPLE_RATE
+        self.done = not TRACE_ENABLED
+
+    def add(self, stage, started, duration, outcome="ok"):
+        if not self.done:
+            self.spans.append((stage, started, duration, outcome))
+
+    @contextmanager
+    def span(self, stage):
+        """Cronometrează blocul; `span.outcome` poate fi schimbat înăuntru, o excepție îl face 'error'."""
+        span = Span()
+        started = time.time()
+        try:
+            yield span
+        except BaseException:
+            span.outcome = "error"
+            raise
+        finally:
+            self.add(stage, started, time.time() - started, span.outcome)
+
+    def finish(self, outcome):
+        """Închide ciclul cu rezultatul lui (ca în stb_cycles_total) și îl trimite la store dacă e păstrat."""
+        if self.done:
+            return
+        self.done = True
+        duration = time.time() - self.started
+        if self.cycle_id and (self.sampled or outcome in KEEP_ALWAYS or duration >= TRACE_KEEP_SLOW_SECONDS):
+            store = get_span_store()
+            if store is not None:
+                store.submit(self, outcome, duration)
+
+
+def start_cycle(symbol, cycle_id=None):
+    return CycleTrace(symbol, cycle_id)
+
+
+def record_late(cycle_id, stage, started, duration, outcome="ok"):
+    """Etapă venită după finish (ex. profitul la fill-ul BUY-ului); păstrată doar dacă ciclul a fost păstrat."""
+    store = get_span_store() if TRACE_ENABLED and cycle_id else None
+    if store is not None:
+        store.submit_late(cycle_id, stage, started, duration, outcome)
+
+# =====================================================
+# 💾 Store compact (SQLite): un rând per ciclu, spans ca întregi
+# =====================================================
+class SpanStore:
+    """
+    Ciclurile păstrate și etapele lor, adăugate în loturi de un thread de
+    fundal. Un span ocupă câțiva octeți: id-ul ciclului, etapa și rezultatul
+    ca index, offset-ul față de startul ciclului și durata în microsecunde.
+    """
+
+    def __init__(self, path=TRACE_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS cycles (
+                id INTEGER PRIMARY KEY,
+                cycle_id TEXT NOT NULL,
+                symbol TEXT,
+                started REAL NOT NULL,
+                duration REAL NOT NULL,
+                outcome TEXT NOT NULL
+            )"""
+        )
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS spans (
+                cycle INTEGER NOT NULL,
+                stage INTEGER NOT NULL,
+                offset_us INTEGER NOT NULL,
+                duration_us INTEGER NOT NULL,
+                outcome INTEGER NOT NULL
+            )"""
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS cycles_cycle_id ON cycles (cycle_id)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS cycles_started ON cycles (started)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS spans_cycle ON spans (cycle)")
+        self._lock = threading.Lock()
+        self._pending = []
+        self._late = []
+        self._pruned_at = 0.0
+        self._thread = None
+
+    def submit(self, trace, outcome, duration):
+        with self._lock:
+            self._pending.append((trace.cycle_id, trace.symbol, trace.started, duration, outcome, list(trace.spans)))
+            self._start()
+
+    def submit_late(self, cycle_id, stage, started, duration, outcome):
+        with self._lock:
+            self._late.append((cycle_id, stage, started, duration, outcome))
+            self._start()
+
+    def _start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, daemon=True, name="trace-flush")
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except Exception as e:
+                logging.warning(f"⚠️ Trace store: flush eșuat: {e}")
+
+    def flush(self):
+        with self._lock:
+            cycles, late = self._pending, self._late
+            self._pending, self._late = [], []
+        if cycles or late:
+            with self._db:
+                self._db.execute("BEGIN")
+                for cycle_id, symbol, started, duration, outcome, spans in cycles:
+                    cur = self._db.execute(
+                        "INSERT INTO cycles (cycle_id, symbol, started, duration, outcome) VALUES (?, ?, ?, ?, ?)",
+                        (cycle_id, symbol, started, duration, outcome))
+                    self._db.executemany("INSERT INTO spans VALUES (?, ?, ?, ?, ?)",
+                                         [_span_row(cur.lastrowid, started, span) for span in spans])
+                for cycle_id, stage, started, duration, outcome in late:
+                    row = self.find(cycle_id)
+                    if row:  # ciclul neeșantionat → span-ul târziu e ignorat
+                        self._db.execute("INSERT INTO spans VALUES (?, ?, ?, ?, ?)",
+                                         _span_row(row[0], row[2], (stage, started, duration, outcome)))
+        if time.time() - self._pruned_at > PRUNE_INTERVAL:
+            self.prune()
+        return len(cycles)
+
+    def prune(self, days=TRACE_RETENTION_DAYS):
+        self._pruned_at = time.time()
+        cutoff = time.time() - days * 86400
+        with self._db:
+            self._db.execute("BEGIN")
+            self._db.execute("DELETE FROM spans WHERE cycle IN (SELECT id FROM cycles WHERE started < ?)", (cutoff,))
+            self._db.execute("DELETE FROM cycles WHERE started < ?", (cutoff,))
+
+    # -------------------------------------------------
+    # Citiri (CLI)
+    # -------------------------------------------------
+    def slowest(self, since, limit=20, symbol=None, outcome=None):
+        query = "SELECT id, cycle_id, symbol, started, duration, outcome FROM cycles WHERE started >= ?"
+        params = [since]
+        if symbol:
+            query += " AND symbol = ?"
+            params.append(symbol)
+        if outcome:
+            query += " AND outcome = ?"
+            params.append(outcome)
+        query += " ORDER BY duration DESC LIMIT ?"
+        return self._db.execute(query, params + [limit]).fetchall()
+
+    def find(self, cycle_id):
+        """(id, symbol, started, duration, outcome) al ultimei încercări a ciclului, sau None."""
+        return self._db.execute("SELECT id, symbol, started, duration, outcome FROM cycles WHERE cycle_id = ? "
+                                "ORDER BY id DESC LIMIT 1", (cycle_id,)).fetchone()
+
+    def spans_of(self, cycle_ids):
+        """{id ciclu: [(etapă, offset s, durată s, rezultat)]}, în ordinea startului."""
+        out = {cycle: [] for cycle in cycle_ids}
+        marks = ",".join("?" * len(out))
+        rows = self._db.execute(
+            f"SELECT cycle, stage, offset_us, duration_us, outcome FROM spans WHERE cycle IN ({marks}) ORDER BY cycle, offset_us",
+            list(out)).fetchall() if out else []
+        for cycle, stage, offset_us, duration_us, outcome in rows:
+            out[cycle].append((STAGES[stage], offset_us / 1e6, duration_us / 1e6, OUTCOMES[outcome]))
+        return out
+
+    def stage_durations(self, since, symbol=None):
+        """{etapă: ([durate s], nr. rezultate non-ok)} pentru ciclurile începute după `since`."""
+        query = ("SELECT s.stage, s.duration_us, s.outcome FROM spans s JOIN cycles c ON c.id = s.cycle "
+                 "WHERE c.started >= ?")
+        params = [since]
+        if symbol:
+            query += " AND c.symbol = ?"
+            params.append(symbol)
+        out = {}
+        for stage, duration_us, outcome in self._db.execute(query, params):
+            durations, failed = out.get(STAGES[stage], ([], 0))
+            durations.append(duration_us / 1e6)
+            out[STAGES[stage]] = (durations, failed + (outcome not in (0, 1)))
+        return out
+
+
+def _span_row(cycle, cycle_started, span):
+    stage, started, duration, outcome = span
+    return (cycle, _STAGE_IDS[stage], int((started - cycle_started) * 1e6), int(duration * 1e6),
+            _OUTCOME_IDS.get(outcome, _OUTCOME_IDS["error"]))
+
+
+def get_span_store():
+    """Store-ul global (deschis la primul ciclu păstrat), sau None dacă nu poate fi deschis."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            try:
+                _store = SpanStore()
+            except sqlite3.Error as e:
+                logging.error(f"❌ Trace store indisponibil ({TRACE_PATH}): {e}")
+                return None
+        return _store
+
+# =====================================================
+# 🚀 CLI: ciclurile cele mai lente + defalcare pe etape
+# =====================================================
+def _percentile(values, pct):
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def _fmt(seconds):
+    return f"{seconds * 1000:.0f}ms" if seconds < 10 else f"{seconds:.1f}s"
+
+
+def print_slowest(store, since, limit, symbol=None, outcome=None):
+    cycles = store.slowest(since, limit, symbol, outcome)
+    spans = store.spans_of([row[0] for row in cycles])
+    print(f"🐢 {len(cycles)} cel(e) mai lent(e) cicluri")
+    for cycle, cycle_id, sym, started, duration, result in cycles:
+        when = datetime.fromtimestamp(started, timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        totals = {}
+        for stage, _, stage_duration, _ in spans[cycle]:
+            if stage != "check_order":  # poll-urile sunt deja incluse în sell_wait
+                totals[stage] = totals.get(stage, 0.0) + stage_duration
+        breakdown = "  ".join(f"{stage}={_fmt(value)}" for stage, value in sorted(totals.items(), key=lambda kv: -kv[1]))
+        polls = sum(1 for stage, *_ in spans[cycle] if stage == "check_order")
+        print(f"   {_fmt(duration):>8}  {when}  {sym:<14} {result:<14} {cycle_id}")
+        print(f"             {breakdown}{f'  ({polls} poll-uri)' if polls else ''}")
+
+
+def print_timeline(store, cycle_id):
+    row = store.find(cycle_id)
+    if not row:
+        print(f"Ciclul {cycle_id} nu e în store (neeșantionat sau expirat).")
+        return
+    cycle, symbol, started, duration, outcome = row
+    print(f"🧵 {cycle_id} {symbol} → {outcome} în {_fmt(duration)}")
+    for stage, offset, stage_duration, result in store.spans_of([cycle])[cycle]:
+        print(f"   +{_fmt(offset):>8}  {stage:<14} {_fmt(stage_duration):>8}  {result}")
+
+
+def print_stages(store, since, symbol=None):
+    stages = store.stage_durations(since, symbol)
+    print(f"{'etapă':<14} {'n':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8} {'eșecuri':>8}")
+    for stage in STAGES:
+        if stage not in stages:
+            continue
+        durations, failed = stages[stage]
+        print(f"{stage:<14} {len(durations):>7} {_fmt(_percentile(durations, 50)):>8} {_fmt(_percentile(durations, 95)):>8} "
+              f"{_fmt(_percentile(durations, 99)):>8} {_fmt(max(durations)):>8} {failed:>8}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Timeline-uri de ciclu STB din store-ul de spans.")
+    parser.add_argument("--path", default=TRACE_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+    slowest = sub.add_parser("slowest", help="ciclurile cele mai lente, cu timpul pe etape")
+    slowest.add_argument("--limit", type=int, default=20)
+    slowest.add_argument("--outcome", help="doar un rezultat (ex. completed, sell_timeout)")
+    stages = sub.add_parser("stages", help="p50/p95/p99 per etapă")
+    for report in (slowest, stages):
+        report.add_argument("--hours", type=float, default=24, help="doar ciclurile din ultimele N ore")
+        report.add_argument("--symbol")
+    show = sub.add_parser("show", help="timeline-ul unui ciclu")
+    show.add_argument("cycle_id")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.path):
+        print(f"Nu există {args.path} (niciun ciclu înregistrat încă).")
+        return 1
+    store = SpanStore(args.path)
+    if args.command == "show":
+        print_timeline(store, args.cycle_id)
+        return 0
+    since = time.time() - args.hours * 3600
+    if args.command == "slowest":
+        print_slowest(store, since, args.limit, args.symbol, args.outcome)
+    else:
+        print_stages(store, since, args.symbol)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,372 @@
+import os
+import sys
+import json
+import time
+import random
+import logging
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+# =====================================================
+# ⚙️ Constante
+# =====================================================
+WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND_ENABLED", "1") != "0"
+# un jurnal per proces (main / order_checker), ca două flusher-e să nu trimită aceleași intrări
+_PROCESS_NAME = os.path.splitext(os.path.basename(sys.argv[0] or "main"))[0] or "main"
+_WORKER_SUFFIX = f"-{os.environ['WORKER_ID']}" if os.getenv("WORKER_ID") else ""  # workeri pe aceeași mașină
+JOURNAL_PATH = os.getenv("JOURNAL_PATH", f"data/write_behind-{_PROCESS_NAME}{_WORKER_SUFFIX}.db")
+FLUSH_INTERVAL = 0.5  # secunde între două flush-uri
+FLUSH_BATCH = 500  # intrări citite din jurnal per flush
+MAX_BACKOFF = 60
+MAX_ATTEMPTS = 50  # după atâtea eșecuri intrarea e mutată în 'dead'
+# coduri PostgREST/Postgres pentru cereri care nu vor reuși la reîncercare:
+# 22 date invalide, 23 constrângeri, 42 coloană/tabel inexistent, PGRST1xx/2xx cerere/schemă
+PERMANENT_ERROR_CODES = ("22", "23", "42", "PGRST1", "PGRST2")
+# ...cu excepția celor care țin de configurarea bazei (permisiuni, on_conflict fără constrângere unică)
+RETRYABLE_ERROR_CODES = ("42501", "42P10")
+DUPLICATE_KEY = "23505"
+
+_journal = None
+_journal_lock = threading.Lock()
+_calls = {}
+
+# =====================================================
+# 📓 Jurnal local append-only (SQLite) + flusher în fundal
+# =====================================================
+class WriteBehindJournal:
+    """
+    Scrierile către Supabase sunt întâi adăugate într-un jurnal SQLite local
+    (durabil), apoi un thread de fundal le trimite în loturi: inserturile
+    consecutive devin un singur insert bulk, update-urile pentru rânduri încă
+    neinserate sunt contopite în rândul de insert. La repornire jurnalul
+    rămas e reluat automat. Un eșec amână doar intrarea respectivă și
+    scrierile ulterioare pentru aceeași cheie; restul jurnalului merge mai departe.
+    """
+
+    def __init__(self, supabase, path=JOURNAL_PATH):
+        self.supabase = supabase
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS journal (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                table_name TEXT NOT NULL,
+                op TEXT NOT NULL,
+                key_col TEXT,
+                key_val TEXT,
+                payload TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                created_at TEXT NOT NULL,
+                retry_at REAL NOT NULL DEFAULT 0
+            )"""
+        )
+        columns = {r[1] for r in self._db.execute("PRAGMA table_info(journal)")}
+        if "retry_at" not in columns:  # jurnal creat de o versiune anterioară
+            self._db.execute("ALTER TABLE journal ADD COLUMN retry_at REAL NOT NULL DEFAULT 0")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS dead (
+                id INTEGER PRIMARY KEY,
+                table_name TEXT, op TEXT, key_col TEXT, key_val TEXT,
+                payload TEXT, attempts INTEGER, created_at TEXT, error TEXT
+            )"""
+        )
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    # -------------------------------------------------
+    # Append (apelat din thread-urile de trading)
+    # -------------------------------------------------
+    def append(self, table_name, op, payload, key_col=None, key_val=None):
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO journal (table_name, op, key_col, key_val, payload, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (table_name, op, key_col, None if key_val is None else str(key_val),
+                 json.dumps(payload, default=str), datetime.now(timezone.utc).isoformat()),
+            )
+        self._wake.set()
+
+    def pending(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM journal").fetchone()[0]
+
+    def pending_keys(self, table_name, key_col, key_vals):
+        """Cheile care au încă scrieri netrimise în jurnal (ex. insertul unui ordin)."""
+        key_vals = [str(v) for v in key_vals if v is not None]
+        if not key_vals:
+            return set()
+        marks = ",".join("?" * len(key_vals))
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT DISTINCT key_val FROM journal WHERE table_name = ? AND key_col = ? AND key_val IN ({marks})",
+                (table_name, key_col, *key_vals),
+            ).fetchall()
+        return {r[0] for r in rows}
+
+    # -------------------------------------------------
+    # Flusher
+    # -------------------------------------------------
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        backlog = self.pending()
+        if backlog:
+            logging.info(f"📓 Write-behind: reiau {backlog} scriere(i) rămase în jurnal")
+        self._thread = threading.Thread(target=self._flush_loop, daemon=True)
+        self._thread.start()
+
+    def _flush_loop(self):
+        while True:
+            self._wake.wait(FLUSH_INTERVAL)
+            self._wake.clear()
+            try:
+                while self.flush_once():
+                    pass
+            except Exception as e:
+                logging.error(f"❌ Write-behind flush error: {e}")
+
+    def flush_once(self):
+        """Trimite un lot din jurnal. Returnează True dacă a mai rămas ceva de trimis."""
+        now = time.time()
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, table_name, op, key_col, key_val, payload, attempts FROM journal "
+                "WHERE retry_at <= ? ORDER BY id LIMIT ?",
+                (now, FLUSH_BATCH),
+            ).fetchall()
+            # intrările în așteptare după un eșec țin pe loc scrierile ulterioare pentru aceeași cheie
+            held = self._db.execute(
+                "SELECT table_name, key_col, key_val, MIN(id), MAX(retry_at) FROM journal "
+                "WHERE retry_at > ? GROUP BY table_name, key_col, key_val",
+                (now,),
+            ).fetchall()
+        if not rows:
+            return False
+
+        held_keys = {(r[0], r[1], r[2]): (r[3], r[4]) for r in held if r[2] is not None}
+        barrier = min(((r[3], r[4]) for r in held), default=None)  # apelurile rulează după tot ce e înainte
+
+        entries = []
+        deferred = []
+        for r in rows:
+            entry = {"id": r[0], "table": r[1], "op": r[2], "key_col": r[3], "key_val": r[4],
+                     "payload": json.loads(r[5]), "attempts": r[6], "merged": []}
+            blocker = held_keys.get((entry["table"], entry["key_col"], entry["key_val"]))
+            if entry["op"] == "call":
+                blocker = barrier
+            if blocker and blocker[0] < entry["id"]:
+                deferred.append((blocker[1], entry["id"]))
+                continue
+            entries.append(entry)
+        if deferred:
+            with self._lock:
+                self._db.executemany("UPDATE journal SET retry_at = ? WHERE id = ?", deferred)
+
+        # 1️⃣ Update-urile pentru rânduri încă neinserate se contopesc în insert
+        inserts = {}
+        remaining = []
+        for entry in entries:
+            key = (entry["table"], entry["key_col"], entry["key_val"])
+            if entry["op"] == "insert" and entry["key_col"]:
+                inserts[key] = entry
+            elif entry["op"] == "update" and key in inserts:
+                inserts[key]["payload"].update(entry["payload"])
+                inserts[key]["merged"].append(entry["id"])
+                continue
+            remaining.append(entry)
+
+        # 2️⃣ Inserturile consecutive în același tabel devin un singur insert bulk
+        groups = []
+        for entry in remaining:
+            last = groups[-1] if groups else None
+            if (entry["op"] == "insert" and last and last[0]["op"] == "insert"
+                    and last[0]["table"] == entry["table"] and last[0]["key_col"] == entry["key_col"]):
+                last.append(entry)
+            else:
+                groups.append([entry])
+
+        failed = []  # (table, key_col, key_val) / id-ul apelului cu eșec în lotul curent
+        for group in groups:
+            if failed:
+                group = [entry for entry in group if not self._blocked(entry, failed)]
+                if not group:
+                    continue
+            try:
+                self._apply(group)
+            except Exception as e:
+                if len(group) == 1:
+                    self._record_failure(group[0], e)
+                    failed.append(group[0])
+                    continue
+                # lotul e refăcut intrare cu intrare: doar intrarea proastă rămâne în urmă
+                for entry in group:
+                    if self._blocked(entry, failed):
+                        continue
+                    try:
+                        self._apply([entry])
+                    except Exception as single_error:
+                        self._record_failure(entry, single_error)
+                        failed.append(entry)
+                        continue
+                    self._done([entry])
+                continue
+            self._done(group)
+
+        return len(rows) == FLUSH_BATCH and len(deferred) < len(rows)
+
+    @staticmethod
+    def _blocked(entry, failed):
+        """Intrarea trebuie să aștepte o intrare anterioară eșuată (aceeași cheie; apelurile – orice eșec)."""
+        if entry["op"] == "call":
+            return True
+        key = (entry["table"], entry["key_col"], entry["key_val"])
+        return entry["key_val"] is not None and any(
+            (f["table"], f["key_col"], f["key_val"]) == key for f in failed)
+
+    def _done(self, group):
+        ids = [entry["id"] for entry in group] + [i for entry in group for i in entry["merged"]]
+        with self._lock:
+            self._db.executemany("DELETE FROM journal WHERE id = ?", [(i,) for i in ids])
+
+    def _apply(self, group):
+        first = group[0]
+        if first["op"] == "insert" and first["key_col"]:
+            self._insert_keyed(group)
+        elif first["op"] == "insert":
+            self.supabase.table(first["table"]).insert([entry["payload"] for entry in group]).execute()
+        elif first["op"] == "update":
+            self.supabase.table(first["table"]).update(first["payload"]).eq(first["key_col"], first["key_val"]).execute()
+        elif first["op"] == "upsert":
+            self.supabase.table(first["table"]).upsert(first["payload"]).execute()
+        elif first["op"] == "call":
+            _calls[first["table"]](*first["payload"].get("args", []))
+        else:
+            raise ValueError(f"Operație necunoscută în jurnal: {first['op']}")
+
+    def _insert_keyed(self, group):
+        """
+        Insert pe cheie (ex. order_id), fără să depindă de o constrângere unică:
+        la o reîncercare (insertul anterior poate fi ajuns în DB înainte de
+        timeout) rândurile deja existente primesc un update în loc de un al
+        doilea insert; un 23505 (cheie duplicată) e tratat la fel.
+        """
+        table, key_col = group[0]["table"], group[0]["key_col"]
+        if any(entry["attempts"] for entry in group):
+            keys = [entry["key_val"] for entry in group]
+            rows = self.supabase.table(table).select(key_col).in_(key_col, keys).execute().data or []
+            existing = {str(row[key_col]) for row in rows}
+            for entry in [e for e in group if e["key_val"] in existing]:
+                self._update_existing(entry)
+            group = [entry for entry in group if entry["key_val"] not in existing]
+            if not group:
+                return
+        try:
+            self.supabase.table(table).insert([entry["payload"] for entry in group]).execute()
+        except Exception as e:
+            if getattr(e, "code", None) != DUPLICATE_KEY or len(group) > 1:
+                raise  # lotul e refăcut intrare cu intrare de flush_once
+            self._update_existing(group[0])
+
+    def _update_existing(self, entry):
+        patch = {k: v for k, v in entry["payload"].items() if k != entry["key_col"]}
+        self.supabase.table(entry["table"]).update(patch).eq(entry["key_col"], entry["key_val"]).execute()
+
+    def _record_failure(self, entry, error):
+        attempts = entry["attempts"] + 1
+        if attempts >= MAX_ATTEMPTS or is_permanent(error):
+            with self._lock:
+                self._db.execute(
+                    "INSERT INTO dead SELECT id, table_name, op, key_col, key_val, ?, ?, created_at, ? "
+                    "FROM journal WHERE id = ?",
+                    (json.dumps(entry["payload"], default=str), attempts, str(error), entry["id"]),
+                )
+                self._db.executemany("DELETE FROM journal WHERE id = ?", [(i,) for i in [entry["id"]] + entry["merged"]])
+            logging.error(f"☠️ Write-behind: {entry['op']} {entry['table']} {entry['key_val'] or ''} mutat în 'dead' "
+                          f"după {attempts} încercare(i): {error}")
+            return
+        backoff = min(MAX_BACKOFF, 2 ** min(attempts, 6)) + random.uniform(0, 1)
+        with self._lock:
+            self._db.execute("UPDATE journal SET attempts = ?, retry_at = ? WHERE id = ?",
+                             (attempts, time.time() + backoff, entry["id"]))
+        logging.warning(f"⚠️ Write-behind: flush eșuat ({entry['op']} {entry['table']} {entry['key_val'] or ''}), "
+                        f"reîncerc în {round(backoff, 1)}s: {error}")
+
+
+def is_permanent(error):
+    """Eroare PostgREST care se repetă identic la reîncercare (ex. cheie duplicată, coloană inexistentă)."""
+    code = getattr(error, "code", None)
+    return (isinstance(code, str) and code.startswith(PERMANENT_ERROR_CODES)
+            and not code.startswith(RETRYABLE_ERROR_CODES))
+
+# =====================================================
+# 🧰 API folosit de codul de trading
+# =====================================================
+def register_call(name, func):
+    """Înregistrează o funcție care poate fi pusă în jurnal (ex. recalcul profit)."""
+    _calls[name] = func
+
+
+def get_journal():
+    """Jurnalul global (creat și pornit la primul apel), sau None dacă e dezactivat."""
+    global _journal
+    if not WRITE_BEHIND_ENABLED:
+        return None
+    with _journal_lock:
+        if _journal is None:
+            from supabase_client import supabase
+
+            _journal = WriteBehindJournal(supabase)
+            _journal.start()
+        return _journal
+
+
+def persist_insert(table_name, row, key_col="order_id"):
+    journal = get_journal()
+    if journal is None:
+        from supabase_client import supabase
+
+        supabase.table(table_name).insert(row).execute()
+        return
+    journal.append(table_name, "insert", row, key_col, row.get(key_col))
+
+
+def persist_update(table_name, key_col, key_val, patch):
+    journal = get_journal()
+    if journal is None:
+        from supabase_client import supabase
+
+        supabase.table(table_name).update(patch).eq(key_col, key_val).execute()
+        return
+    journal.append(table_name, "update", patch, key_col, key_val)
+
+
+def persist_upsert(table_name, row):
+    journal = get_journal()
+    if journal is None:
+        from supabase_client import supabase
+
+        supabase.table(table_name).upsert(row).execute()
+        return
+    journal.append(table_name, "upsert", row)
+
+
+def pending_keys(table_name, key_col, key_vals):
+    """Cheile din `key_vals` cu scrieri încă în jurnal (set gol dacă write-behind e dezactivat)."""
+    journal = get_journal()
+    if journal is None:
+        return set()
+    return journal.pending_keys(table_name, key_col, key_vals)
+
+
+def persist_call(name, *args):
+    """Rulează funcția după ce toate scrierile anterioare din jurnal au ajuns în DB."""
+    journal = get_journal()
+    if journal is None:
+        _calls[name](*args)
+        return
+    journal.append(name, "call", {"args": list(args)})